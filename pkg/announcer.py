@@ -0,0 +1,111 @@
+"""Tells the WebThings Gateway about new devices, once per device instead of once per property."""
+
+import collections
+import threading
+
+from .logger import get_logger
+
+
+_LOG = get_logger('devices')
+
+
+class DeviceAnnouncer(object):
+    """
+    Collects devices that were added or got new properties, and announces each of them to the gateway once.
+
+    Announcing a device sends its complete description to the gateway. When a node presents itself, every child
+    used to trigger such an announcement. Now the announcements are held back for a moment, so that a device that gets
+    ten properties in quick succession is only sent once, with all ten.
+
+    Properties that were added since the previous announcement get their value sent right after the device, because
+    the gateway ignores values of properties it doesn't know about yet.
+    """
+
+    def __init__(self, announce, delay=0.5):
+        """
+        Initialize the object.
+
+        announce -- function that sends a device to the gateway
+        delay -- how many seconds to wait for more changes before announcing. 0 announces right away.
+        """
+        self.announce = announce
+        self.delay = delay
+
+        self._pending = collections.OrderedDict() # device id -> device, in the order they were added
+        self._announced_properties = {} # device id -> names of the properties the gateway knows about
+        self._lock = threading.Lock()
+        self._timer = None
+
+        # Statistics
+        self.requested_count = 0
+        self.announced_count = 0
+
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'requested': self.requested_count,
+                'announced': self.announced_count,
+            }
+
+
+    def add(self, device):
+        """ Schedules a device to be announced. Adding it again before that happens costs nothing extra. """
+        with self._lock:
+            self.requested_count += 1
+            self._pending[device.id] = device
+            if self.delay > 0:
+                if self._timer == None:
+                    self._timer = threading.Timer(self.delay, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+
+    def forget(self, device_id):
+        """ Called when a device is removed, so that it isn't announced again. """
+        with self._lock:
+            self._pending.pop(device_id, None)
+            self._announced_properties.pop(device_id, None)
+
+
+    def flush(self):
+        """ Announces all the devices that are waiting. """
+        with self._lock:
+            self._timer = None
+            devices = list(self._pending.values())
+            self._pending.clear()
+
+        for device in devices:
+            try:
+                self.announce(device)
+            except Exception as ex:
+                _LOG.error("Error while announcing device %s: %s", device.id, ex)
+                continue
+
+            names = set(device.properties)
+            with self._lock:
+                self.announced_count += 1
+                known = self._announced_properties.get(device.id, set())
+                self._announced_properties[device.id] = names
+            for name in names - known:
+                try:
+                    device_property = device.properties.get(name)
+                    if device_property != None and device_property.value != None:
+                        device.notify_property_changed(device_property)
+                except Exception as ex:
+                    _LOG.error("Error while sending value of new property %s: %s", name, ex)
+
+        if len(devices) > 0:
+            _LOG.debug("Announced %s devices to the gateway", len(devices))
+
+
+    def stop(self):
+        """ Cancels the announcements that are still waiting. """
+        with self._lock:
+            if self._timer != None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
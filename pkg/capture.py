@@ -0,0 +1,94 @@
+"""Records incoming MySensors messages to a file, so they can be replayed later."""
+
+import os
+import threading
+import time
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+class CaptureWriter(object):
+    """
+    Appends every incoming message to a capture file, as a timestamp and the raw MySensors line.
+
+    The file looks like this, with a tab between the two columns:
+
+        1718000000.123456	5;1;1;0;0;21.5
+
+    It works the same for serial, Ethernet and MQTT gateways, as the messages are recorded after PyMySensors has
+    turned them into Message objects. tools/replay.py can feed a capture file back into the adapter.
+    """
+
+    def __init__(self, file_path, max_bytes=50000000):
+        """
+        Initialize the object.
+
+        file_path -- where to write the capture
+        max_bytes -- the capture stops once the file has grown this large, so it can't fill up the disk
+        """
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.written_bytes = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+
+    def start(self):
+        directory = os.path.dirname(self.file_path)
+        if directory != '' and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._file = open(self.file_path, 'a', buffering=65536)
+        self.written_bytes = self._file.tell()
+        _LOG.info("Capturing incoming messages to %s", self.file_path)
+
+
+    def record(self, message, timestamp=None):
+        """ Adds a PyMySensors message to the capture. """
+        if self._file == None:
+            return
+        if timestamp == None:
+            timestamp = time.time()
+        line = '%.6f\t%s\n' % (timestamp, message.encode().rstrip('\n'))
+        with self._lock:
+            if self._file == None:
+                return
+            if self.written_bytes + len(line) > self.max_bytes:
+                _LOG.warning("Capture file is full, no longer capturing messages")
+                self._close()
+                return
+            self._file.write(line)
+            self.written_bytes += len(line)
+
+
+    def stop(self):
+        with self._lock:
+            self._close()
+
+
+    def _close(self):
+        if self._file != None:
+            self._file.close()
+            self._file = None
+
+
+
+def read_capture(file_path):
+    """ Yields (timestamp, raw line) tuples from a capture file. Lines without a timestamp get the previous one. """
+    timestamp = 0.0
+    with open(file_path) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if line == '' or line.startswith('#'):
+                continue
+            if '\t' in line:
+                first, raw = line.split('\t', 1)
+                try:
+                    timestamp = float(first)
+                except ValueError:
+                    raw = line
+            else:
+                raw = line # A plain MySensors log, like the output of a serial monitor
+            yield timestamp, raw + '\n'
@@ -0,0 +1,204 @@
+"""Makes sure commands sent to MySensors nodes actually arrive."""
+
+import collections
+import time
+
+from .logger import get_logger
+from .metrics import METRICS
+
+
+_LOG = get_logger('commands')
+
+
+class Command(object):
+    """ A value that should be set on a node, and how far along delivering it is. """
+
+    def __init__(self, key, value):
+        self.key = key # (node_id, child_id, sub_type)
+        self.value = value
+        self.attempts = 0
+        self.submitted_at = time.time()
+        self.sent_at = None
+        self.in_flight = False
+
+
+class CommandQueue(object):
+    """
+    Sends SET commands with an acknowledgement request, and repeats them until the node echoes them back.
+
+    There is at most one pending command per (node, child, sub_type). If the user changes a value again before the
+    previous value was delivered, the old value is simply replaced. Each node only has a few commands in flight at
+    the same time, so that for example a scene that toggles 20 relays doesn't flood the radio. The rest waits in line.
+
+    Nodes that use MySensors' smart sleep only listen for a moment after they announce that they are about to sleep.
+    PyMySensors keeps the newest value per property for those nodes itself, and sends them all when the node wakes up.
+    It sends them without asking for an acknowledgement, so commands for smart sleeping nodes are simply handed over
+    once, instead of being repeated until they time out.
+
+    Everything runs on the adapter's event loop, so no locking is needed. Other threads should use the event loop's
+    call_soon() to submit commands.
+    """
+
+    def __init__(self, send, loop, max_attempts=4, ack_timeout=1.5, max_inflight_per_node=2, is_smart_sleep_node=None):
+        """
+        Initialize the object.
+
+        send -- function that transmits a command: send(node_id, child_id, sub_type, value, ack)
+        loop -- the asyncio event loop to set the retry timers on
+        max_attempts -- how often a command is sent before giving up. With 1 no acknowledgement is requested.
+        ack_timeout -- seconds to wait for the first acknowledgement. This doubles with every retry.
+        max_inflight_per_node -- how many commands may wait for an acknowledgement from one node at the same time
+        is_smart_sleep_node -- function that returns True for a node whose commands PyMySensors holds until it wakes up
+        """
+        self.send = send
+        self.loop = loop
+        self.max_attempts = max_attempts
+        self.ack_timeout = ack_timeout
+        self.max_inflight_per_node = max_inflight_per_node
+        self.is_smart_sleep_node = is_smart_sleep_node
+
+        self.pending = {} # (node_id, child_id, sub_type) -> Command
+        self._waiting = collections.defaultdict(collections.deque) # node_id -> keys of commands that haven't been sent yet
+        self._inflight = collections.defaultdict(set) # node_id -> keys of commands that were sent but not acknowledged
+        self._timers = {} # key -> timer handle
+
+        self.submitted_count = 0
+        self.superseded_count = 0
+        self.delivered_count = 0
+        self.retransmit_count = 0
+        self.failed_count = 0
+        self.smart_sleep_count = 0
+
+
+    def stats(self):
+        return {
+            'pending': len(self.pending),
+            'smart_sleep': self.smart_sleep_count,
+            'submitted': self.submitted_count,
+            'superseded': self.superseded_count,
+            'delivered': self.delivered_count,
+            'retransmits': self.retransmit_count,
+            'failed': self.failed_count,
+        }
+
+
+    def submit(self, node_id, child_id, sub_type, value):
+        """ Queues a new value for a node. Replaces a value for the same property that hasn't been delivered yet. """
+        self.submitted_count += 1
+        key = (int(node_id), int(child_id), int(sub_type))
+
+        if self.is_smart_sleep_node != None and self.is_smart_sleep_node(key[0]):
+            # PyMySensors holds it until the node wakes up, and the node won't echo it. An older pending value is replaced by this one.
+            self.smart_sleep_count += 1
+            command = self.pending.get(key)
+            if command != None:
+                self.superseded_count += 1
+                self._finish(command)
+            self._transmit(Command(key, value), False)
+            return
+
+        if self.max_attempts <= 1:
+            self._transmit(Command(key, value), False)
+            return
+
+        command = self.pending.get(key)
+        if command != None:
+            self.superseded_count += 1
+            command.value = value
+            command.attempts = 0
+            command.submitted_at = time.time()
+            if command.in_flight:
+                # Send the new value right away, in the slot of the old one.
+                self._cancel_timer(key)
+                self._send(command)
+            return
+
+        self.pending[key] = Command(key, value)
+        self._waiting[key[0]].append(key)
+        self._send_next(key[0])
+
+
+    def acknowledged(self, node_id, child_id, sub_type, payload):
+        """ Called when a node echoes a command back. Only counts if the echo is for the latest value. """
+        key = (int(node_id), int(child_id), int(sub_type))
+        command = self.pending.get(key)
+        if command == None or not command.in_flight or str(command.value) != str(payload):
+            return
+        _LOG.debug("<< Command to %s was delivered after %s attempt(s)", key, command.attempts)
+        self.delivered_count += 1
+        METRICS.observe('mysensors_command_round_trip_seconds', time.time() - command.submitted_at)
+        self._finish(command)
+
+
+    def forget_node(self, node_id):
+        """ Drops all the commands for a node, for example because it was removed. """
+        node_id = int(node_id)
+        for key in list(self.pending):
+            if key[0] == node_id:
+                self._cancel_timer(key)
+                del self.pending[key]
+        self._waiting.pop(node_id, None)
+        self._inflight.pop(node_id, None)
+
+
+    def _send_next(self, node_id):
+        """ Sends waiting commands for a node, as far as the in-flight limit allows. """
+        waiting = self._waiting[node_id]
+        while len(waiting) > 0 and len(self._inflight[node_id]) < self.max_inflight_per_node:
+            key = waiting.popleft()
+            command = self.pending.get(key)
+            if command == None:
+                continue
+            if self.max_attempts <= 1:
+                del self.pending[key]
+                self._transmit(command, False)
+                continue
+            command.in_flight = True
+            self._inflight[node_id].add(key)
+            self._send(command)
+
+
+    def _send(self, command):
+        command.attempts += 1
+        command.sent_at = time.time()
+        if command.attempts > 1:
+            self.retransmit_count += 1
+            _LOG.debug("<< Resending command to %s (attempt %s)", command.key, command.attempts)
+        self._transmit(command, True)
+        timeout = self.ack_timeout * (2 ** (command.attempts - 1))
+        self._timers[command.key] = self.loop.call_later(timeout, self._timed_out, command.key)
+
+
+    def _transmit(self, command, ack):
+        node_id, child_id, sub_type = command.key
+        try:
+            self.send(node_id, child_id, sub_type, command.value, ack)
+        except Exception as ex:
+            _LOG.error("Error while sending command to MySensors network: %s", ex)
+
+
+    def _timed_out(self, key):
+        self._timers.pop(key, None)
+        command = self.pending.get(key)
+        if command == None:
+            return
+        if command.attempts < self.max_attempts:
+            self._send(command)
+        else:
+            _LOG.warning("Node %s did not confirm receiving %s for child %s after %s attempts", key[0], command.value, key[1], command.attempts)
+            self.failed_count += 1
+            self._finish(command)
+
+
+    def _finish(self, command):
+        key = command.key
+        self._cancel_timer(key)
+        self.pending.pop(key, None)
+        self._inflight[key[0]].discard(key)
+        self._send_next(key[0])
+
+
+    def _cancel_timer(self, key):
+        timer = self._timers.pop(key, None)
+        if timer != None:
+            timer.cancel()
@@ -0,0 +1,57 @@
+"""A virtual thing that shows how busy the MySensors network and the adapter are."""
+
+from gateway_addon import Device, Property
+
+
+class DiagnosticsProperty(Property):
+    """ A read-only property that is only ever changed by the adapter. """
+
+    def __init__(self, device, name, description, value):
+        Property.__init__(self, device, name, description)
+        self.title = description.get('title', name)
+        self.set_cached_value(value)
+
+
+    def update(self, value):
+        if value != self.value:
+            self.set_cached_value(value)
+            self.device.notify_property_changed(self)
+
+
+
+class DiagnosticsDevice(Device):
+    """ The 'MySensors Gateway' thing. Its properties are filled in from the adapter's metrics every minute. """
+
+    def __init__(self, adapter):
+        Device.__init__(self, adapter, 'MySensorsDiagnostics')
+        self.adapter = adapter
+        self.name = 'MySensors Gateway'
+        self.title = 'MySensors Gateway'
+        self.description = 'Shows how busy the MySensors network and the add-on are'
+        self._type = ['MultiLevelSensor']
+        self.connected = True
+
+        self.properties['messages_per_minute'] = DiagnosticsProperty(self, 'messages_per_minute', {
+            '@type': 'LevelProperty',
+            'title': 'Messages per minute',
+            'type': 'number',
+            'minimum': 0,
+            'maximum': 10000,
+            'readOnly': True,
+        }, 0)
+        self.properties['diagnostics'] = DiagnosticsProperty(self, 'diagnostics', {
+            'title': 'Diagnostics',
+            'type': 'string',
+            'readOnly': True,
+        }, '')
+        self.properties['throttled_nodes'] = DiagnosticsProperty(self, 'throttled_nodes', {
+            'title': 'Throttled nodes',
+            'type': 'string',
+            'readOnly': True,
+        }, 'None')
+
+
+    def update(self, messages_per_minute, summary, throttled_nodes='None'):
+        self.properties['messages_per_minute'].update(messages_per_minute)
+        self.properties['diagnostics'].update(summary)
+        self.properties['throttled_nodes'].update(throttled_nodes)
@@ -0,0 +1,93 @@
+"""The asyncio event loop that PyMySensors and the adapter's timers run on."""
+
+import asyncio
+import threading
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+class EventLoopThread(object):
+    """
+    Runs one asyncio event loop in a dedicated thread.
+
+    All the PyMySensors gateway types run on this loop, so there is only one thread handling the MySensors network,
+    whichever way the receiver is connected. Other threads hand work to the loop with call_soon() or run().
+    """
+
+    def __init__(self, debug=False):
+        """
+        Initialize the object.
+
+        debug -- whether to turn on asyncio's debug mode. This makes everything a lot slower, so it's off by default.
+        """
+        self.debug = debug
+        self.loop = None
+        self.thread = None
+
+
+    def start(self):
+        if self.thread != None and self.thread.is_alive():
+            return
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_debug(self.debug)
+        started = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(started,), name='mysensors-event-loop')
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait()
+
+
+    def run(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            try:
+                tasks = [task for task in asyncio.all_tasks(self.loop) if not task.done()]
+                for task in tasks:
+                    task.cancel()
+                if len(tasks) > 0:
+                    self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            except Exception as ex:
+                _LOG.error("Error while cancelling asyncio tasks: %s", ex)
+            self.loop.close()
+
+
+    def is_running(self):
+        return self.loop != None and self.loop.is_running()
+
+
+    def in_loop_thread(self):
+        return self.thread != None and threading.current_thread() is self.thread
+
+
+    def call_soon(self, function, *args):
+        """ Calls a function on the event loop. Can be used from any thread. """
+        if self.in_loop_thread():
+            function(*args)
+        elif self.is_running():
+            self.loop.call_soon_threadsafe(function, *args)
+        else:
+            _LOG.warning("Event loop is not running, dropping call to %s", getattr(function, '__name__', function))
+
+
+    def submit(self, coroutine):
+        """ Schedules a coroutine on the event loop, and returns a concurrent.futures.Future for its result. """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+    def run_coroutine(self, coroutine, timeout=None):
+        """ Runs a coroutine on the event loop, and waits for its result. Must not be called from the loop thread itself. """
+        return self.submit(coroutine).result(timeout)
+
+
+    def stop(self, timeout=5):
+        if not self.is_running():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if not self.in_loop_thread():
+            self.thread.join(timeout)
@@ -0,0 +1,167 @@
+"""Keeps track of which MySensors nodes are still alive."""
+
+import heapq
+import threading
+import time
+
+from .logger import get_logger
+from .node_registry import NodeRegistry, NODE_COUNT, node_index
+
+
+_LOG = get_logger('adapter')
+
+
+class LivenessTracker(object):
+    """
+    Calls a function when a node hasn't been seen for longer than the timeout period.
+
+    Every node has at most one entry in a heap, ordered by deadline. When that deadline passes the real deadline is checked,
+    because the node may have been seen in the meantime. If so, the entry is simply put back with the new deadline.
+    The thread only wakes up when the earliest deadline is reached. If an asyncio event loop is given, no thread is used at all:
+    a single timer on the loop is set for the earliest deadline instead.
+    """
+
+    def __init__(self, timeout_seconds, on_timeout, registry=None):
+        """
+        Initialize the object.
+
+        timeout_seconds -- after how many seconds of silence a node is considered to be gone
+        on_timeout -- function that is called with the node_id of a node that has timed out
+        registry -- the NodeRegistry that holds the last-seen timestamps. A new one is made if it isn't given.
+        """
+        self.timeout_seconds = timeout_seconds
+        self.on_timeout = on_timeout
+        self.running = False
+        self.thread = None
+        self.loop = None
+        self._timer = None # Timer on the event loop, if one is used
+
+        self.registry = registry if registry != None else NodeRegistry() # Holds the last-seen timestamps, per node ID
+        self._heap = [] # (deadline, node_id)
+        self._scheduled = bytearray(NODE_COUNT) # 1 for the node IDs that have an entry in the heap
+        self._condition = threading.Condition()
+
+
+    def seen(self, node_id, timestamp=None):
+        """ Records a sign of life from a node. This is called for every incoming message, so it's kept cheap. """
+        node_id = node_index(node_id)
+        if node_id == None:
+            return
+        if timestamp == None:
+            timestamp = time.time()
+        self.registry.last_seen[node_id] = timestamp
+        self.registry.tracked[node_id] = 1
+        if not self._scheduled[node_id]:
+            self._schedule(node_id, timestamp + self.timeout_seconds)
+
+
+    def forget(self, node_id):
+        """ Stops tracking a node, for example because it was removed. """
+        node_id = node_index(node_id)
+        if node_id == None:
+            return
+        with self._condition:
+            self.registry.tracked[node_id] = 0
+
+
+    def deadline(self, node_id):
+        """ Returns the moment the node will time out, or None if the node isn't being tracked. """
+        node_id = node_index(node_id)
+        if node_id == None or not self.registry.tracked[node_id]:
+            return None
+        return self.registry.last_seen[node_id] + self.timeout_seconds
+
+
+    def _schedule(self, node_id, deadline):
+        with self._condition:
+            if self._scheduled[node_id]:
+                return
+            self._scheduled[node_id] = 1
+            heapq.heappush(self._heap, (deadline, node_id))
+            if self._heap[0][1] == node_id:
+                # This is the new earliest deadline, so the thread may have to wake up sooner.
+                if self.loop != None:
+                    if self.running:
+                        self.loop.call_soon_threadsafe(self.check)
+                else:
+                    self._condition.notify()
+
+
+    def start(self, loop=None):
+        """ Starts watching the deadlines. If an asyncio event loop is given, the checks are run on that loop. """
+        if loop != None:
+            self.loop = loop
+            self.running = True
+            loop.call_soon_threadsafe(self.check)
+            return
+        if self.thread != None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+        if self.loop != None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._cancel_timer)
+
+
+    def run(self):
+        while self.running:
+            with self._condition:
+                if len(self._heap) == 0:
+                    self._condition.wait()
+                    continue
+                if self._heap[0][0] > time.time():
+                    self._condition.wait(self._heap[0][0] - time.time())
+                    continue
+            self._handle_timeouts(self._expire())
+
+
+    def check(self):
+        """ Handles the nodes that have timed out, and sets the timer for the next deadline. Runs on the event loop. """
+        self._cancel_timer()
+        if not self.running:
+            return
+        self._handle_timeouts(self._expire())
+        with self._condition:
+            if len(self._heap) > 0:
+                self._timer = self.loop.call_later(max(0, self._heap[0][0] - time.time()), self.check)
+
+
+    def _cancel_timer(self):
+        if self._timer != None:
+            self._timer.cancel()
+            self._timer = None
+
+
+    def _expire(self):
+        """ Removes the entries whose deadline has passed from the heap, and returns the nodes that have really timed out. """
+        timed_out = []
+        with self._condition:
+            now = time.time()
+            while len(self._heap) > 0 and self._heap[0][0] <= now:
+                deadline, node_id = heapq.heappop(self._heap)
+                self._scheduled[node_id] = 0
+                if self.registry.tracked[node_id]:
+                    real_deadline = self.registry.last_seen[node_id] + self.timeout_seconds
+                    if real_deadline > now:
+                        # The node was seen after this entry was made.
+                        self._scheduled[node_id] = 1
+                        heapq.heappush(self._heap, (real_deadline, node_id))
+                    else:
+                        timed_out.append(node_id)
+        return timed_out
+
+
+    def _handle_timeouts(self, timed_out):
+        # Called outside of the lock, as it may call seen() again.
+        for node_id in timed_out:
+            try:
+                self.on_timeout(node_id)
+            except Exception as ex:
+                _LOG.error("Error while handling node timeout: %s", ex)
@@ -0,0 +1,136 @@
+"""Logging for the adapter, with a level per subsystem and a flight recorder of the latest raw messages."""
+
+import collections
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+
+SUBSYSTEMS = ('adapter', 'messages', 'devices', 'properties', 'commands')
+
+_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+
+def get_logger(subsystem):
+    """ Returns the logger of a subsystem, like 'messages' or 'properties'. """
+    return logging.getLogger('mysensors.' + subsystem)
+
+
+
+class FlightRecorder(object):
+    """
+    Remembers the last MySensors messages that came in, so they can be shown when something goes wrong.
+
+    Recording a message only appends its fields to a fixed-size deque. They are only turned into text when the
+    recorder is dumped, so this is cheap enough to always be on.
+    """
+
+    def __init__(self, size=100):
+        self.messages = collections.deque(maxlen=size)
+
+
+    def record(self, message):
+        """ Records a PyMySensors message. """
+        self.messages.append((time.time(), message.node_id, message.child_id, message.type, getattr(message, 'ack', 0), message.sub_type, message.payload))
+
+
+    def dump(self):
+        """ Returns the recorded messages as text, oldest first. """
+        lines = []
+        for entry in list(self.messages):
+            timestamp = entry[0]
+            lines.append(time.strftime('%H:%M:%S', time.localtime(timestamp)) + ('%.3f' % (timestamp % 1))[1:] + ' ' + ';'.join(str(field) for field in entry[1:]))
+        return '\n'.join(lines)
+
+
+
+class FlightRecorderHandler(logging.Handler):
+    """ Writes the contents of the flight recorder to the log when an error is logged. Does so at most once per `interval` seconds. """
+
+    def __init__(self, recorder, interval=60):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.recorder = recorder
+        self.interval = interval
+        self.last_dump = 0
+
+
+    def emit(self, record):
+        if record.name == 'mysensors.flight_recorder' or len(self.recorder.messages) == 0 or time.time() - self.last_dump < self.interval:
+            return
+        self.last_dump = time.time()
+        get_logger('flight_recorder').error("Last %d messages before this error:\n%s", len(self.recorder.messages), self.recorder.dump())
+
+
+
+FLIGHT_RECORDER = FlightRecorder()
+
+_listener = None
+_queue_handler = None
+
+
+def configure_logging(debug=False, levels=None, flight_recorder_size=100):
+    """
+    Sets up the log levels and output. Can be called again when the settings change.
+
+    Log records are handed to a background thread that writes them to stdout. Logging a message therefore never
+    waits for the gateway to read the add-on's output, and messages below a subsystem's level are never formatted at all.
+
+    debug -- whether the subsystems log at debug level by default
+    levels -- dictionary of subsystem -> level name, to override the default for some subsystems
+    flight_recorder_size -- how many raw messages the flight recorder keeps
+    """
+    global _listener, _queue_handler
+
+    root = logging.getLogger('mysensors')
+    root.propagate = False
+    root.setLevel(logging.DEBUG if debug else logging.INFO)
+    for subsystem in SUBSYSTEMS:
+        get_logger(subsystem).setLevel(logging.NOTSET) # Follow the default
+    if levels != None:
+        for subsystem, level in levels.items():
+            if str(level).lower() in _LEVELS:
+                get_logger(subsystem).setLevel(_LEVELS[str(level).lower()])
+            else:
+                get_logger('adapter').warning("Unknown log level for %s: %s", subsystem, level)
+
+    if FLIGHT_RECORDER.messages.maxlen != flight_recorder_size:
+        FLIGHT_RECORDER.messages = collections.deque(FLIGHT_RECORDER.messages, maxlen=max(1, flight_recorder_size))
+
+    if _listener == None:
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(logging.Formatter('%(name)s %(levelname)s: %(message)s'))
+        log_queue = queue.Queue(-1)
+        _listener = logging.handlers.QueueListener(log_queue, output, FlightRecorderHandler(FLIGHT_RECORDER), respect_handler_level=True)
+        _listener.start()
+        _queue_handler = logging.handlers.QueueHandler(log_queue)
+        root.addHandler(_queue_handler)
+
+
+def parse_log_levels(text):
+    """ Turns a setting like 'messages=debug, properties=warning' into a dictionary. """
+    levels = {}
+    for part in str(text).split(','):
+        if '=' not in part:
+            continue
+        subsystem, level = part.split('=', 1)
+        if subsystem.strip() != '':
+            levels[subsystem.strip()] = level.strip()
+    return levels
+
+
+def stop_logging():
+    """ Writes out the remaining log records and stops the background thread. """
+    global _listener, _queue_handler
+    if _queue_handler != None:
+        logging.getLogger('mysensors').removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener != None:
+        _listener.stop()
+        _listener = None
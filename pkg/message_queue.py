@@ -0,0 +1,164 @@
+"""Bounded queue between PyMySensors and the WebThings Gateway."""
+
+import collections
+import threading
+import time
+
+from .logger import get_logger
+
+
+_LOG = get_logger('messages')
+
+
+OVERFLOW_POLICIES = ('block', 'drop oldest', 'coalesce')
+
+
+class MessageQueue(object):
+    """
+    Holds incoming MySensors messages until the dispatch worker has time to handle them.
+
+    This way a slow gateway can never stall the thread that reads from the serial port, network or MQTT broker.
+    The overflow policy only comes into play when the queue is full, so that under normal load every value arrives,
+    including short pulses like a motion sensor going 1 and back to 0.
+    """
+
+    def __init__(self, handler, maxsize=1000, policy='coalesce', block_seconds=0.5):
+        """
+        Initialize the object.
+
+        handler -- function that is called with each message, on the worker thread
+        maxsize -- how many messages may be waiting at most
+        policy -- what to do when the queue is full: 'block', 'drop oldest' or 'coalesce'
+        block_seconds -- how long 'block' waits for room at most, before dropping the oldest message after all.
+                         Messages are put on the event loop, so waiting holds up all communication with the network.
+        """
+        self.handler = handler
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_seconds = block_seconds
+        self.running = False
+        self.worker = None
+
+        self._order = collections.deque() # keys of waiting messages, oldest first
+        self._pending = {} # key -> message
+        self._latest = {} # (node_id, child_id, sub_type) -> key of the newest waiting 'set' message for that property
+        self._condition = threading.Condition()
+        self._counter = 0
+
+        # Statistics
+        self.received_count = 0
+        self.handled_count = 0
+        self.dropped_count = 0
+        self.coalesced_count = 0
+        self.max_depth = 0
+
+
+    def set_policy(self, policy):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError("unknown overflow policy: " + str(policy))
+        self.policy = policy
+
+
+    def depth(self):
+        """ Returns how many messages are waiting to be handled. """
+        return len(self._order)
+
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'received': self.received_count,
+            'handled': self.handled_count,
+            'dropped': self.dropped_count,
+            'coalesced': self.coalesced_count,
+        }
+
+
+    def put(self, message):
+        """ Adds a message to the queue. Called from the PyMySensors event loop. """
+        with self._condition:
+            self.received_count += 1
+
+            property_key = None
+            if message.type == 1: # Only 'set' messages are safe to merge.
+                property_key = (message.node_id, message.child_id, message.sub_type)
+
+            if len(self._order) >= self.maxsize:
+                if self.policy == 'coalesce' and property_key in self._latest:
+                    # A newer value for the same property replaces the older one, but keeps its place in line.
+                    self._pending[self._latest[property_key]] = message
+                    self.coalesced_count += 1
+                    return
+                if self.policy == 'block':
+                    deadline = time.time() + self.block_seconds
+                    while self.running and len(self._order) >= self.maxsize and time.time() < deadline:
+                        self._condition.wait(deadline - time.time())
+                if len(self._order) >= self.maxsize:
+                    self._drop_oldest()
+
+            self._counter += 1
+            key = self._counter
+            self._order.append(key)
+            self._pending[key] = message
+            if property_key != None:
+                self._latest[property_key] = key
+            if len(self._order) > self.max_depth:
+                self.max_depth = len(self._order)
+            self._condition.notify_all()
+
+
+    def _drop_oldest(self):
+        # Call with the lock held
+        self._remove(self._order.popleft())
+        self.dropped_count += 1
+
+
+    def _remove(self, key):
+        # Call with the lock held. Returns the message that was waiting under the key.
+        message = self._pending.pop(key)
+        if message.type == 1:
+            property_key = (message.node_id, message.child_id, message.sub_type)
+            if self._latest.get(property_key) == key:
+                del self._latest[property_key]
+        return message
+
+
+    def get(self, timeout=1):
+        """ Returns the oldest waiting message, or None if nothing arrived before the timeout. """
+        with self._condition:
+            if len(self._order) == 0:
+                self._condition.wait(timeout)
+                if len(self._order) == 0:
+                    return None
+            message = self._remove(self._order.popleft())
+            self._condition.notify_all()
+            return message
+
+
+    def start(self):
+        if self.worker != None and self.worker.is_alive():
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self.run)
+        self.worker.daemon = True
+        self.worker.start()
+
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+
+
+    def run(self):
+        """ The dispatch worker. Hands the messages to the adapter one by one. """
+        while self.running:
+            message = self.get()
+            if message == None:
+                continue
+            try:
+                self.handler(message)
+            except Exception as ex:
+                _LOG.error("Error in message queue worker: %s", ex)
+            self.handled_count += 1
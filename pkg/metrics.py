@@ -0,0 +1,241 @@
+"""Counters and histograms that show how the adapter performs, in Prometheus text format."""
+
+import bisect
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+    ThreadingHTTPServer = None
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+class Histogram(object):
+    """ Counts observations per bucket. Buckets are upper bounds, like Prometheus' 'le' label. """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # The last one is +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+    def quantile(self, q):
+        """ Estimates a quantile, by returning the upper bound of the bucket it falls in. """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index < len(self.buckets):
+                    return self.buckets[index]
+                return float('inf')
+        return float('inf')
+
+
+
+class Metrics(object):
+    """
+    Keeps the adapter's counters and histograms.
+
+    Values are stored per name and per set of labels. Gauges aren't stored: functions that add them on the fly can be
+    registered with add_collector(), so that for example the depth of the message queue is only looked up when asked.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._help = {} # name -> (type, help text)
+        self._counters = {} # name -> {labels: value}
+        self._histograms = {} # name -> {labels: Histogram}
+        self._buckets = {} # name -> buckets
+        self._collectors = []
+
+
+    def describe_counter(self, name, help_text):
+        self._help[name] = ('counter', help_text)
+        self._counters.setdefault(name, {})
+
+
+    def describe_histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._help[name] = ('histogram', help_text)
+        self._histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+
+    def add_collector(self, collector):
+        """ Registers a function that returns a list of (name, help text, labels, value) gauges. """
+        self._collectors.append(collector)
+
+
+    def inc(self, name, labels=(), amount=1):
+        """ Increases a counter. Labels are a tuple of (name, value) pairs. """
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[labels] = values.get(labels, 0) + amount
+
+
+    def observe(self, name, value, labels=()):
+        """ Adds an observation, like a duration in seconds, to a histogram. """
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            histogram = histograms.get(labels)
+            if histogram == None:
+                histogram = Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+                histograms[labels] = histogram
+            histogram.observe(value)
+
+
+    def counter_values(self, name):
+        """ Returns a copy of the values of a counter, as a dictionary of labels -> value. """
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+
+    def histogram(self, name, labels=()):
+        with self._lock:
+            return self._histograms.get(name, {}).get(labels)
+
+
+    def render(self):
+        """ Returns all metrics in the Prometheus text exposition format. """
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                self._header(lines, name, 'counter')
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(name + format_labels(labels) + ' ' + format_value(value))
+
+            for name in sorted(self._histograms):
+                self._header(lines, name, 'histogram')
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        lines.append(name + '_bucket' + format_labels(labels + (('le', format_value(bound)),)) + ' ' + str(cumulative))
+                    lines.append(name + '_sum' + format_labels(labels) + ' ' + format_value(histogram.total))
+                    lines.append(name + '_count' + format_labels(labels) + ' ' + str(histogram.count))
+
+        described = set()
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as ex:
+                _LOG.error("Error while collecting metrics: %s", ex)
+                continue
+            for name, help_text, labels, value in gauges:
+                if value == None:
+                    continue
+                if name not in described:
+                    described.add(name)
+                    lines.append('# HELP ' + name + ' ' + help_text)
+                    lines.append('# TYPE ' + name + ' gauge')
+                lines.append(name + format_labels(labels) + ' ' + format_value(value))
+
+        return '\n'.join(lines) + '\n'
+
+
+    def _header(self, lines, name, default_type):
+        metric_type, help_text = self._help.get(name, (default_type, name))
+        lines.append('# HELP ' + name + ' ' + help_text)
+        lines.append('# TYPE ' + name + ' ' + metric_type)
+
+
+
+def format_labels(labels):
+    if len(labels) == 0:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(key + '="' + value + '"')
+    return '{' + ','.join(parts) + '}'
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+
+class MetricsServer(object):
+    """ Serves the metrics over HTTP on the loopback interface only, at /metrics. """
+
+    def __init__(self, metrics, port):
+        self.metrics = metrics
+        self.port = port
+        self.server = None
+
+
+    def start(self):
+        if ThreadingHTTPServer == None or self.server != None:
+            return
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Don't flood the add-on log with every scrape
+
+        try:
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+            self.server.daemon_threads = True
+            t = threading.Thread(target=self.server.serve_forever, name='mysensors-metrics')
+            t.daemon = True
+            t.start()
+            _LOG.info("Metrics are available at http://127.0.0.1:%s/metrics", self.port)
+        except Exception as ex:
+            _LOG.warning("Could not start metrics server on port %s: %s", self.port, ex)
+            self.server = None
+
+
+    def stop(self):
+        if self.server != None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+
+# The adapter's metrics. Modules record into this directly, like the default registry of a Prometheus client.
+METRICS = Metrics()
+
+METRICS.describe_counter('mysensors_messages_total', 'Incoming MySensors messages, per message type.')
+METRICS.describe_histogram('mysensors_message_queue_wait_seconds', 'Time incoming messages spent waiting in the message queue.')
+METRICS.describe_histogram('mysensors_message_handle_seconds', 'Time it took to handle an incoming message.')
+METRICS.describe_histogram('mysensors_property_notify_latency_seconds', 'Time from receiving a value until the gateway was notified of it, including rate limiting.')
+METRICS.describe_histogram('mysensors_command_round_trip_seconds', 'Time from set_value until the node acknowledged the command.')
+METRICS.describe_histogram('mysensors_clock_tick_seconds', 'Time the work in a clock tick took.')
+METRICS.describe_histogram('mysensors_rediscovery_seconds', 'Duration of asking all nodes to present themselves again.', DURATION_BUCKETS)
@@ -0,0 +1,309 @@
+"""MQTT client that runs on the adapter's asyncio event loop."""
+
+import asyncio
+import collections
+import random
+import socket
+import threading
+
+import paho.mqtt.client as mqtt # pylint: disable=import-error
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+class AsyncMQTTClient(object):
+    """
+    Connects PyMySensors' AsyncMQTTGateway to an MQTT broker, without a separate network thread.
+
+    Paho does the MQTT protocol work, but its socket is watched by the event loop, so incoming messages are handed
+    to PyMySensors directly. If the connection to the broker is lost, the client keeps reconnecting with a growing
+    delay, and subscribes to all the topics again once it's back.
+
+    Messages that are published in the same loop iteration are sent together. Messages with QoS 1 or 2 are only sent
+    while fewer than `inflight_window` of them are waiting for the broker to acknowledge them. While the broker is
+    unreachable messages are kept in the outbox, up to `outbox_size`.
+    """
+
+    def __init__(self, broker, port, keepalive, loop, inflight_window=20, outbox_size=1000, max_backoff=30):
+        """
+        Initialize the object.
+
+        broker -- IP address or hostname of the MQTT broker
+        port -- port of the MQTT broker, usually 1883
+        keepalive -- seconds between keepalive pings
+        loop -- the asyncio event loop to run on
+        inflight_window -- how many QoS 1 or 2 messages may be waiting for an acknowledgement at the same time
+        outbox_size -- how many messages are kept while the broker can't be reached. The oldest are dropped first.
+        max_backoff -- the longest delay (in seconds) between reconnection attempts
+        """
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.loop = loop
+        self.inflight_window = inflight_window
+        self.max_backoff = max_backoff
+        self.running = False
+        self.connected = False
+        self.topics = {} # topic -> (callback, qos)
+
+        self.connect_count = 0
+        self.disconnect_count = 0
+        self.published_count = 0
+        self.received_count = 0
+        self.dropped_count = 0
+
+        self._outbox = collections.deque() # (topic, payload, qos, retain)
+        self._outbox_size = outbox_size
+        self._inflight = set() # message IDs of QoS 1 and 2 messages that haven't been acknowledged yet
+        self._flush_scheduled = False
+        self._backoff = 1
+        self._reconnect_handle = None
+        self._misc_task = None
+        self._socket_fd = None
+        self._loop_thread_id = None
+
+        if hasattr(mqtt, 'CallbackAPIVersion'):
+            self._mqttc = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1) # Paho 2.x
+        else:
+            self._mqttc = mqtt.Client()
+        self._mqttc.on_connect = self._on_connect
+        self._mqttc.on_disconnect = self._on_disconnect
+        self._mqttc.on_publish = self._on_publish
+        self._mqttc.on_socket_open = self._on_socket_open
+        self._mqttc.on_socket_close = self._on_socket_close
+        self._mqttc.on_socket_register_write = self._on_socket_register_write
+        self._mqttc.on_socket_unregister_write = self._on_socket_unregister_write
+
+
+    def authenticate(self, username, password):
+        """ Authenticate with username and password """
+        self._mqttc.username_pw_set(username, password)
+
+
+    def start(self):
+        """ Starts connecting to the broker. Can be called from any thread. """
+        self.running = True
+        self.loop.call_soon_threadsafe(self._start)
+
+
+    def stop(self):
+        """ Disconnects from the broker. Can be called from any thread. """
+        self.running = False
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._stop)
+
+
+    def stats(self):
+        return {
+            'connected': self.connected,
+            'connects': self.connect_count,
+            'disconnects': self.disconnect_count,
+            'published': self.published_count,
+            'received': self.received_count,
+            'dropped': self.dropped_count,
+            'outbox': len(self._outbox),
+            'inflight': len(self._inflight),
+        }
+
+
+    def publish(self, topic, payload, qos, retain):
+        """ Publish an MQTT message. The message is sent at the end of the current loop iteration, together with any others. """
+        if len(self._outbox) >= self._outbox_size:
+            self._outbox.popleft()
+            self.dropped_count += 1
+        self._outbox.append((topic, payload, qos, retain))
+        self._schedule_flush()
+
+
+    def subscribe(self, topic, callback, qos):
+        """ Subscribe to an MQTT topic. The subscription is renewed every time the connection is made again. """
+        if topic in self.topics:
+            _LOG.debug("MQTT: already subscribed to %s", topic)
+            return
+
+        def _message_callback(mqttc, userdata, msg):
+            """ Called on the event loop, as the socket is read there. """
+            self.received_count += 1
+            callback(msg.topic, msg.payload.decode('utf-8'), msg.qos)
+
+        self.topics[topic] = (callback, qos)
+        self._mqttc.message_callback_add(topic, _message_callback)
+        if self.connected:
+            self._mqttc.subscribe(topic, qos)
+
+
+    # Connecting
+
+    def _start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._connect()
+
+
+    def _stop(self):
+        if self._reconnect_handle != None:
+            self._reconnect_handle.cancel()
+            self._reconnect_handle = None
+        try:
+            self._mqttc.disconnect()
+        except Exception as ex:
+            _LOG.error("Error while disconnecting from MQTT broker: %s", ex)
+        self._stop_misc_task()
+
+
+    def _connect(self):
+        self._reconnect_handle = None
+        if not self.running:
+            return
+        # Opening the connection may take a while if the broker can't be reached, so it's not done on the event loop.
+        future = self.loop.run_in_executor(None, self._blocking_connect)
+        future.add_done_callback(self._connect_done)
+
+
+    def _blocking_connect(self):
+        if self.connect_count == 0 and self.disconnect_count == 0:
+            self._mqttc.connect(self.broker, self.port, self.keepalive)
+        else:
+            self._mqttc.reconnect()
+
+
+    def _connect_done(self, future):
+        ex = future.exception()
+        if ex != None:
+            _LOG.warning("Could not connect to MQTT broker at %s:%s: %s", self.broker, self.port, ex)
+            self._schedule_reconnect()
+
+
+    def _schedule_reconnect(self):
+        if not self.running or self._reconnect_handle != None:
+            return
+        delay = self._backoff + random.uniform(0, self._backoff / 2) # Some jitter, so that many clients don't all return at once.
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+        _LOG.debug("MQTT: reconnecting in %s seconds", round(delay, 1))
+        self._reconnect_handle = self.loop.call_later(delay, self._connect)
+
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            _LOG.warning("MQTT broker refused the connection: %s", mqtt.connack_string(rc))
+            return
+        _LOG.info("Connected to MQTT broker")
+        self.connected = True
+        self.connect_count += 1
+        self._backoff = 1
+        self._inflight.clear()
+        for topic, (callback, qos) in self.topics.items():
+            self._mqttc.subscribe(topic, qos)
+        self._schedule_flush()
+
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        self.disconnect_count += 1
+        self._inflight.clear()
+        if self.running:
+            _LOG.warning("Lost connection to MQTT broker (%s)", rc)
+            self._call_in_loop(self._schedule_reconnect)
+
+
+    # Publishing
+
+    def _schedule_flush(self):
+        if self._flush_scheduled:
+            return
+        self._flush_scheduled = True
+        self._call_in_loop(self._flush)
+
+
+    def _flush(self):
+        self._flush_scheduled = False
+        while self.connected and len(self._outbox) > 0:
+            topic, payload, qos, retain = self._outbox[0]
+            if qos > 0 and len(self._inflight) >= self.inflight_window:
+                break # The rest is sent once the broker has acknowledged some of the earlier messages.
+            self._outbox.popleft()
+            info = self._mqttc.publish(topic, payload, qos, retain)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                self._outbox.appendleft((topic, payload, qos, retain))
+                break
+            self.published_count += 1
+            if qos > 0:
+                self._inflight.add(info.mid)
+
+
+    def _on_publish(self, client, userdata, mid):
+        if mid in self._inflight:
+            self._inflight.discard(mid)
+            if len(self._outbox) > 0:
+                self._schedule_flush()
+
+
+    # Letting the event loop watch paho's socket
+
+    def _call_in_loop(self, function, *args):
+        if threading.get_ident() == self._loop_thread_id:
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
+
+
+    def _on_socket_open(self, client, userdata, sock):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048)
+        except Exception:
+            pass
+        self._call_in_loop(self._watch_socket, sock.fileno())
+
+
+    def _watch_socket(self, fd):
+        self._socket_fd = fd
+        self.loop.add_reader(fd, self._mqttc.loop_read)
+        self._stop_misc_task()
+        self._misc_task = self.loop.create_task(self._misc_loop())
+
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call_in_loop(self._unwatch_socket)
+
+
+    def _unwatch_socket(self):
+        if self._socket_fd != None:
+            self.loop.remove_reader(self._socket_fd)
+            self.loop.remove_writer(self._socket_fd)
+            self._socket_fd = None
+        self._stop_misc_task()
+
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call_in_loop(self._watch_writable)
+
+
+    def _watch_writable(self):
+        if self._socket_fd != None:
+            self.loop.add_writer(self._socket_fd, self._mqttc.loop_write)
+
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self._unwatch_writable)
+
+
+    def _unwatch_writable(self):
+        if self._socket_fd != None:
+            self.loop.remove_writer(self._socket_fd)
+
+
+    def _stop_misc_task(self):
+        if self._misc_task != None:
+            self._misc_task.cancel()
+            self._misc_task = None
+
+
+    async def _misc_loop(self):
+        """ Lets paho send keepalive pings and notice a dead connection. """
+        while self._mqttc.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
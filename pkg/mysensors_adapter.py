@@ -7,13 +7,14 @@ sys.path.append(path.join(path.dirname(path.abspath(__file__)), 'lib'))
 
 import json
 import asyncio
+import collections
+import functools
 import logging
 import threading
 
 import serial
 import serial.tools.list_ports as prtlst
 
-import paho.mqtt.client as mqtt # pylint: disable=import-error
 import mysensors.mysensors as mysensors
 
 import time
@@ -21,11 +22,34 @@ from time import sleep
 
 from gateway_addon import Adapter, Database
 from .mysensors_device import MySensorsDevice
-from .util import pretty, is_a_number, get_int_or_float
+from .announcer import DeviceAnnouncer
+from .message_queue import MessageQueue
+from .capture import CaptureWriter
+from .payload import get_decoder
+from .metrics import METRICS, MetricsServer
+from .diagnostics_device import DiagnosticsDevice
+from .command_queue import CommandQueue
+from .mqtt_client import AsyncMQTTClient
+from .event_loop import EventLoopThread
+from .liveness import LivenessTracker
+from .node_registry import NodeRegistry
+from .node_throttle import NodeThrottle
+from .rediscovery import Rediscovery
+from .persistence import PersistenceFile, JournalPersistence
+from .serial_probe import probe_ports, PortCache
+from .usb_watcher import UsbWatcher
+from .logger import get_logger, configure_logging, parse_log_levels, stop_logging, FLIGHT_RECORDER
+from .util import pretty, parse_type_settings, parse_deadband, parse_host_and_port
 
 
 _TIMEOUT = 3
 
+MESSAGE_TYPE_NAMES = ['presentation','set','request','internal','stream']
+_MESSAGE_TYPE_LABELS = [(('type', type_name),) for type_name in MESSAGE_TYPE_NAMES] # Prepared once, as they are used for every message
+
+_LOG = get_logger('messages')
+_ADAPTER_LOG = get_logger('adapter')
+
 _CONFIG_PATHS = [
     os.path.join(os.path.expanduser('~'), '.webthings', 'config'),
 ]
@@ -44,7 +68,8 @@ class MySensorsAdapter(Adapter):
 
         verbose -- whether or not to enable verbose logging
         """
-        print("initialising adapter from class")
+        configure_logging(True) # Debugging is on until the settings have been loaded
+        _ADAPTER_LOG.info("initialising adapter from class")
         self.pairing = False
         self.name = self.__class__.__name__
         self.addon_name = 'mysensors-adapter'
@@ -59,8 +84,10 @@ class MySensorsAdapter(Adapter):
                 )
         self.addon_path = os.path.join(self.user_profile['addonsDir'], self.addon_name)
         self.persistence_file_path = os.path.join(self.user_profile['dataDir'], self.addon_name,'mysensors-adapter-persistence.json')
+        self.persistence = PersistenceFile(self.persistence_file_path)
+        self.serial_port_cache = PortCache(os.path.join(self.user_profile['dataDir'], self.addon_name, 'mysensors-adapter-serial-port.json'))
         
-        print("User profile data: " + str(self.user_profile))
+        _ADAPTER_LOG.info("User profile data: %s", self.user_profile)
         
         self.metric = True
         self.temperature_unit = 'degree celsius'
@@ -69,6 +96,7 @@ class MySensorsAdapter(Adapter):
         self.show_connection_status = True
         self.first_request_done = False
         self.initial_serial_devices = set()
+        self.serial_port_info = {} # port_id -> (vid, pid, serial_number)
         self.optimize = True
         self.running = True
         
@@ -81,209 +109,171 @@ class MySensorsAdapter(Adapter):
         self.MQTT_in_prefix = "mygateway1-in"
         
         self.GATEWAY = None
+        self.gateway_start = None # Future of PyMySensors connecting to the receiver
         #self.things_list = [] # not used?
         
         self.timeout_seconds = 0 # the default is a day
-        self.last_seen_timestamps = {}
-        self.previous_heartbeats = {}
+        self.rediscovery = None # The currently running (or last) rediscovery
+        self.rediscovery_report = None # Summary of the last rediscovery: duration, responders and silent nodes
+        self.rediscovery_skip_seconds = 600 # Nodes that presented themselves this recently are not asked again
+        self.last_presentation_times = {}
+        
+        # Staged startup. Devices from persistence are first announced without properties, which are then added in the background.
+        self.staged_startup = False
+        self.pending_materialization = collections.OrderedDict() # node_id -> (device, nodeIndex, persistence data)
+        self.materializing = {} # node_id -> threading.Event that is set once the node's properties exist
+        self.materialize_lock = threading.Lock()
+        
+        self.event_loop = EventLoopThread() # Runs PyMySensors, whichever way the receiver is connected. Asyncio debug mode is only turned on when debugging.
+        # Outgoing commands ask the node for an acknowledgement, and are repeated until it arrives. 0 retries turns this off.
+        self.command_retries = 3
+        self.command_queue = None
+        
+        self.nodes = NodeRegistry() # Last seen, heartbeat, battery and message count of every node
+        self.liveness = LivenessTracker(self.timeout_seconds, self.node_timed_out, self.nodes)
+        
+        # Limits on how often properties may update the gateway. Can be set for all properties, and per S_TYPE.
+        self.minimum_update_interval = 0 # seconds
+        self.update_intervals = {} # S_TYPE -> seconds
+        self.deadbands = {} # S_TYPE -> (amount, is_percentage)
+        
+        self.property_index = {} # (node_id, child_id, sub_type) -> [property, [clone properties]]. Allows incoming messages to find their property without any string building.
+        
+        # New devices are available to the adapter right away, but are announced to the gateway a moment later, once they have all their properties.
+        self.announcer = DeviceAnnouncer(self.announce_device, delay=0.5)
+        
+        # Incoming messages are handled by a separate worker thread, so that a slow gateway can't stall the MySensors network.
+        self.message_queue = MessageQueue(self.dispatch_message, maxsize=1000, policy='coalesce')
+        self.message_queue.start()
+        self.message_received_at = None # When the message that is currently being handled arrived
+        
+        # Each node may only send so many messages per minute, so that one with buggy firmware can't drown out the others.
+        self.throttle = NodeThrottle(self.queue_message, self.node_throttled, messages_per_minute=600, burst=60)
+        
+        # Metrics, available in Prometheus format on a local port, and optionally as a 'MySensors Gateway' thing.
+        self.metrics_port = 0 # 0 means the metrics aren't served
+        self.metrics_server = None
+        self.show_diagnostics = False
+        self.diagnostics_device = None
+        self.previous_node_message_counts = None
+        self.capture = None # Records incoming messages to a file, for tools/replay.py
+        METRICS.add_collector(self.collect_metrics)
         
         self.no_receiver_plugged_in = False
+        self.serial_port = ''
+        self.usb_watcher = UsbWatcher(self.usb_changed)
+        self.attach_lock = threading.Lock()
         self.remember_devices = True # if set to false, then 'recreate_from_persistence' won't be called when the addon starts. The devices will have to present themselves again.
         
         try:
-            print("Making initial scan of USB ports")
+            _ADAPTER_LOG.info("Making initial scan of USB ports")
             self.scan_usb_ports()
         except:
-            print("Error during initial scan of usb ports")
+            _ADAPTER_LOG.error("Error during initial scan of usb ports")
         
         try:
             self.add_from_config()
         except Exception as ex:
-            print("Error loading config (and initialising PyMySensors library?): " + str(ex))
+            _ADAPTER_LOG.error("Error loading config (and initialising PyMySensors library?): %s", ex)
 
-        print("End of MySensors adapter init process")
+        _ADAPTER_LOG.info("End of MySensors adapter init process")
 
 
     def clock(self):
-        """ Runs every minute and updates which devices are still connected """
-        if self.DEBUG:
-            print("clock thread init")
+        """ Once an hour asks all nodes to present themselves again. """
+        _ADAPTER_LOG.debug("clock thread init")
             
         seconds_counter = 50;
         minutes_counter = 0;
         while self.running:
 
-            wait_time = 60
-            if self.no_receiver_plugged_in:
-                wait_time = 5 # Do very quick looping to see if a receiver was plugged in
-
-            if seconds_counter > wait_time:
+            if seconds_counter > 60:
+                tick_started = time.time()
                 seconds_counter = 0
                 minutes_counter += 1
                 
-                if self.no_receiver_plugged_in:
-                     self.scan_usb_ports()
-                     if len(self.initial_serial_devices) != 0:
-                         self.send_pairing_prompt("MySensors receiver detected")
-                         exit() # should restart the addon
-                     else:
-                         if self.DEBUG:
-                             print("Still no MySensors receiver plugged in")
-                else:
-                    try:
-                        current_time = int(time.time())
-                        if self.DEBUG:
-                            print("CLOCK TICK " + str(current_time) )
-                        for nodeIndex in self.last_seen_timestamps:
-                            if self.DEBUG:
-                                print("- Clock: nodeIndex in last_seen_timestamps: " + str(nodeIndex))
-                    
-                            pymy_heartbeat = 0
-                            if nodeIndex in self.GATEWAY.sensors:
-                                #if self.DEBUG:
-                                #    print("nodeIndex was in self.GATEWAY.sensors")
-                                try:
-                                    # Some devices don't regularly send data, such as the smart lock, but they do send a 'heartbeat' signal to let us know they are still up and running.
-                                    # Here we check if the heartbeat counter has changed since the previous clock tick. If it has, it gets a fresh timestamp.
-                                    if hasattr(self.GATEWAY.sensors[nodeIndex], 'heartbeat'):
-                                        if self.DEBUG:
-                                            print("This device has sent heartbeat signals")
-                                        
-                                        # if this is a new device that doesn't have any previous_heartBeat data, add it to the list.
-                                        if nodeIndex not in self.last_seen_timestamps:
-                                            self.last_seen_timestamps.update( {int(nodeIndex):0} )
-                                        if nodeIndex not in self.previous_heartbeats:
-                                            self.previous_heartbeats.update( {int(nodeIndex):0} )
-                                        
-                                        if int(self.GATEWAY.sensors[nodeIndex].heartbeat) != int(self.previous_heartbeats[nodeIndex]):
-                                            self.previous_heartbeats[nodeIndex] = int(self.GATEWAY.sensors[nodeIndex].heartbeat)
-                                            self.last_seen_timestamps[nodeIndex] = int(time.time())
-                                            if self.DEBUG:
-                                                print("updated timeout timestamp using heartbeat data")
-                                    else:
-                                        if self.DEBUG:
-                                            print("This device does not seem to send a heartbeat (yet).")
-                        
-                                except Exception as ex:
-                                    if self.DEBUG:
-                                        print("Error trying to get heartbeat for timeout (device doesn't send heartbeats?): " + str(ex))
-                    
-                            # Has the devices recently given some sign that it's alive? If not, set it to disconnected.
-                            # This is only done for devices that have recently crossed the timeout threshold.
-                            # A small window in which we tell the Gateway to set it to disconnected. This way we don't update the gateway's connection status too often.
-                            if self.DEBUG:
-                                print(str(nodeIndex) + " was last seen " + str( current_time - int(self.last_seen_timestamps[nodeIndex]) ) +  " seconds ago. Timeout threshold: " + str(self.timeout_seconds))
-                    
-                            try:
-                                if int(self.last_seen_timestamps[nodeIndex]) < (current_time - self.timeout_seconds): # and int(self.last_seen_timestamps[nodeIndex]) > ((current_time - self.timeout_seconds) - 120): 
-                                    # This device hasn't been seen in a while.
-
-                                    try:
-                                        targetDevice = self.get_device("MySensors-" + str(nodeIndex))
-                                        if str(targetDevice) != 'None':
-                                            if targetDevice.connected == True:
-                                                targetDevice.connected = False
-                                                targetDevice.connected_notify(False)
-                                            if self.DEBUG:
-                                                print("-Setting device status to not connected.")
-                                        else:
-                                            if self.DEBUG:
-                                                print("-Strange, couldn't actually find the device to set it to disconnected")
-                                    except Exception as ex:
-                                            print("-Error updating state to disconnected: " + str(ex))
-                                #else:
-                                    #if self.DEBUG:
-                                    #    print(str(nodeIndex) + " has been spotted recently enough")
-                        
-                                    #try:
-                                    #    targetDevice = self.get_device("MySensors-" + str(nodeIndex))
-                                    #    if str(targetDevice) != 'None':
-                                    #        if targetDevice.connected == False:
-                                    #            targetDevice.connected = True
-                                    #            targetDevice.connected_notify(True)
-                                    #        if self.DEBUG:
-                                    #            print("-Setting device status to (re-)connected.")
-                                    #    else:
-                                    #        print("-Strange, couldn't actually find the device to set it to (re-)connected")
-                                    #except Exception as ex:
-                                    #        print("-Error updating state to connected: " + str(ex))
-                            except Exception as ex:
-                                print("-Error updating state from last_seen_timestamps: " + str(ex))
-                            
-                    except Exception as ex:
-                        print("Clock error: " + str(ex))
-                    
-                    
+                # Whether a receiver was plugged in is handled by the USB watcher.
+                # Checking which devices are still connected is done by the liveness tracker, which wakes up exactly when a node times out.
+                if not self.no_receiver_plugged_in:
                     if minutes_counter > 60: # every hour, send out a discovery request to all nodes in the network
-                        if self.DEBUG:
-                            print("An hour has passed. Calling try_request, asking all MySensors devices to present themselves again.")
+                        _ADAPTER_LOG.debug("An hour has passed. Calling try_request, asking all MySensors devices to present themselves again.")
                         minutes_counter = 0
                         self.try_rerequest()
+                METRICS.observe('mysensors_clock_tick_seconds', time.time() - tick_started)
 
             time.sleep(1)
             seconds_counter += 1
             
-        if self.DEBUG:
-            print("While-loop in clock thread has been exited")
+        _ADAPTER_LOG.debug("While-loop in clock thread has been exited")
 
 
 
 
 
+    def node_timed_out(self, node_id):
+        """ Called by the liveness tracker when a node hasn't been heard from within the timeout period. """
+        _ADAPTER_LOG.debug("Node %s has not been seen for %s seconds", node_id, self.timeout_seconds)
+        
+        # Some devices don't regularly send data, such as the smart lock, but they do send a 'heartbeat' signal to let us know they are still up and running.
+        # Like any other message, a heartbeat already gives the node a fresh timestamp, so a node that still sends them never gets here.
+        
+        try:
+            targetDevice = self.get_device("MySensors-" + str(node_id))
+            if targetDevice != None:
+                if targetDevice.connected == True:
+                    targetDevice.connected = False
+                    targetDevice.connected_notify(False)
+                    self.nodes.set_connected(node_id, False)
+                _ADAPTER_LOG.debug("-Setting device status to not connected.")
+            else:
+                _ADAPTER_LOG.debug("-Strange, couldn't actually find the device to set it to disconnected")
+        except Exception as ex:
+            _ADAPTER_LOG.error("-Error updating state to disconnected: %s", ex)
+
+
+
     def recreate_from_persistence(self):
-        if self.DEBUG:
-            print("RECREATING DEVICES FROM PERSISTENCE")
+        _ADAPTER_LOG.debug("RECREATING DEVICES FROM PERSISTENCE")
         
         try:
-            with open(self.persistence_file_path) as f:
-                self.last_known_data = json.load(f)
-                #print(str(self.last_known_data))
+            last_known_data = self.persistence.load()
         except Exception as ex:
-            print("Could not open persistence JSON file (if you just installed the add-on then this is normal): " + str(ex))
+            _ADAPTER_LOG.warning("Could not open persistence JSON file (if you just installed the add-on then this is normal): %s", ex)
             return
         
         try:
-            for nodeIndex in self.last_known_data:
-                if self.DEBUG:
-                    print("")
-                    print("#" + str(nodeIndex))
-                node = self.last_known_data[nodeIndex]
+            for nodeIndex in last_known_data:
+                _ADAPTER_LOG.debug("#%s", nodeIndex)
+                node = last_known_data[nodeIndex]
                 #print("node object:" + str(node))
                 #if int(nodeIndex) != 0:
                 
                 # Add device to list of timestamps
                 if self.timeout_seconds != 0:
                     try:
-                        self.last_seen_timestamps.update( {int(nodeIndex):0} ) # They all start out with a time of 0, pretending they were last spotted in 1970.
-                        self.previous_heartbeats.update( {int(nodeIndex):0} )
+                        self.liveness.seen(nodeIndex, 0) # They all start out with a time of 0, pretending they were last spotted in 1970.
                     except:
-                        print("Couldn't add device to timestamp list")
+                        _ADAPTER_LOG.warning("Couldn't add device to timestamp list")
                 
                 # Recreate
                 try:
                     if str(node['sketch_name']) == 'None':
                         name = 'MySensors-{}'.format(nodeIndex)
-                        if self.DEBUG:
-                            print("-Node was in persistence, but no sketch name was found.")
+                        _ADAPTER_LOG.debug("-Node was in persistence, but no sketch name was found.")
                     else:
-                        name = str(node['sketch_name']) ##str(self.last_known_data[nodeIndex].sketch_name)
+                        name = str(node['sketch_name']) ##str(last_known_data[nodeIndex].sketch_name)
                         
-                    if self.DEBUG:
-                        print("")
-                        print("-Recreating: " + str(name))
+                    _ADAPTER_LOG.debug("-Recreating: %s", name)
                     
                     # We create the device object
                     device = MySensorsDevice(self, nodeIndex, name)
                     
-                    if node['children']:
-                        for childIndex in node['children']:
-                            child = node['children'][childIndex] #self.last_known_data[nodeIndex].children[childIndex]
-                            #print("CHILD OBJECT: " + str(child))
-                            if child['values']:
-                                for valueIndex in child['values']:
-                                    #print("child['values'][" + str(valueIndex) + "] = " + str(child['values'][valueIndex]))
-                                    if int(valueIndex) != 43: #Avoid V_UNIT_PREFIX
-                                        device.add_child(child['description'], nodeIndex, childIndex, child['type'], valueIndex, child['values'], None) #child['values'][valueIndex])
+                    if self.staged_startup:
+                        # Only announce an empty shell for now. The properties are added by a background thread.
+                        with self.materialize_lock:
+                            self.pending_materialization[int(nodeIndex)] = (device, nodeIndex, node)
+                    else:
+                        self.add_children_from_persistence(device, nodeIndex, node)
                                         
                     # Finally, now that the device is complete, we present it to the Gateway.
                     self.handle_device_added(device)
@@ -292,261 +282,407 @@ class MySensorsAdapter(Adapter):
                     try:
                         #print("self.show_connection_status = " + str(self.show_connection_status))
                         if self.timeout_seconds != 0:
-                            if self.DEBUG:
-                                print("Showing device as disconnected. It will be set to 'connected' as soon as it actually makes a connection.")
+                            _ADAPTER_LOG.debug("Showing device as disconnected. It will be set to 'connected' as soon as it actually makes a connection.")
                             # Create a handle to the new device, and use its notify function.
                             targetDevice = self.get_device("MySensors-" + str(nodeIndex))
                             if str(targetDevice) != 'None':
                                 targetDevice.connected = False
                                 targetDevice.connected_notify(False)
-                                if self.DEBUG:
-                                    print("-Setting initial device status to not connected.")
+                                _ADAPTER_LOG.debug("-Setting initial device status to not connected.")
                         else:
-                            print("Not changing connection status")
+                            _ADAPTER_LOG.info("Not changing connection status")
                     except Exception as ex:
-                        print("Failed to set initial connection status to false: " + str(ex))
+                        _ADAPTER_LOG.error("Failed to set initial connection status to false: %s", ex)
                         
                 except Exception as ex:
-                    print("Error during recreation of thing from persistence: " + str(ex))
+                    _ADAPTER_LOG.error("Error during recreation of thing from persistence: %s", ex)
                         
         except Exception as ex:
-            print("Error during recreation from persistence: " + str(ex))
+            _ADAPTER_LOG.error("Error during recreation from persistence: %s", ex)
             
-        if self.DEBUG:
-            print("End of recreation function")
+        if len(self.pending_materialization) > 0:
+            try:
+                t = threading.Thread(target=self.materialize_devices)
+                t.daemon = True
+                t.start()
+            except Exception as ex:
+                _ADAPTER_LOG.error("Error starting the thread that recreates device properties: %s", ex)
+        
+        _ADAPTER_LOG.debug("End of recreation function")
         return
 
 
 
+    def add_children_from_persistence(self, device, nodeIndex, node):
+        """ Turns all the children of a node from the persistence data into properties of the device. """
+        if node['children']:
+            for childIndex in node['children']:
+                child = node['children'][childIndex] #last_known_data[nodeIndex].children[childIndex]
+                #print("CHILD OBJECT: " + str(child))
+                if child['values']:
+                    for valueIndex in child['values']:
+                        #print("child['values'][" + str(valueIndex) + "] = " + str(child['values'][valueIndex]))
+                        if int(valueIndex) != 43: #Avoid V_UNIT_PREFIX
+                            device.add_child(child['description'], nodeIndex, childIndex, child['type'], valueIndex, child['values'], None) #child['values'][valueIndex])
 
-    def start_pymysensors_gateway(self, selected_gateway_type, dev_port='/dev/ttyUSB0', ip_address='127.0.0.1'):
-        # This is the non-ASynchronous version, which is no longer used:
-        #self.GATEWAY = mysensors.SerialGateway('/dev/ttyUSB0', baud=self.usb_serial_communication_speed, timeout=1.0, reconnect_timeout=10.0, event_callback=self.event, persistence=False, persistence_file='./mysensors.pickle', protocol_version='2.2')
-        #self.GATEWAY.start_persistence()
-        #self.GATEWAY.start()
+
+
+    def materialize_devices(self):
+        """ Staged startup: adds the properties to the device shells that were announced by recreate_from_persistence. """
+        started = time.time()
+        while self.running:
+            with self.materialize_lock:
+                if len(self.pending_materialization) == 0:
+                    break
+                node_id, pending = self.pending_materialization.popitem(last=False)
+                done = self.materializing[node_id] = threading.Event()
+            self.add_pending_children(node_id, pending, done)
         
-        # This is the new asynchronous version of PyMySensors:
-        #try:
-            #self.LOOP = asyncio.get_event_loop()
-            #self.LOOP.set_debug(True)
-        #except:
-        #    print("Error getting asyncio event loop!")
+        _ADAPTER_LOG.debug("All devices from persistence were recreated in the background in %s seconds", round(time.time() - started, 2))
+        
+        try:
+            self.send_in_the_clones()
+        except Exception as ex:
+            _ADAPTER_LOG.error("Error while creating clones: %s", ex)
+
+
+
+    def materialize_device(self, node_id):
+        """ Adds the properties to a device shell, if that hasn't been done yet. Nodes that send a message get to go first. """
+        # The node is taken from the pending nodes while holding the lock, so only one thread can ever materialize it.
+        # If another thread is already doing so, this waits until it's done, so that a message never creates the same properties.
+        with self.materialize_lock:
+            pending = self.pending_materialization.pop(node_id, None)
+            if pending != None:
+                done = self.materializing[node_id] = threading.Event()
+            else:
+                done = self.materializing.get(node_id)
+        if pending != None:
+            self.add_pending_children(node_id, pending, done)
+        elif done != None:
+            if not done.wait(10):
+                _ADAPTER_LOG.warning("Waited too long for the properties of node %s to be recreated", node_id)
+
+
+    def add_pending_children(self, node_id, pending, done):
+        device, nodeIndex, node = pending
+        try:
+            self.add_children_from_persistence(device, nodeIndex, node)
+            self.handle_device_added(device)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Error while recreating properties of node %s: %s", node_id, ex)
+        finally:
+            with self.materialize_lock:
+                del self.materializing[node_id]
+            done.set()
+
+
+
+
+    def start_pymysensors_gateway(self, selected_gateway_type, dev_port='/dev/ttyUSB0', ip_address='127.0.0.1'):
+        # All three gateway types use the asynchronous version of PyMySensors, running on the adapter's own event loop.
+        self.event_loop.start()
+        if self.command_queue == None:
+            self.command_queue = CommandQueue(self.transmit_command, self.event_loop.loop, max_attempts=self.command_retries + 1,
+                is_smart_sleep_node=self.is_smart_sleep_node)
         
         #if self.DEBUG:
         #    logging.basicConfig(level=logging.DEBUG)
         #else:
         #    logging.basicConfig(level=logging.INFO) # TODO try ERROR level?
         
+        # When the journal is used, PyMySensors should not also save the nodes itself.
+        pymysensors_persistence = self.remember_devices and not isinstance(self.persistence, JournalPersistence)
+        if pymysensors_persistence:
+            # Nodes that were removed while PyMySensors wasn't running must be gone from the file before PyMySensors loads it.
+            self.persistence.flush()
+        
         # Establishing a MySensors gateway:
         try:
             if selected_gateway_type == 'USB Serial gateway':
-                print("Starting serial")
-                self.GATEWAY = mysensors.SerialGateway(
-                  dev_port, baud=self.usb_serial_communication_speed, 
-                  #timeout=1.0, 
-                  #reconnect_timeout=10.0,
-                  event_callback=self.mysensors_message, persistence=self.remember_devices,
-                  persistence_file=self.persistence_file_path, protocol_version='2.2')
-                #GATEWAY.start_persistence() # optional, remove this line if you don't need persistence.
-                #GATEWAY.start()
-                
-                #self.GATEWAY = mysensors.SerialGateway(dev_port, baud=self.usb_serial_communication_speed, timeout=1.0, reconnect_timeout=10.0, event_callback=self.mysensors_message, persistence=True, persistence_file=self.persistence_file_path, protocol_version='2.2')
-                self.GATEWAY.start_persistence()
-                self.GATEWAY.start()
-                #print("Beyond starting non-async serial")
-                
-                """
-                try:
-                    self.LOOP = asyncio.get_event_loop()
-                    self.LOOP.set_debug(True)
-                except:
-                    print("Error getting asyncio event loop!")
-                
-                self.GATEWAY = mysensors.AsyncSerialGateway(
-                    dev_port, loop=self.LOOP, event_callback=self.mysensors_message,
-                    persistence=True, persistence_file=self.persistence_file_path, 
-                    protocol_version='2.2')
-                if self.DEBUG:
-                    print("created serial PyMySensors object")
-                
-                try:
-                    self.LOOP.run_until_complete(self.GATEWAY.start_persistence())
-                    self.LOOP.run_until_complete(self.GATEWAY.start())
-                
-                    self.LOOP.run_forever()
-                    if self.DEBUG:
-                        print("Beyond PyMySensors loop start")
-                except:
-                    print("Asyncio loop is not running")
-                """
-
+                _ADAPTER_LOG.info("Starting serial")
                 
             elif selected_gateway_type == 'Ethernet gateway':
-                # This is the new asynchronous version of PyMySensors:
-                try:
-                    self.LOOP = asyncio.get_event_loop()
-                    self.LOOP.set_debug(True)
-                    #pass
-                except:
-                    print("Error getting asyncio event loop!")
-                
-                self.GATEWAY = mysensors.AsyncTCPGateway(ip_address, event_callback=self.mysensors_message, 
-                    persistence=self.remember_devices, persistence_file=self.persistence_file_path, 
-                    protocol_version='2.2')
-
-                try:
-                    self.LOOP.run_until_complete(self.GATEWAY.start_persistence())
-                    self.LOOP.run_until_complete(self.GATEWAY.start())
-                
-                    self.LOOP.run_forever()
-                    if self.DEBUG:
-                        print("Beyond PyMySensors loop start")
-                except:
-                    print("Asyncio loop is not running")
-
+                _ADAPTER_LOG.info("Starting Ethernet version, connecting to IP address %s", ip_address)
 
             elif selected_gateway_type == 'MQTT gateway':
-                print("Starting MQTT version, connecting to port 1883 on IP address " + str(ip_address))
-                
-                try:
-                    self.LOOP = asyncio.get_event_loop()
-                    self.LOOP.set_debug(True)
-                    #pass
-                except:
-                    print("Error getting asyncio event loop!")
+                _ADAPTER_LOG.info("Starting MQTT version, connecting to port 1883 on IP address %s", ip_address)
                 try:
                     #print("MQTT Creating object")
-                    self.MQTTC = MQTT(ip_address, 1883, 60)
-                    
-                    #self.MQTTC = mqtt.Client()
-                    #self.MQTTC.connect(ip_address, 1883, 60)
+                    self.MQTTC = AsyncMQTTClient(ip_address, 1883, 60, self.event_loop.loop)
                     
                     if self.MQTT_username != '' and self.MQTT_password != '':
                         self.MQTTC.authenticate(username=self.MQTT_username,password=self.MQTT_password)
-                        print("-set MQTT username and password")
-                    #print("MQTT will start")
-                    #self.MQTTC.loop_start()
+                        _ADAPTER_LOG.info("-set MQTT username and password")
                     self.MQTTC.start()
                 except Exception as ex:
-                    print("MQTT object error: " + str(ex))
-                    
-                
-                #self.GATEWAY = mysensors.AsyncMQTTGateway(ip_address, event_callback=self.mysensors_message, 
-                #    persistence=True, persistence_file=self.persistence_file_path, 
-                #    protocol_version='2.2')
-                
-                try:
-                    self.GATEWAY = mysensors.AsyncMQTTGateway(self.MQTTC.publish, self.MQTTC.subscribe, in_prefix=self.MQTT_in_prefix,
-                        out_prefix=self.MQTT_out_prefix, retain=True, event_callback=self.mysensors_message,
-                        persistence=self.remember_devices, persistence_file=self.persistence_file_path, 
-                        protocol_version='2.2')
-                except Exception as ex:
-                    print("AsyncMQTTGateway object error: " + str(ex))
-                
-                try:
-                    self.LOOP.run_until_complete(self.GATEWAY.start_persistence())
-                    self.LOOP.run_until_complete(self.GATEWAY.start())
-                
-                    self.LOOP.run_forever()
-                    if self.DEBUG:
-                        print("Beyond PyMySensors loop start")
-                except:
-                    print("Asyncio loop is not running")
+                    _ADAPTER_LOG.error("MQTT object error: %s", ex)
+            
+            self.GATEWAY = self.event_loop.run_coroutine(self.create_pymysensors_gateway(selected_gateway_type, dev_port, ip_address, pymysensors_persistence), timeout=30)
             
+            # Connecting keeps retrying until the receiver can be reached, so it is not waited for. An unplugged receiver or an unreachable host must not stall the add-on.
+            self.gateway_start = self.event_loop.submit(self.GATEWAY.start())
+            self.gateway_start.add_done_callback(self.pymysensors_gateway_started)
+            _ADAPTER_LOG.debug("PyMySensors gateway is connecting on the event loop")
             
         except Exception as ex:  # pylint: disable=broad-except
-            print("ERROR! Unable to initialise the PyMySensors object. Details: " + str(ex))    
+            _ADAPTER_LOG.error("ERROR! Unable to initialise the PyMySensors object. Details: %s", ex)    
+
+
+    async def create_pymysensors_gateway(self, selected_gateway_type, dev_port, ip_address, pymysensors_persistence):
+        """ Creates the PyMySensors gateway and loads its persistence. Runs on the event loop, so that PyMySensors picks up that loop. """
+        if selected_gateway_type == 'USB Serial gateway':
+            gateway = mysensors.AsyncSerialGateway(
+                dev_port, baud=self.usb_serial_communication_speed, 
+                event_callback=self.mysensors_message, persistence=pymysensors_persistence,
+                persistence_file=self.persistence_file_path, protocol_version='2.2')
+        
+        elif selected_gateway_type == 'Ethernet gateway':
+            host, port = parse_host_and_port(ip_address, 5003) # The port is optional, as in 192.168.1.5:5003
+            gateway = mysensors.AsyncTCPGateway(host, port=port, event_callback=self.mysensors_message, 
+                persistence=pymysensors_persistence, persistence_file=self.persistence_file_path, 
+                protocol_version='2.2')
+        
+        elif selected_gateway_type == 'MQTT gateway':
+            gateway = mysensors.AsyncMQTTGateway(self.MQTTC.publish, self.MQTTC.subscribe, in_prefix=self.MQTT_in_prefix,
+                out_prefix=self.MQTT_out_prefix, retain=True, event_callback=self.mysensors_message,
+                persistence=pymysensors_persistence, persistence_file=self.persistence_file_path, 
+                protocol_version='2.2')
+        else:
+            raise ValueError("unknown gateway type: " + str(selected_gateway_type))
+        
+        self.GATEWAY = gateway
+        await gateway.start_persistence()
+        self.attach_journal()
+        return gateway
+
+
+    def pymysensors_gateway_started(self, future):
+        """ Called when PyMySensors has connected to the receiver, or has given up. """
+        if future.cancelled():
+            return
+        ex = future.exception()
+        if ex != None:
+            _ADAPTER_LOG.error("ERROR! PyMySensors could not connect to the MySensors receiver. Details: %s", ex)
+        _ADAPTER_LOG.debug("PyMySensors gateway is connected")
+
+
+    def stop_pymysensors_gateway(self):
+        """ Stops the PyMySensors gateway, and waits until it has let go of the serial port or network connection. """
+        gateway = self.GATEWAY
+        self.GATEWAY = None
+        if self.gateway_start != None:
+            self.gateway_start.cancel()
+            self.gateway_start = None
+        if gateway == None:
+            return
+        try:
+            if self.event_loop.is_running():
+                self.event_loop.run_coroutine(gateway.stop(), timeout=10)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Error while stopping PyMySensors: %s", ex)
+        try:
+            if getattr(self, 'MQTTC', None) != None:
+                self.MQTTC.stop()
+        except Exception as ex:
+            _ADAPTER_LOG.error("Error while stopping MQTT client: %s", ex)
+
+
+    def send_to_gateway(self, function, *args):
+        """ Calls a PyMySensors gateway function, like set_child_value or send, on the event loop. Can be used from any thread. """
+        self.event_loop.call_soon(function, *args)
+
+
+    def send_command(self, node_id, child_id, sub_type, value):
+        """ Sets a value on a node. The command queue makes sure it arrives. Can be used from any thread. """
+        if self.command_queue == None:
+            _ADAPTER_LOG.warning("Cannot send command, not connected to the MySensors network yet")
+            return
+        self.event_loop.call_soon(self.command_queue.submit, node_id, child_id, sub_type, value)
+
+
+    def is_smart_sleep_node(self, node_id):
+        """ Returns True if PyMySensors holds the commands for this node until it wakes up. Called by the command queue, on the event loop. """
+        if self.GATEWAY == None or node_id not in self.GATEWAY.sensors:
+            return False
+        return self.GATEWAY.sensors[node_id].is_smart_sleep_node
+
+
+    def transmit_command(self, node_id, child_id, sub_type, value, ack):
+        """ Called by the command queue, on the event loop. """
+        if self.GATEWAY == None:
+            return
+        self.GATEWAY.set_child_value(node_id, child_id, sub_type, value, ack=1 if ack else 0)
+
+
+    def attach_journal(self):
+        """ If the journal is used for persistence, load the nodes into PyMySensors and start keeping track of changes. """
+        if not self.remember_devices or not isinstance(self.persistence, JournalPersistence):
+            return
+        try:
+            self.GATEWAY.sensors.update(self.persistence.load_sensors())
+            self.persistence.start(self.GATEWAY.sensors)
+            _ADAPTER_LOG.debug("Persistence journal attached, nodes loaded: %s", len(self.GATEWAY.sensors))
+        except Exception as ex:
+            _ADAPTER_LOG.error("Error while loading nodes from the persistence journal: %s", ex)
 
 
     def unload(self):
-        print("Shutting down MySensors adapter")
+        _ADAPTER_LOG.info("Shutting down MySensors adapter")
         
         try:
             self.running = False
-            self.GATEWAY.stop()
-            print("PyMysensors Gateway.stop() called")
+            self.message_queue.stop()
+            self.throttle.stop()
+            self.announcer.stop()
+            self.liveness.stop()
+            self.usb_watcher.stop()
+            if self.rediscovery != None:
+                self.rediscovery.stop()
+            if isinstance(self.persistence, JournalPersistence):
+                self.persistence.stop()
+            else:
+                self.persistence.flush()
+
+            if self.metrics_server != None:
+                self.metrics_server.stop()
+
+            if self.capture != None:
+                self.capture.stop()
+
+            self.stop_pymysensors_gateway()
+            _ADAPTER_LOG.info("PyMysensors Gateway.stop() called")
         except:
-            print("MySensors adapter was unable to cleanly close PyMySensors object. This is not a problem.")
+            _ADAPTER_LOG.info("MySensors adapter was unable to cleanly close PyMySensors object. This is not a problem.")
             
         try:
-            for task in asyncio.Task.all_tasks():
-                task.cancel()
-            self.LOOP.stop()
-            self.LOOP.close()
-            print("Loop stopped/closed")
+            self.event_loop.stop()
+            _ADAPTER_LOG.info("Loop stopped/closed")
         except:
-            print("MySensors adapter was unable to cleanly close PyMySensors loop. This is not a problem.")
+            _ADAPTER_LOG.info("MySensors adapter was unable to cleanly close PyMySensors loop. This is not a problem.")
+        
+        stop_logging()
 
 
     def remove_thing(self, device_id):
-        if self.DEBUG:
-            print("\n-----REMOVING:" + str(device_id))
+        _ADAPTER_LOG.debug("\n-----REMOVING:%s", device_id)
         
         try:
             obj = self.get_device(device_id)        
             self.handle_device_removed(obj)                     # Remove from device dictionary
-            if self.DEBUG:
-                print("Removed device")
+            _ADAPTER_LOG.debug("Removed device")
         except Exception as ex:
-            print("Error, could not remove thing from devices: " + str(ex))
+            _ADAPTER_LOG.error("Error, could not remove thing from devices: %s", ex)
             
         try:
             if device_id.count('-') == 1:
                 ID_to_clear = str(device_id.split('-')[-1])
-                if self.DEBUG:
-                    print("ID to clear: " + str(ID_to_clear))
+                _ADAPTER_LOG.debug("ID to clear: %s", ID_to_clear)
                 try:
-                    del self.GATEWAY.sensors[ID_to_clear]           # Remove from PyMysensors persistence
-                    
-                    if self.DEBUG:
-                        print("Removed device from persistence too")
+                    self.liveness.forget(ID_to_clear)
+                    self.nodes.forget(ID_to_clear)
+                    self.throttle.forget(ID_to_clear)
                 except Exception as ex:
-                    print("error removing device from self.GATEWAY: " + str(ex))
-                    
+                    _ADAPTER_LOG.error("error removing device from liveness tracker: %s", ex)
+                if self.command_queue != None:
+                    self.event_loop.call_soon(self.command_queue.forget_node, ID_to_clear)
                 try:
-                    if os.path.exists(self.persistence_file_path):
-                        with open(self.persistence_file_path) as f:
-                            persistent_data = json.load(f)
-                            if self.DEBUG:
-                                print("Persistence data was loaded succesfully.")
-                            #del persistent_data[ID_to_clear]
-                            persistent_key_to_remove = None
-                            for key, item in persistent_data.items():
-                                print("key, item: ", key, item)
-                                if str(item['sensor_id']) == ID_to_clear:
-                                    persistent_key_to_remove = key
-                            if persistent_key_to_remove != None:
-                                if self.DEBUG:
-                                    print("Found the key to remove")
-                                del persistent_data[persistent_key_to_remove]
-                            json.dump( persistent_data, open( self.persistence_file_path, 'w+' ), indent=4 )
-                            if self.DEBUG:
-                                print("Persistence data was saved.")
-                        
+                    gateway = self.GATEWAY
+                    if gateway != None:
+                        self.event_loop.call_soon(self.forget_pymysensors_node, gateway, int(ID_to_clear))
+                    
+                    # While PyMySensors saves the persistence file itself, writing it from here as well would let the two overwrite each other's changes.
+                    if gateway == None or getattr(gateway.tasks, 'persistence', None) == None:
+                        self.persistence.delete(ID_to_clear)
+                        _ADAPTER_LOG.debug("Node will be removed from the persistence file")
                 except Exception as ex:
-                    print("remove device alternatively also failed: " + str(ex))
+                    _ADAPTER_LOG.error("error removing device from persistence: %s", ex)
                 
                     
                 
         except:
-            print("REMOVING MYSENSORS THING FAILED") 
+            _ADAPTER_LOG.error("REMOVING MYSENSORS THING FAILED") 
+
+
+    def forget_pymysensors_node(self, gateway, node_id):
+        """ Removes a node from PyMySensors, and lets it save its persistence file. Runs on the event loop, like the rest of PyMySensors. """
+        try:
+            if node_id in gateway.sensors:
+                del gateway.sensors[node_id]
+            persistence = getattr(gateway.tasks, 'persistence', None)
+            if persistence != None:
+                persistence.need_save = True
+            _ADAPTER_LOG.debug("Removed node %s from PyMySensors", node_id)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Error removing node from PyMySensors: %s", ex)
 
 
     def mysensors_message(self, message):
+        """ Called by PyMySensors for every incoming message. The message is handed to the dispatch worker via the message queue. """
+        FLIGHT_RECORDER.record(message)
+        if self.capture != None:
+            self.capture.record(message)
+        try:
+            message.received_at = time.time()
+            METRICS.inc('mysensors_messages_total', _MESSAGE_TYPE_LABELS[message.type])
+            self.nodes.message_received(message, message.received_at)
+        except Exception as ex:
+            _LOG.error("Error while counting incoming message: %s", ex)
+        
+        if self.command_queue != None and message.type == 1 and getattr(message, 'ack', 0):
+            # A node echoing a command back. This runs on the event loop, just like the command queue.
+            self.command_queue.acknowledged(message.node_id, message.child_id, message.sub_type, message.payload)
+        
+        if not self.throttle.check(message, getattr(message, 'received_at', None)):
+            return
+        self.queue_message(message)
+
+
+
+    def queue_message(self, message):
+        """ Hands a message to the dispatch worker. Also called by the throttle, with messages it held back for a while. """
+        if self.message_queue.running:
+            self.message_queue.put(message)
+        else:
+            self.dispatch_message(message)
+
+
+
+    def node_throttled(self, node_id):
+        """ Called by the throttle when a node starts sending more messages than it may. """
+        _LOG.warning("Node %s is sending too many messages. Its updates are being throttled.", node_id)
+        try:
+            self.send_pairing_prompt("MySensors node " + str(node_id) + " is sending too many messages", None, self.get_device("MySensors-" + str(node_id)))
+        except Exception as ex:
+            _LOG.error("Could not show a notification about throttled node %s: %s", node_id, ex)
+
+
+
+    def dispatch_message(self, message):
+        """ Handles an incoming message, and keeps track of how long that took. """
+        started = time.time()
+        received_at = getattr(message, 'received_at', None)
+        if received_at != None:
+            METRICS.observe('mysensors_message_queue_wait_seconds', started - received_at)
+        else:
+            received_at = started
+        self.message_received_at = received_at
+        self.handle_message(message)
+        METRICS.observe('mysensors_message_handle_seconds', time.time() - started)
+
+
+
+    def handle_message(self, message):
         # Show some human readable details about the incoming message
         extraDevice = None # Holds a copy of a property, used for optimization with voice interfaces.
         extraProperty = None
         
         try:
-            if self.DEBUG:
-                print("")
-                #print(str(vars(message)))
+            #print(str(vars(message)))
             
-            type_names = ['presentation','set','request','internal','stream']
-            if self.DEBUG:
-                print(">> incoming message > " + str(type_names[message.type]) + " > id: " + str(message.node_id) + "; child: " + str(message.child_id) + "; subtype: " + str(message.sub_type) + "; payload: " + str(message.payload))
+            _LOG.debug(">> incoming message > %s > id: %s; child: %s; subtype: %s; payload: %s", MESSAGE_TYPE_NAMES[message.type], message.node_id, message.child_id, message.sub_type, message.payload)
         except Exception as ex:
-            print("Error while displaying incoming message in console: " + str(ex))
+            _LOG.error("Error while displaying incoming message in console: %s", ex)
         
         
         
@@ -556,16 +692,16 @@ class MySensorsAdapter(Adapter):
             self.first_request_done = True
             
             try:
-                print("self.GATEWAY.metric was set to: " + str(self.GATEWAY.metric))
+                _LOG.debug("self.GATEWAY.metric was set to: %s", self.GATEWAY.metric)
                 self.GATEWAY.metric = self.metric
-                print("self.GATEWAY.metric is now set to: " + str(self.GATEWAY.metric))
+                _LOG.debug("self.GATEWAY.metric is now set to: %s", self.GATEWAY.metric)
             except:
-                print("Failed to set the PyMySensors object to metric/fahrenheit.")
+                _LOG.warning("Failed to set the PyMySensors object to metric/fahrenheit.")
             
             try:
                 self.try_rerequest() # Asks all nodes to present themselves
             except Exception as ex:
-                print("Error while initiating re-request of nodes: " + str(ex))
+                _LOG.error("Error while initiating re-request of nodes: %s", ex)
         #except:
             #print("Error dealing with first incoming message")
         
@@ -579,21 +715,48 @@ class MySensorsAdapter(Adapter):
             try:
                 if self.timeout_seconds != 0:
                     try:
-                        if self.DEBUG:
-                            print(str(message.node_id) + " gets timestamp " + str(int(time.time())))
-                        self.last_seen_timestamps.update( { message.node_id: int(time.time()) } )
+                        _LOG.debug("%s gets timestamp %s", message.node_id, int(time.time()))
+                        self.liveness.seen(message.node_id)
                     except Exception as ex:
-                        print("error updating timestamp dictionary: " + str(ex))
+                        _LOG.error("error updating timestamp dictionary: %s", ex)
             except Exception as ex:
-                print("Error updating last seen timestamp from incoming message: " + str(ex))
+                _LOG.error("Error updating last seen timestamp from incoming message: %s", ex)
+            
+            # Staged startup: a node that is active gets its properties before the others.
+            if len(self.pending_materialization) > 0 or len(self.materializing) > 0:
+                self.materialize_device(message.node_id)
+            
+            # Keep track of which nodes have answered a request to present themselves.
+            if message.type == 0:
+                self.last_presentation_times[message.node_id] = time.time()
+            if self.rediscovery != None:
+                self.rediscovery.node_responded(message.node_id)
                 
+            # Fast path: if the property already exists, update it (and its optimization clones) directly.
+            if message.type == 1:
+                try:
+                    index_entry = self.property_index.get( (message.node_id, message.child_id, message.sub_type) )
+                    if index_entry != None and index_entry[0] != None:
+                        new_value = index_entry[0].decode(message.payload)
+                        targetDevice = index_entry[0].device
+                        if targetDevice.connected == False:
+                            targetDevice.connected = True
+                            targetDevice.connected_notify(True)
+                            self.nodes.set_connected(message.node_id, True)
+                        index_entry[0].update(new_value)
+                        for extraProperty in index_entry[1]:
+                            extraProperty.update(new_value)
+                        return
+                except Exception as ex:
+                    _LOG.error("Error while updating indexed property: %s", ex)
+            
             # first we check if the incoming node_id already has already been presented to the WebThings Gateway.
             try:
                 #print("get_devices = " + str(self.get_devices()))
                 targetDevice = self.get_device("MySensors-" + str(message.node_id)) # targetDevice will be 'None' if it wasn't found.
                 #print("targetDevice = " + str(targetDevice))
             except Exception as ex:
-                print("Error while checking if node exists as device: " + str(ex))
+                _LOG.error("Error while checking if node exists as device: %s", ex)
                 
                 
             # INTERNAL
@@ -601,20 +764,20 @@ class MySensorsAdapter(Adapter):
             if message.type == 3: #and message.child_id != 255: # An internal message
                 if targetDevice == None:
                     if message.sub_type == 11: # holds the sketch name, which will be the name of the new device
-                        if self.DEBUG:
-                            print("-Internally presented device did not exist in the gateway yet. Adding now.")
+                        _LOG.debug("-Internally presented device did not exist in the gateway yet. Adding now.")
                         try:
                             device = MySensorsDevice(self, message.node_id, str(message.payload))
                         except Exception as ex:
-                            print("-Failed to add new device from internal presentation: " + str(ex))
+                            _LOG.warning("-Failed to add new device from internal presentation: %s", ex)
                 else:
                     # If it already exists, set it to connected if it hasn't been already.
                     try:
                         if targetDevice.connected == False:
                             targetDevice.connected = True
                             targetDevice.connected_notify(True)
+                            self.nodes.set_connected(message.node_id, True)
                     except:
-                        print("Error changing target device connection status")
+                        _LOG.error("Error changing target device connection status")
 
 
             #SET
@@ -625,30 +788,25 @@ class MySensorsAdapter(Adapter):
                 # Get the value from the message
                 new_value = None
                 try:
-                    if is_a_number(message.payload) and message.sub_type != 47:
-                        new_value = get_int_or_float(message.payload)
-                    else:
-                        new_value = str(message.payload)
+                    new_value = self.interpret_payload(message)
                 except Exception as ex:
-                    print("could not interpret payload: " + str(ex))
+                    _LOG.warning("could not interpret payload: %s", ex)
                     return
                 #print("New update value:" + str(new_value))
 
                 # If there is a 'set' message but the device for this node somehow doesn't exist yet, then we should quickly create it.
                 if targetDevice == None:
-                    if self.DEBUG:
-                        print("Incoming 'set' message, but device doesn't exist (yet). If possible, will try to quickly create the device using persistence data.") # Perhaps the persistence data can help. Not sure if this situtation is even possible now that persistence is always used.
+                    _LOG.debug("Incoming 'set' message, but device doesn't exist (yet). If possible, will try to quickly create the device using persistence data.") # Perhaps the persistence data can help. Not sure if this situtation is even possible now that persistence is always used.
                     if message.node_id in self.GATEWAY.sensors:
-                        print("message.node_id was in self.GATEWAY.sensors")
+                        _LOG.debug("message.node_id was in self.GATEWAY.sensors")
                         try:
                             # Generate human readable name for the thing
                             if str(self.GATEWAY.sensors[message.node_id].sketch_name) == 'None':
                                 name = 'MySensors-' + str(message.node_id)
-                                if self.DEBUG:
-                                    print("-Node was in persistence, but no sketch name found. Generated a generic name.")
+                                _LOG.debug("-Node was in persistence, but no sketch name found. Generated a generic name.")
                             else:
                                 name = str(self.GATEWAY.sensors[message.node_id].sketch_name)
-                            print("-Name for the new device is: " + name)
+                            _LOG.debug("-Name for the new device is: %s", name)
                             
                             # Add the node to the devices list
                             device = MySensorsDevice(self, message.node_id, name)
@@ -658,12 +816,12 @@ class MySensorsAdapter(Adapter):
                             try:
                                 targetDevice = self.get_device("MySensors-" + str(message.node_id)) # targetDevice will be 'None' if it wasn't found.
                             except Exception as ex:
-                                print("Error while checking if node exists as device AGAIN: " + str(ex))
+                                _LOG.error("Error while checking if node exists as device AGAIN: %s", ex)
                     
                         except Exception as ex:
-                            print("-Failed to add new device: " + str(ex))
+                            _LOG.warning("-Failed to add new device: %s", ex)
                     else:
-                        print("Node ID not found in persistence file, so cannot re-create device. Please restart the node.")
+                        _LOG.warning("Node ID not found in persistence file, so cannot re-create device. Please restart the node.")
                         
                     
                 # Here we can be sure that the target thing exists (thanks to the check above)
@@ -672,6 +830,7 @@ class MySensorsAdapter(Adapter):
                     if targetDevice.connected == False:
                         targetDevice.connected = True
                         targetDevice.connected_notify(True)
+                        self.nodes.set_connected(message.node_id, True)
                     
                     if message.sub_type != 43: # avoid creating a property for V_UNIT_PREFIX
                         
@@ -680,62 +839,52 @@ class MySensorsAdapter(Adapter):
                         try:
                             targetProperty = targetDevice.find_property(targetPropertyID)
                         except Exception as ex:
-                            print("Error getting target property: " + str(ex))
+                            _LOG.error("Error getting target property: %s", ex)
                             
                         # The property does not exist yet:
                         if targetProperty == None: 
-                            if self.DEBUG:
-                                print("-Property did not exist yet.")
+                            _LOG.debug("-Property did not exist yet.")
                                 
                             try:
                                 child = self.GATEWAY.sensors[message.node_id].children[message.child_id]
-                                print("child: " + str(child))
-                                if self.DEBUG:
-                                    print("-The PyMySensors node existed, and has child data. Now to present it to the WebThings Gateway. Child = " + str(child))
+                                _LOG.debug("-The PyMySensors node existed, and has child data. Now to present it to the WebThings Gateway. Child = %s", child)
                                     
                                 if not child.description:
-                                    if self.DEBUG:
-                                        print("-Child had no description")
+                                    _LOG.debug("-Child had no description")
                                     new_description = 'Property type ' + str(message.sub_type)
                                 else:
                                     new_description = child.description
-                                    if self.DEBUG:
-                                        print("new new description: " + str(new_description))
+                                    _LOG.debug("new new description: %s", new_description)
                                     
                                 if not child.values:
                                     values = {}
                                 else:
                                     values = child.values
-                                    if self.DEBUG:
-                                        print("new new values: " + str(values))
+                                    _LOG.debug("new new values: %s", values)
                                     
                                 if not child.type:
-                                    if self.DEBUG:
-                                        print("somehow there was no type data?")
+                                    _LOG.debug("somehow there was no type data?")
                                     return
                                 
                                 try:
                                     # def add_child(self, new_description, node_id, child_id, main_type, sub_type, values, value):
                                     targetDevice.add_child(new_description, message.node_id, message.child_id, child.type, message.sub_type, values, message.payload)
-                                    if self.DEBUG:
-                                        print("-Finished proces of adding new property on new device. Presenting device to the WebThings Gateway now.")
+                                    _LOG.debug("-Finished proces of adding new property on new device. Presenting device to the WebThings Gateway now.")
                                     self.handle_device_added(targetDevice)
                                 
                                     # Once the property has been created, we create a handle for it.
                                     targetProperty = targetDevice.find_property(targetPropertyID)
                                     #device.connected_notify(False)
                                 except Exception as ex:
-                                    print("Error adding new property from incoming message")
+                                    _LOG.error("Error adding new property from incoming message")
                                 
                             except Exception as ex:
-                                if self.DEBUG:
-                                    print("-Error adding property: " + str(ex))
+                                _LOG.debug("-Error adding property: %s", ex)
                                 try:
                                     del self.GATEWAY.sensors[message.node_id].children[message.child_id] # Maybe delete the entire node? Start fresh?
-                                    if self.DEBUG:
-                                        print("--Removed faulty node child from persistence data")
+                                    _LOG.debug("--Removed faulty node child from persistence data")
                                 except Exception as ex:
-                                    print("deleting faulty device data failed: " + str(ex))
+                                    _LOG.warning("deleting faulty device data failed: %s", ex)
                                     
                                     
                             
@@ -743,59 +892,260 @@ class MySensorsAdapter(Adapter):
                         try:
                             if targetProperty != None:
                                 #self.devices["MySensors-" + str(message.node_id)].properties[targetPropertyID].update( new_value )
+                                new_value = targetProperty.decode(message.payload)
                                 targetProperty.update(new_value)
                                 #targetProperty.set_value(new_value)
                             else:
-                                print("ERROR - target property still did not exist!")
+                                _LOG.error("ERROR - target property still did not exist!")
                         except Exception as ex:
-                            print("-Failed update value from incoming message:" + str(ex))
+                            _LOG.warning("-Failed update value from incoming message:%s", ex)
             
-            # Try to also update the extra cloned device/property, if it exists.
-            if self.optimize:
-                try:
-                    extraDevice = self.get_device("MySensors-" + str(message.node_id) + "-" + str(message.child_id))
-                    if extraDevice != None:
-                        extraProperty = extraDevice.find_property(targetPropertyID)
-                        extraProperty.update(new_value)
-                        if self.DEBUG:
-                            print("Optimization: updated extra thing: MySensors-" + str(message.node_id) + "-" + str(message.child_id))
-                except Exception as ex:
-                    print("Error while updating extra device")            
+                        # Try to also update the extra cloned devices/properties, if they exist.
+                        if self.optimize and targetProperty != None:
+                            try:
+                                index_entry = self.property_index.get( (message.node_id, message.child_id, message.sub_type) )
+                                if index_entry != None:
+                                    for extraProperty in index_entry[1]:
+                                        extraProperty.update(new_value)
+                                        _LOG.debug("Optimization: updated extra thing: %s", extraProperty.device.id)
+                            except Exception as ex:
+                                _LOG.error("Error while updating extra device: %s", ex)
 
 
         except Exception as ex:
-            print("-Failed to handle incoming message:" + str(ex))
+            _LOG.error("-Failed to handle incoming message: %s", ex)
+
+
+
+    def get_update_limits(self, main_type):
+        """ Returns the minimum notify interval and the deadband that properties of this S_TYPE should use. """
+        interval = self.update_intervals.get(main_type, self.minimum_update_interval)
+        deadband = self.deadbands.get(main_type, (0, False))
+        return interval, deadband
+
+
+
+    def interpret_payload(self, message):
+        """ Turns the payload of a 'set' message into a number if possible, or a string otherwise. Properties have their own decoder, which also knows their type. """
+        return get_decoder({}, message.sub_type)(message.payload)
+
+
+
+    def handle_device_added(self, device):
+        """ Add the device and its properties to the property index, and tell the gateway about it shortly. Can be called again when properties were added. """
+        self.devices[device.id] = device
+        self.index_device(device)
+        self.announcer.add(device)
+
+
+    def announce_device(self, device):
+        """ Called by the announcer: sends the complete device description to the gateway. """
+        Adapter.handle_device_added(self, device)
+
+
+    def handle_device_removed(self, device):
+        """ Remove the properties of the device from the property index, and then tell the gateway. """
+        self.announcer.forget(device.id)
+        self.unindex_device(device)
+        Adapter.handle_device_removed(self, device)
+
+
+    def index_device(self, device):
+        # Clones created by the 'optimize things' feature have an ID like MySensors-5-200, while normal devices look like MySensors-5.
+        is_clone = str(device.id).count('-') == 2
+        for device_property in list(device.properties.values()):
+            try:
+                key = (device_property.node_id, device_property.child_id, device_property.subchild_id)
+            except Exception as ex:
+                _ADAPTER_LOG.debug("Could not index property: %s", ex)
+                continue
+            
+            index_entry = self.property_index.get(key)
+            if index_entry == None:
+                index_entry = [None, []]
+                self.property_index[key] = index_entry
+            
+            if is_clone:
+                # A new clone object may replace an older one of the same device.
+                index_entry[1] = [clone for clone in index_entry[1] if clone.device.id != device.id]
+                index_entry[1].append(device_property)
+            else:
+                index_entry[0] = device_property
+
+
+    def unindex_device(self, device):
+        for key, index_entry in list(self.property_index.items()):
+            if index_entry[0] != None and index_entry[0].device.id == device.id:
+                index_entry[0] = None
+            index_entry[1] = [clone for clone in index_entry[1] if clone.device.id != device.id]
+            if index_entry[0] == None and len(index_entry[1]) == 0:
+                del self.property_index[key]
 
 
 
     def scan_usb_ports(self): # Scans for USB serial devices
-        if self.DEBUG:
-            print("Scanning USB serial devices")
+        _ADAPTER_LOG.debug("Scanning USB serial devices")
         initial_serial_devices = set()
         result = {"state":"stable","port_id":[]}
         
         try:    
             ports = prtlst.comports()
-            if self.DEBUG:
-                print("All serial ports: " + str(ports))
+            _ADAPTER_LOG.debug("All serial ports: %s", ports)
             for port in ports:
                 if 'USB' in port[1] and not 'zigbee' in port[1].lower() and not 'matter' in port[1].lower() and not 'zwave' in port[1].lower() and not 'z-wave' in port[1].lower(): #check 'USB' string in device description
 
-                    if self.DEBUG:
-                        print("adding possible port with 'USB' in name to list: " + str(port))
+                    _ADAPTER_LOG.debug("adding possible port with 'USB' in name to list: %s", port)
                     #if self.DEBUG:
                     #    print("port: " + str(port[0]))
                     #    print("usb device description: " + str(port[1]))
-                    if str(port[0]) not in self.initial_serial_devices:
-                        self.initial_serial_devices.add(str(port[0]))
+                    initial_serial_devices.add(str(port[0]))
+                    self.serial_port_info[str(port[0])] = (getattr(port, 'vid', None), getattr(port, 'pid', None), getattr(port, 'serial_number', None))
                 else:
-                    if self.DEBUG:
-                        print("skipping USB port: " + str(port[1]))
+                    _ADAPTER_LOG.debug("skipping USB port: %s", port[1])
                         
+            self.initial_serial_devices = initial_serial_devices
         except Exception as e:
-            print("Error getting serial ports list: " + str(e))
+            _ADAPTER_LOG.error("Error getting serial ports list: %s", e)
+
+
+
+
+    def select_serial_port(self):
+        """ Figures out which of the connected USB serial devices is the MySensors gateway. Returns an empty string if none is. """
+        dev_port = ''
+        try:
+            if len(self.initial_serial_devices) == 1:
+                #dev_port = str(self.initial_serial_devices[0])
+                dev_port = next(iter(self.initial_serial_devices))
+                _ADAPTER_LOG.info("Only one serial device found, it's on port %s", dev_port)
+            elif len(self.initial_serial_devices) > 1:
+                cached_port = self.serial_port_cache.find(self.serial_port_info)
+                if cached_port != None:
+                    dev_port = str(cached_port)
+                    _ADAPTER_LOG.info("The serial gateway device was found on port %s last time, using it again", dev_port)
+                else:
+                    # Ask all the serial devices at the same time which one is a MySensors gateway.
+                    dev_port = probe_ports(sorted(self.initial_serial_devices), self.usb_serial_communication_speed, timeout=30)
+                    if dev_port != '':
+                        _ADAPTER_LOG.info("After a scan the serial gateway device was found on port %s", dev_port)
+                        self.serial_port_cache.save(dev_port, self.serial_port_info.get(dev_port, (None, None, None)))
+                    else:
+                        _ADAPTER_LOG.info("None of the connected serial devices answered like a MySensors gateway.")
+                
+        except Exception as ex:
+            _ADAPTER_LOG.error("Tried to find serial port, but there was an error: %s", ex)
+        return dev_port
+
+
+
+    def usb_changed(self, action, port_id):
+        """ Called by the USB watcher when a serial device is plugged in or removed. """
+        if action == 'remove' and port_id == self.serial_port and not self.no_receiver_plugged_in:
+            _ADAPTER_LOG.info("The MySensors receiver was unplugged")
+            self.no_receiver_plugged_in = True
+            self.stop_pymysensors_gateway()
+            self.send_pairing_prompt("MySensors receiver was unplugged")
+        
+        elif action == 'add' and self.no_receiver_plugged_in:
+            t = threading.Thread(target=self.attach_serial_gateway)
+            t.daemon = True
+            t.start()
+
 
 
+    def attach_serial_gateway(self):
+        """ Starts talking to a receiver that was plugged in while the add-on was already running. """
+        with self.attach_lock:
+            if not self.no_receiver_plugged_in:
+                return
+            sleep(1) # Give the new device a moment to settle
+            self.scan_usb_ports()
+            dev_port = self.select_serial_port()
+            if dev_port == '':
+                _ADAPTER_LOG.debug("Still no MySensors receiver plugged in")
+                return
+            
+            self.send_pairing_prompt("MySensors receiver detected")
+            self.no_receiver_plugged_in = False
+            self.first_request_done = False # So that the metric setting is applied and all nodes are asked to present themselves again.
+            self.serial_port = dev_port
+            self.start_pymysensors_gateway('USB Serial gateway', dev_port, '')
+
+
+
+    def collect_metrics(self):
+        """ Returns the current state of the queues and connections, as gauges for the metrics endpoint. """
+        gauges = [
+            ('mysensors_uptime_seconds', 'Seconds since the add-on started.', (), round(time.time() - METRICS.started, 1)),
+            ('mysensors_nodes', 'Number of nodes PyMySensors knows about.', (), len(self.GATEWAY.sensors) if self.GATEWAY != None else 0),
+            ('mysensors_property_index_size', 'Number of properties incoming messages can be matched to.', (), len(self.property_index)),
+        ]
+        for key, value in self.message_queue.stats().items():
+            gauges.append(('mysensors_message_queue', 'State of the incoming message queue.', (('stat', key),), value))
+        for key, value in self.announcer.stats().items():
+            gauges.append(('mysensors_device_announcements', 'Devices that were added or changed, and how often that was told to the gateway.', (('stat', key),), value))
+        for key, value in self.throttle.stats().items():
+            gauges.append(('mysensors_node_throttle', 'Nodes that send too many messages, and what happened to their messages.', (('stat', key),), value))
+        throttled_nodes = self.throttle.counted_nodes()
+        for node_id in throttled_nodes:
+            gauges.append(('mysensors_node_throttled', 'Whether a node is being throttled right now.', (('node', node_id),), self.throttle.throttled[node_id]))
+        for node_id in throttled_nodes:
+            gauges.append(('mysensors_node_throttle_starts', 'How often a node started being throttled.', (('node', node_id),), self.throttle.throttle_count[node_id]))
+        for action, counts in (('dropped', self.throttle.dropped), ('coalesced', self.throttle.coalesced)):
+            for node_id in throttled_nodes:
+                gauges.append(('mysensors_node_throttled_messages', 'Messages of throttled nodes that were dropped, or replaced by a newer one.', (('node', node_id), ('action', action)), counts[node_id]))
+        if self.command_queue != None:
+            for key, value in self.command_queue.stats().items():
+                gauges.append(('mysensors_command_queue', 'State of the outgoing command queue.', (('stat', key),), value))
+        if getattr(self, 'MQTTC', None) != None:
+            for key, value in self.MQTTC.stats().items():
+                gauges.append(('mysensors_mqtt', 'State of the MQTT connection.', (('stat', key),), value))
+        node_states = [(node_id, self.nodes.get(node_id)) for node_id in self.nodes.active_nodes()]
+        for name, key, help_text in (
+                ('mysensors_node_messages', 'messages', 'Incoming MySensors messages, per node, since the add-on started.'),
+                ('mysensors_node_last_seen_timestamp_seconds', 'last_seen', 'When a node was last heard from.'),
+                ('mysensors_node_battery_percent', 'battery', 'Battery level that a node reported.')):
+            for node_id, state in node_states:
+                gauges.append((name, help_text, (('node', node_id),), state[key]))
+        if self.rediscovery_report != None:
+            gauges.append(('mysensors_rediscovery_silent_nodes', 'Nodes that did not answer the last rediscovery.', (), len(self.rediscovery_report['silent'])))
+        return gauges
+
+
+
+    def update_diagnostics(self):
+        """ Fills in the 'MySensors Gateway' thing. Runs on the event loop, once a minute. """
+        if not self.running or not self.show_diagnostics:
+            return
+        try:
+            if self.diagnostics_device == None:
+                self.diagnostics_device = DiagnosticsDevice(self)
+                self.handle_device_added(self.diagnostics_device)
+            
+            node_counts = self.nodes.message_counts()
+            previous_counts = self.previous_node_message_counts if self.previous_node_message_counts != None else node_counts
+            node_rates = {}
+            for node_id in self.nodes.active_nodes():
+                node_rates[node_id] = node_counts[node_id] - previous_counts[node_id]
+            self.previous_node_message_counts = node_counts
+            
+            busiest = sorted(node_rates.items(), key=lambda item: item[1], reverse=True)[:3]
+            summary = "Busiest nodes: " + ", ".join(str(node_id) + " (" + str(count) + "/min)" for node_id, count in busiest if count > 0)
+            summary += ". Queue: " + str(self.message_queue.depth())
+            latency = METRICS.histogram('mysensors_property_notify_latency_seconds')
+            if latency != None:
+                summary += ". Notify latency p95 < " + str(latency.quantile(0.95)) + "s"
+            if self.command_queue != None:
+                command_stats = self.command_queue.stats()
+                summary += ". Commands pending: " + str(command_stats['pending']) + ", failed: " + str(command_stats['failed'])
+            
+            throttled = self.throttle.throttled_nodes()
+            self.diagnostics_device.update(sum(node_rates.values()), summary, ", ".join(str(node_id) for node_id in throttled) if throttled else "None")
+        except Exception as ex:
+            _ADAPTER_LOG.error("Error while updating diagnostics thing: %s", ex)
+        
+        self.event_loop.loop.call_later(60, self.update_diagnostics)
+
 
 
     def try_rerequest(self):
@@ -803,56 +1153,52 @@ class MySensorsAdapter(Adapter):
         if self.GATEWAY != None:
             try:
                 if self.t:
-                    if self.DEBUG:
-                        print("Rerequest thread already existed")
+                    _ADAPTER_LOG.debug("Rerequest thread already existed")
                     if not self.t.is_alive():
                         # Restarting request for presentation of nodes
                         self.t = threading.Thread(target=self.rerequest)
                         self.t.daemon = True
                         self.t.start()
-                        if self.DEBUG:
-                            print("Re-request of node presentation restarted")
+                        _ADAPTER_LOG.debug("Re-request of node presentation restarted")
                     else:
-                        if self.DEBUG:
-                            print("Already busy re-requesting nodes.")
+                        _ADAPTER_LOG.debug("Already busy re-requesting nodes.")
             except:
                 try:
                     self.t = threading.Thread(target=self.rerequest)
                     self.t.daemon = True
                     self.t.start()
-                    if self.DEBUG:
-                        print("Re-request thread created")
+                    _ADAPTER_LOG.debug("Re-request thread created")
                 except:
-                    print("Could not create thread")
+                    _ADAPTER_LOG.warning("Could not create thread")
 
 
     def rerequest(self):   
-        if self.DEBUG:
-            print("Re-requesting presentation of all nodes on the network")
+        _ADAPTER_LOG.debug("Re-requesting presentation of all nodes on the network")
         
-        #while self.running:
-            
         try:
-            if self.DEBUG:
-                print("Sending discovery request")
-            self.GATEWAY.send('0;255;3;0;26;0\n') # Ask all nodes within earshot to respond with their node ID's.
+            _ADAPTER_LOG.debug("Sending discovery request")
+            self.send_to_gateway(self.GATEWAY.send, '0;255;3;0;26;0\n') # Ask all nodes within earshot to respond with their node ID's.
             sleep(3)
-            # this asks all known devices to re-present themselves. In a future version this request could only be made to nodes where a device property count is lower than expected.
-            if self.DEBUG:
-                print("Starting looping over all known nodes in self.GATEWAY.sensors")
-            for index in self.GATEWAY.sensors: #, sensor
-                if self.DEBUG:
-                    print("<< Requesting presentation from " + str(index))
-                discover_encoded_message = str(index) + ';255;3;0;19;\n'
-                self.GATEWAY.send(discover_encoded_message)
-                sleep(1.11)
+            
+            # This asks all known devices to re-present themselves, except those that have done so recently.
+            node_ids = []
+            skipped = []
+            now = time.time()
+            for index in list(self.GATEWAY.sensors):
+                if now - self.last_presentation_times.get(index, 0) < self.rediscovery_skip_seconds:
+                    skipped.append(index)
+                else:
+                    node_ids.append(index)
+            
+            self.rediscovery = Rediscovery(functools.partial(self.send_to_gateway, self.GATEWAY.send))
+            self.rediscovery_report = self.rediscovery.run(node_ids, skipped)
+            METRICS.observe('mysensors_rediscovery_seconds', self.rediscovery_report['duration'])
+            
+            _ADAPTER_LOG.info("Rediscovery took %s seconds. Responders: %s, silent: %s, skipped: %s", self.rediscovery_report['duration'], self.rediscovery_report['responders'], self.rediscovery_report['silent'], self.rediscovery_report['skipped'])
         except Exception as ex:
-            print("error while re-requesting presentation of all devices: " + str(ex))
+            _ADAPTER_LOG.error("error while re-requesting presentation of all devices: %s", ex)
                 
-        if self.DEBUG:
-            print("Finished re-requesting nodes to present themselves")
-            #sleep(10800) # Every three hours ask all devices to call back in.
-            #print("Just woke up after 3 hour nap, ")
+        _ADAPTER_LOG.debug("Finished re-requesting nodes to present themselves")
 
 
 
@@ -866,11 +1212,11 @@ class MySensorsAdapter(Adapter):
             config = database.load_config()
             database.close()
         except:
-            print("Error! Failed to open settings database.")
+            _ADAPTER_LOG.error("Error! Failed to open settings database.")
             self.close_proxy()
 
         if not config:
-            print("Error loading config from database")
+            _ADAPTER_LOG.error("Error loading config from database")
             return
         
         
@@ -879,51 +1225,98 @@ class MySensorsAdapter(Adapter):
         try:
             if 'Debugging' in config:
                 self.DEBUG = bool(config['Debugging'])
-                if self.DEBUG:
-                    print("Debugging is set to: " + str(self.DEBUG))
+                self.event_loop.debug = self.DEBUG
+                _ADAPTER_LOG.debug("Debugging is set to: %s", self.DEBUG)
             else:
                 self.DEBUG = False
                 
         except:
-            print("Error loading debugging preference")
+            _ADAPTER_LOG.error("Error loading debugging preference")
+        
+        # Log levels. Debugging sets the default, which can be changed per subsystem.
+        try:
+            log_levels = None
+            if 'Log levels' in config:
+                log_levels = parse_log_levels(config['Log levels'])
+            configure_logging(self.DEBUG, log_levels)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Log levels preference error:%s", ex)
             
             
         
         # Timeout period
         try:
             if 'Timeout period' in config:
-                if self.DEBUG:
-                    print("-Timeout period preference is present in the config data.")
+                _ADAPTER_LOG.debug("-Timeout period preference is present in the config data.")
                 self.timeout_seconds = int(config['Timeout period']) * 60
+                self.liveness.timeout_seconds = self.timeout_seconds
                 if self.timeout_seconds != 0:
-                    if self.DEBUG:
-                        print("Starting the internal clock")
+                    _ADAPTER_LOG.debug("Starting the internal clock")
                     try:
+                        self.event_loop.start()
+                        self.liveness.start(self.event_loop.loop)
                         t = threading.Thread(target=self.clock)
                         t.daemon = True
                         t.start()
                     except:
-                        print("Error starting the clock thread")
+                        _ADAPTER_LOG.error("Error starting the clock thread")
                 else:
-                    print("-Timeout period was set to 0, so will not check for timeouts.")    
+                    _ADAPTER_LOG.info("-Timeout period was set to 0, so will not check for timeouts.")    
                 
             else:
-                print("Timeout period was not in config")
+                _ADAPTER_LOG.info("Timeout period was not in config")
         except Exception as ex:
-            print("Timeout period preference error:" + str(ex))
+            _ADAPTER_LOG.error("Timeout period preference error:%s", ex)
             
         
         # USB serial communication speed
         try:
             if 'USB serial communication speed' in config:
                 self.usb_serial_communication_speed = int(config['USB serial communication speed'])
-                print("-USB serial communication speed: " + str(self.usb_serial_communication_speed))
+                _ADAPTER_LOG.info("-USB serial communication speed: %s", self.usb_serial_communication_speed)
                 
         except Exception as ex:
-            print("USB Serial communication speed error:" + str(ex))
-            print("-USB serial communication speed = " + str(self.usb_serial_communication_speed))
+            _ADAPTER_LOG.error("USB Serial communication speed error:%s", ex)
+            _ADAPTER_LOG.info("-USB serial communication speed = %s", self.usb_serial_communication_speed)
+
+        
+        # Message queue
+        try:
+            if 'Message queue size' in config:
+                self.message_queue.maxsize = max(1, int(config['Message queue size']))
+            if 'Message queue overflow' in config:
+                self.message_queue.set_policy(str(config['Message queue overflow']))
+            _ADAPTER_LOG.debug("-Message queue size: %s, overflow policy: %s", self.message_queue.maxsize, self.message_queue.policy)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Message queue preference error:%s", ex)
 
         
+        # Per node message limits
+        try:
+            self.throttle.configure(
+                config.get('Node message limit', 600),
+                config.get('Node message burst', 60),
+                str(config.get('Throttled messages', 'coalesce')))
+            _ADAPTER_LOG.debug("-Node message limit: %s per minute, burst: %s, action: %s", self.throttle.rate * 60, self.throttle.burst, self.throttle.action)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Node message limit preference error:%s", ex)
+
+        
+        # Update rate limits
+        try:
+            if 'Minimum update interval' in config:
+                self.minimum_update_interval = max(0, float(config['Minimum update interval']))
+            if 'Update interval per type' in config:
+                for main_type, setting in parse_type_settings(config['Update interval per type']).items():
+                    self.update_intervals[main_type] = max(0, float(setting))
+            if 'Deadband per type' in config:
+                for main_type, setting in parse_type_settings(config['Deadband per type']).items():
+                    self.deadbands[main_type] = parse_deadband(setting)
+            _ADAPTER_LOG.debug("-Update intervals: %s, per type: %s, deadbands: %s", self.minimum_update_interval, self.update_intervals, self.deadbands)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Update interval or deadband preference error:%s", ex)
+
+
         # Metric or Imperial
         try:
             if 'Metric' in config:
@@ -933,7 +1326,7 @@ class MySensorsAdapter(Adapter):
             else:
                 self.metric = True
         except Exception as ex:
-            print("Metric/Fahrenheit preference not found." + str(ex))
+            _ADAPTER_LOG.info("Metric/Fahrenheit preference not found.%s", ex)
             
             
         # MQTT username and password
@@ -941,15 +1334,15 @@ class MySensorsAdapter(Adapter):
             if 'MQTT username' in config:
                 self.MQTT_username = str(config['MQTT username'])
             else:
-                print("No MQTT username set")
+                _ADAPTER_LOG.info("No MQTT username set")
 
             if 'MQTT password' in config:
                 self.MQTT_password = str(config['MQTT password'])
             else:
-                print("No MQTT password set")
+                _ADAPTER_LOG.info("No MQTT password set")
                 
         except Exception as ex:
-            print("MQTT username and/or password error:" + str(ex))
+            _ADAPTER_LOG.error("MQTT username and/or password error:%s", ex)
             
             
         # MQTT prefixes
@@ -957,92 +1350,104 @@ class MySensorsAdapter(Adapter):
             if 'MQTT in prefix' in config:
                 self.MQTT_in_prefix = str(config['MQTT in prefix'])
             else:
-                print("No MQTT in prefix set")
+                _ADAPTER_LOG.info("No MQTT in prefix set")
 
             if 'MQTT out prefix' in config:
                 self.MQTT_out_prefix = str(config['MQTT out prefix'])
             else:
-                print("No MQTT out prefix set")
+                _ADAPTER_LOG.info("No MQTT out prefix set")
                 
         except Exception as ex:
-            print("MQTT username and/or password error:" + str(ex))
+            _ADAPTER_LOG.error("MQTT username and/or password error:%s", ex)
             
             
+        # Persistence format
+        try:
+            if 'Persistence format' in config and str(config['Persistence format']) == 'Journal':
+                self.persistence = JournalPersistence(self.persistence_file_path)
+                _ADAPTER_LOG.debug("-Using the persistence journal")
+        except Exception as ex:
+            _ADAPTER_LOG.error("Persistence format preference error:%s", ex)
+        
+        
+        # Staged startup
+        try:
+            if 'Staged startup' in config:
+                self.staged_startup = bool(config['Staged startup'])
+        except Exception as ex:
+            _ADAPTER_LOG.error("Staged startup preference error:%s", ex)
+        
+        try:
+            if 'Command retries' in config:
+                self.command_retries = max(0, int(config['Command retries']))
+                _ADAPTER_LOG.debug("-Command retries preference was in config: %s", self.command_retries)
+        except Exception as ex:
+            _ADAPTER_LOG.error("Command retries preference error:%s", ex)
+        
+        # Metrics
+        try:
+            if 'Metrics port' in config:
+                self.metrics_port = int(config['Metrics port'])
+            if 'Show diagnostics thing' in config:
+                self.show_diagnostics = bool(config['Show diagnostics thing'])
+        except Exception as ex:
+            _ADAPTER_LOG.error("Metrics preference error:%s", ex)
+        
+        if self.metrics_port > 0:
+            self.metrics_server = MetricsServer(METRICS, self.metrics_port)
+            self.metrics_server.start()
+        try:
+            if 'Capture messages' in config and bool(config['Capture messages']):
+                self.capture = CaptureWriter(os.path.join(self.user_profile['dataDir'], self.addon_name, 'mysensors-adapter-capture.txt'))
+                self.capture.start()
+        except Exception as ex:
+            _ADAPTER_LOG.error("Capture messages preference error:%s", ex)
+            self.capture = None
+        
+        if self.show_diagnostics:
+            self.event_loop.start()
+            self.event_loop.call_soon(self.update_diagnostics)
+        
+        
         # Forget everything
         if 'Do not remember devices' in config:
             self.remember_devices = not bool(config['Do not remember devices'])
             if not self.remember_devices:
-                if os.path.exists(self.persistence_file_path):
-                    if self.DEBUG:
-                        print("forgettting persistence data")
-                    os.remove(self.persistence_file_path)
+                _ADAPTER_LOG.debug("forgettting persistence data")
+                self.persistence.clear()
                 
         # Now that that we know the desired connection status preference, we quickly recreate all devices.
         try:
             if self.remember_devices:
                 self.recreate_from_persistence()
         except Exception as ex:
-            print("Error while recreating after start_persistence: " + str(ex))
+            _ADAPTER_LOG.error("Error while recreating after start_persistence: %s", ex)
 
-        try:
-            self.send_in_the_clones()
-        except Exception as ex:
-            print("Error while creating clones: " + str(ex))
+        # With a staged startup the clones are created once all the properties exist.
+        if len(self.pending_materialization) == 0:
+            try:
+                self.send_in_the_clones()
+            except Exception as ex:
+                _ADAPTER_LOG.error("Error while creating clones: %s", ex)
 
             
         try:
             if 'Gateway' in config:
                 selected_gateway_type = str(config['Gateway'])
-                print("-Gateway choice: " + str(selected_gateway_type))
+                _ADAPTER_LOG.info("-Gateway choice: %s", selected_gateway_type)
             else:
-                print("Error: no gateway type selected in add-on settings!")
+                _ADAPTER_LOG.error("Error: no gateway type selected in add-on settings!")
                 return
             
             
             if selected_gateway_type == 'USB Serial gateway':
                 dev_port = ''
                 if 'USB device name' not in config or str(config['USB device name']) == '':
-                    if self.DEBUG:
-                        print("Port ID was empty, initiating scan of USB serial ports")
-                    try:
-                        if len(self.initial_serial_devices) == 1:
-                            #dev_port = str(self.initial_serial_devices[0])
-                            dev_port = next(iter(self.initial_serial_devices))
-                            print("Only one serial device found, it's on port " + str(dev_port))
-                        elif len(self.initial_serial_devices) > 1:
-                            for port_id in self.initial_serial_devices:
-                                if self.DEBUG:
-                                    print("Scanning port: = " + str(port_id))
-                                current_serial_object = serial.Serial(str(port_id), self.usb_serial_communication_speed, timeout=1)
-                                timeout_counter = 300
-                                while( timeout_counter > 0):     # Wait at most 30 seconds for data from the serial port
-                                    timeout_counter -= 1
-                                    #time.sleep(.1)
-                                    sleep(.1)
-                                    if int(current_serial_object.inWaiting()) > 0:
-                                        timeout_counter = 0
-                                    #print(str(timeout_counter))
-                                
-                                if current_serial_object.inWaiting() > 0:   # If serial data is available, check the first line to see if it is the MySensors gateway device.
-                                    ser_bytes = current_serial_object.readline()
-                                    decoded_bytes = ser_bytes.decode("utf-8") # Use ASCII decode instead?
-                                    if self.DEBUG:
-                                        print("Serial data received: " + str(decoded_bytes))
-                                    if "Gateway startup complete" in decoded_bytes:
-                                        print("After a scan the serial gateway device was found on port " + str(port_id))
-                                        dev_port = str(port_id)
-                                        current_serial_object.close()
-                                        break
-                                else:
-                                    print("The connected serial device did not have any data available. Are you sure it's a MySensors gateway?")
-                                current_serial_object.close()
-                        elif len(self.initial_serial_devices) == 0:
-                            self.send_pairing_prompt("No MySensors receiver found")
-                            self.no_receiver_plugged_in = True
-                            return
-                            
-                    except Exception as ex:
-                        print("Tried to find serial port, but there was an error: " + str(ex))
+                    _ADAPTER_LOG.debug("Port ID was empty, initiating scan of USB serial ports")
+                    dev_port = self.select_serial_port()
+                    
+                    # Keep an eye on USB devices being plugged in or removed, so the receiver can be (re)attached without restarting the add-on.
+                    self.usb_watcher.start()
                         
                     if dev_port == '':
                         self.send_pairing_prompt("No MySensors receiver found")
@@ -1053,13 +1458,13 @@ class MySensorsAdapter(Adapter):
                 
                 elif str(config['USB device name']) != '':
                     dev_port = str(config['USB device name'])
-                    print("USB gateway selected, and custom port id provided: " + str(dev_port))
+                    _ADAPTER_LOG.info("USB gateway selected, and custom port id provided: %s", dev_port)
                     if dev_port not in self.initial_serial_devices:
-                        print("Warning, no actual USB device found at specified serial port")
+                        _ADAPTER_LOG.warning("Warning, no actual USB device found at specified serial port")
                 
+                self.serial_port = dev_port
                 self.start_pymysensors_gateway(selected_gateway_type, dev_port, '')
-                if self.DEBUG:
-                    print("Beyond start_pymysensors_gateway")
+                _ADAPTER_LOG.debug("Beyond start_pymysensors_gateway")
                 
             elif selected_gateway_type == 'Ethernet gateway':
                 
@@ -1068,8 +1473,7 @@ class MySensorsAdapter(Adapter):
                 else:
                     ip_address = str(config['IP address'])
                 
-                if self.DEBUG:
-                    print("Selected IP address and port: " + str(ip_address))
+                _ADAPTER_LOG.debug("Selected IP address and port: %s", ip_address)
                 self.start_pymysensors_gateway(selected_gateway_type, '', ip_address)
                 
             elif selected_gateway_type == 'MQTT gateway':
@@ -1079,14 +1483,12 @@ class MySensorsAdapter(Adapter):
                 else:
                     ip_address = str(config['IP address'])
                 
-                if self.DEBUG:
-                    print("Selected IP address: " + str(ip_address))
+                _ADAPTER_LOG.debug("Selected IP address: %s", ip_address)
                 self.start_pymysensors_gateway(selected_gateway_type, '', ip_address)
 
-            if self.DEBUG:
-                print("End of handling configuration section")
+            _ADAPTER_LOG.debug("End of handling configuration section")
         except Exception as ex:
-            print("Error extracting settings from config object: " + str(ex))
+            _ADAPTER_LOG.error("Error extracting settings from config object: %s", ex)
         return
 
 
@@ -1100,11 +1502,10 @@ class MySensorsAdapter(Adapter):
         """
         #print()
         if self.no_receiver_plugged_in == False:
-            if self.DEBUG:
-                print("PAIRING INITIATED")
+            _ADAPTER_LOG.debug("PAIRING INITIATED")
         
             if self.pairing:
-                print("-Already pairing")
+                _ADAPTER_LOG.info("-Already pairing")
                 return
 
             self.pairing = True
@@ -1114,7 +1515,7 @@ class MySensorsAdapter(Adapter):
             try:
                 self.send_in_the_clones()
             except Exception as ex:
-                print("Error while optimizing: " + str(ex))
+                _ADAPTER_LOG.error("Error while optimizing: %s", ex)
             
         return
 
@@ -1156,17 +1557,14 @@ class MySensorsAdapter(Adapter):
     def send_in_the_clones(self):
         # Generate additional buttons if so desired.
         if self.optimize:
-            if self.DEBUG:
-                print("")
-                print("Creating extra clones of properties from devices with a lot of toggles.")
+            _ADAPTER_LOG.debug("Creating extra clones of properties from devices with a lot of toggles.")
             # Check if the device already has an 'OnOff property in devices
             
             new_devices_to_add = []
             properties_to_remove_OnOff_from = []
             try:
                 for device_name in self.get_devices():
-                    if self.DEBUG:
-                        print("cloning > device_name = " + str(device_name))
+                    _ADAPTER_LOG.debug("cloning > device_name = %s", device_name)
                     #onOff_count = 0
                     
                     try:
@@ -1186,17 +1584,17 @@ class MySensorsAdapter(Adapter):
                                     extra_name = str(property_object.node_id) + "-" + str(property_object.child_id)
                                     property_label = str(property_object.description['label'])
                                     
-                                    if self.DEBUG:
-                                        print("extra property title = " + str(property_label))
+                                    _ADAPTER_LOG.debug("extra property title = %s", property_label)
                                     # Check if the extra thing hasn't already been created
                                                                     # Add the node to the devices list
                                     device = MySensorsDevice(self, extra_name, property_label)
                                     try:
-                                        device.add_child(property_label,property_object.node_id,property_object.child_id,property_object.main_type, property_object.subchild_id, property_object.values, property_object.value)
+                                        values = self.GATEWAY.sensors[property_object.node_id].children[property_object.child_id].values
+                                        device.add_child(property_label,property_object.node_id,property_object.child_id,property_object.main_type, property_object.subchild_id, values, property_object.value)
                                         new_devices_to_add.append(device)
                                         #print("CHILD ADDED!")
                                     except Exception as ex:
-                                        print("Could not add child to thing clone: " + str(ex))
+                                        _ADAPTER_LOG.warning("Could not add child to thing clone: %s", ex)
 
                                     # Now try to get that device handle again.
                                     #try:
@@ -1205,21 +1603,20 @@ class MySensorsAdapter(Adapter):
                                     #    print("Error while checking if node exists as device AGAIN: " + str(ex))
 
                             except Exception as ex:
-                                print("Error cloning: " + str(ex))
+                                _ADAPTER_LOG.error("Error cloning: %s", ex)
                     except Exception as ex:
-                        print("Error getting target device while cloning: " + str(ex))
+                        _ADAPTER_LOG.error("Error getting target device while cloning: %s", ex)
                     
                     
             except Exception as ex:
-                print("Error creating extra buttons: " + str(ex))
+                _ADAPTER_LOG.error("Error creating extra buttons: %s", ex)
             
             try:
                 for new_device in new_devices_to_add:
                     self.handle_device_added(new_device)
-                    if self.DEBUG:
-                        print("Added clone: " + str(new_device.title))
+                    _ADAPTER_LOG.debug("Added clone: %s", new_device.title)
             except:
-                print("could not add the clones to the internal devices list")
+                _ADAPTER_LOG.warning("could not add the clones to the internal devices list")
                 
             try:
                 for donor_property in properties_to_remove_OnOff_from:
@@ -1227,60 +1624,8 @@ class MySensorsAdapter(Adapter):
                     #print(str(vars(donor_property)))
                     if 'description' in donor_property:
                         if '@type' in donor_property.description:
-                            donor_property.description['@type'] = None # Will this already remove the capability from the donor?
-                            if self.DEBUG:
-                                print("Removed capability from " + str(donor_property.title))
+                            donor_property.set_description_field('@type', None) # Will this already remove the capability from the donor?
+                            _ADAPTER_LOG.debug("Removed capability from %s", donor_property.title)
                     
             except:
-                print("Could not remove OnOff property from the clone's donor property")
-
-
-
-class MQTT(object):
-    """MQTT client example."""
-
-    # pylint: disable=unused-argument
-
-    def __init__(self, broker, port, keepalive):
-        """Setup MQTT client."""
-        print("MQTT object init")
-        self.topics = {}
-        self._mqttc = mqtt.Client()
-        self._mqttc.connect(broker, port, keepalive)
-
-    def authenticate(self,username,password):
-        """ Authenticate with username and password """
-        self._mqttc.username_pw_set(username, password)
-
-    def publish(self, topic, payload, qos, retain):
-        """Publish an MQTT message."""
-        self._mqttc.publish(topic, payload, qos, retain)
-
-    def subscribe(self, topic, callback, qos):
-        """Subscribe to an MQTT topic."""
-        print("subscribing to topic " + str(topic))
-        if topic in self.topics:
-            print("already subscribed")
-            return
-        
-        def _message_callback(mqttc, userdata, msg):
-            """Callback added to callback list for received message."""
-            #print("calling callback")
-            callback(msg.topic, msg.payload.decode('utf-8'), msg.qos)
-            
-        self._mqttc.subscribe(topic, qos)
-        self._mqttc.message_callback_add(topic, _message_callback)
-        self.topics[topic] = callback
-
-    def start(self):
-        """Run the MQTT client."""
-        self._mqttc.loop_start()
-        print("Started MQTT client")
-
-    def stop(self):
-        """Stop the MQTT client."""
-        print('Stop MQTT client')
-        self._mqttc.disconnect()
-        self._mqttc.loop_stop()
-
-
+                _ADAPTER_LOG.warning("Could not remove OnOff property from the clone's donor property")
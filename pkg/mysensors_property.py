@@ -1,20 +1,31 @@
 """MySensors adapter for WebThings Gateway."""
 
+import threading
+import time
 import mysensors.mysensors as mysensors
 
 from gateway_addon import Property
-from .util import pretty, is_a_number, get_int_or_float
+from .util import pretty
+from .payload import get_decoder, decimals_for, encode_value
+from .metrics import METRICS
+from .logger import get_logger
+
+_LOG = get_logger('properties')
 
 class MySensorsProperty(Property):
     """MySensors property type."""
 
-    def __init__(self, device, name, description, values, value, node_id, child_id, main_type, subchild_id): # subchild_id is V_TYPE
+    # A network can have thousands of properties, so the attributes this class adds are kept in slots.
+    __slots__ = ('node_id', 'child_id', 'main_type', 'subchild_id', 'decode', 'decimals',
+        'min_notify_interval', 'deadband', 'last_notify_time', 'pending_value', 'pending_received_at', 'notify_timer')
+
+    def __init__(self, device, name, description, value, node_id, child_id, main_type, subchild_id): # subchild_id is V_TYPE
         """
         Initialize the object.
 
         device -- the Device this property belongs to
         name -- name of the property
-        description -- description of the property, as a dictionary
+        description -- description of the property, as a dictionary. It may be shared with other properties, so it is never modified.
         value -- current value of this property
         """
         #print()
@@ -24,36 +35,46 @@ class MySensorsProperty(Property):
         #print("-description: " + str(description))
         #print("-value: " + str(value))
         try:
-            if device.adapter.DEBUG:
-                print("Property: initialising")
+            _LOG.debug("Property: initialising")
             Property.__init__(self, device, name, description)
             
 
             #self.device = device
-            self.node_id = node_id # These three are used in the set_value function to send a message back to the proper node in the MySensors network.
-            self.child_id = child_id
-            self.main_type = main_type
-            self.subchild_id = subchild_id
+            self.node_id = int(node_id) # These three are used in the set_value function to send a message back to the proper node in the MySensors network.
+            self.child_id = int(child_id)
+            self.main_type = int(main_type)
+            self.subchild_id = int(subchild_id)
 
             self.device = device
             self.name = name
             self.title = name
             self.description = description
-            self.values = values
+            
+            # How payloads turn into values depends on the type of the property, so that is looked up only once.
+            self.decode = get_decoder(description, subchild_id)
+            self.decimals = decimals_for(description.get('multipleOf'))
+            if value != None:
+                value = self.decode(value)
             self.value = value
             self.set_cached_value(value)
+            
+            # Rate limiting and deadband. Chatty nodes, like power meters, can otherwise flood the gateway with updates.
+            self.last_notify_time = 0
+            self.pending_value = None
+            self.pending_received_at = None
+            self.notify_timer = None
+            self.min_notify_interval, self.deadband = device.adapter.get_update_limits(main_type)
             #self.device.notify_property_changed(self)
             #self.set_cached_value(value)
             #self.value = value #hmm, test
             #self.device = device
-            if device.adapter.DEBUG:
-                print("property value = " + str(self.value))
+            _LOG.debug("property value = %s", self.value)
             #print("self.device inside property = " + str(self.device))
             #self.device.notify_property_changed(self)
             #print("property init done")
             
         except Exception as ex:
-            print("inside adding property error: " + str(ex))
+            _LOG.error("inside adding property error: %s", ex)
 
 
     def set_value(self, value):
@@ -64,8 +85,7 @@ class MySensorsProperty(Property):
         """
         
         #if device.adapter.DEBUG:
-        if self.device.adapter.DEBUG:
-            print("<< Outgoing message to " + str(self.name) + " on MySensors network: " + str(value))
+        _LOG.debug("<< Outgoing message to %s on MySensors network: %s", self.name, value)
         #print("<< Sending update to MySensors network: " + str(value))
         #print("->name " + str(self.name))
         #print("->devi " + str(self.device))
@@ -75,48 +95,42 @@ class MySensorsProperty(Property):
         
 
         try:
-            if self.device.adapter.DEBUG:
-                print("<< User initiated message to MySensors network: " + str(value))
+            _LOG.debug("<< User initiated message to MySensors network: %s", value)
             # To set sensor 1, child 1, sub-type V_LIGHT (= 2), with value 1.
-            intNodeID = int(float(self.node_id))
-            intChildID = int(float(self.child_id))
-            intSubchildID = int(float(self.subchild_id))
+            intNodeID = self.node_id
+            intChildID = self.child_id
+            intSubchildID = self.subchild_id
             
-            print("self.subchild_id = " + str(self.subchild_id))
+            _LOG.debug("self.subchild_id = %s", self.subchild_id)
             
-            if is_a_number(value) and self.subchild_id != 47: # 47 is V_TEXT
-                if self.device.adapter.DEBUG:
-                    print("-will be sent as int or float")
-                new_value = get_int_or_float(value)
-                #new_value = float( int( new_value * 100) / 100)
-                if self.device.adapter.DEBUG:
-                    print("tamed float = " + str(new_value))
-                
-                #if new_value == 0:
-                #    new_value = False
-                #if new_value == 1:
-                #    new_value = True                
-                
-            else:
-                if self.device.adapter.DEBUG:
-                    print("-will be sent as string")
-                new_value = str(value)
+            new_value = encode_value(value, self.subchild_id, self.decimals)
+            if isinstance(new_value, str):
+                _LOG.debug("-will be sent as string")
                 if "@type" in self.description:
                     if self.description["@type"] == "ColorProperty":
                         new_value = new_value.lstrip("#")
+            else:
+                _LOG.debug("-will be sent as number: %s", new_value)
 
             
             try:
                 #print("-target values inside PyMySensors A: " + str(self.device.adapter.GATEWAY.sensors[self.node_id].children[self.child_id].values))
 
                 #print("-target values inside PyMySensors B: " + str(self.device.adapter.GATEWAY.sensors[intNodeID].children[intChildID].values))
-                self.device.adapter.GATEWAY.set_child_value(intNodeID, intChildID, intSubchildID, new_value) # here we send the data to the MySensors network.
+                self.device.adapter.send_command(intNodeID, intChildID, intSubchildID, new_value) # here we send the data to the MySensors network.
                 #print("-updated values inside PyMySensors: " + str(self.device.adapter.GATEWAY.sensors[intNodeID].children[intChildID].values))
             except Exception as ex:
-                print("property: set value inside PyMySensors object failed. Error: " + str(ex))
+                _LOG.error("property: set value inside PyMySensors object failed. Error: %s", ex)
 
         except Exception as ex:
-            print("set_value inside property object failed. Error: " + str(ex))
+            _LOG.error("set_value inside property object failed. Error: %s", ex)
+
+
+    def set_description_field(self, key, value):
+        """ Changes one field of the description of this property only. The shared description is copied first. """
+        description = dict(self.description)
+        description[key] = value
+        self.description = description
 
 
     # I'm not sure that this function is ever used
@@ -127,8 +141,7 @@ class MySensorsProperty(Property):
         value -- the value to update
         """
         
-        if self.device.adapter.DEBUG:
-            print("property -> update: " +str(value))
+        _LOG.debug("property -> update: %s", value)
         
         try:
             
@@ -147,7 +160,7 @@ class MySensorsProperty(Property):
             #        value = "unlocked"
         
         except:
-            print("error translating value from boolean to thermostat string")
+            _LOG.error("error translating value from boolean to thermostat string")
         
         try:
             if '@type' in self.description:
@@ -155,9 +168,60 @@ class MySensorsProperty(Property):
                     if not value.startswith('#'):
                         value = "#" + value
         except:
-            print("property: update: error adding # to color value")
+            _LOG.error("property: update: error adding # to color value")
         
-        if value != self.value:
-            self.value = value
-            self.set_cached_value(value)
-            self.device.notify_property_changed(self)
+        received_at = self.device.adapter.message_received_at
+        with self.device.notify_lock:
+            if self.notify_timer != None:
+                # An update is already scheduled. It will deliver this newer value instead.
+                self.pending_value = value
+                self.pending_received_at = received_at
+                return
+            
+            if value == self.value or self.within_deadband(value):
+                return
+            
+            if self.min_notify_interval > 0:
+                seconds_to_wait = self.min_notify_interval - (time.time() - self.last_notify_time)
+                if seconds_to_wait > 0:
+                    self.pending_value = value
+                    self.pending_received_at = received_at
+                    self.notify_timer = threading.Timer(seconds_to_wait, self.deliver_pending_value)
+                    self.notify_timer.daemon = True
+                    self.notify_timer.start()
+                    return
+            
+            self.notify(value, received_at)
+
+
+    def within_deadband(self, value):
+        """ Returns True if a numeric value changed too little to be worth telling the gateway about. """
+        amount, is_percentage = self.deadband
+        if amount == 0:
+            return False
+        if self.description.get('type') not in ('number', 'integer'):
+            return False
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not isinstance(self.value, (int, float)):
+            return False
+        if is_percentage:
+            return abs(value - self.value) < abs(self.value) * amount / 100
+        return abs(value - self.value) < amount
+
+
+    def deliver_pending_value(self):
+        """ Called by the timer at the end of the minimum notify interval, so that the latest value always arrives. """
+        with self.device.notify_lock:
+            value = self.pending_value
+            self.pending_value = None
+            self.notify_timer = None
+            if value != None and value != self.value and not self.within_deadband(value):
+                self.notify(value, self.pending_received_at)
+
+
+    def notify(self, value, received_at=None):
+        self.value = value
+        self.set_cached_value(value)
+        self.last_notify_time = time.time()
+        self.device.notify_property_changed(self)
+        if received_at != None:
+            METRICS.observe('mysensors_property_notify_latency_seconds', time.time() - received_at)
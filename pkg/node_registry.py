@@ -0,0 +1,113 @@
+"""Keeps the state of every node in the MySensors network in a few compact tables."""
+
+from array import array
+
+
+# MySensors node IDs go from 0 (the gateway itself) to 254. 255 is used by nodes that don't have an ID yet.
+NODE_COUNT = 255
+
+UNKNOWN_BATTERY = -1
+
+
+def node_index(node_id):
+    """ Returns the node ID as an integer, or None if it isn't a valid MySensors node ID. Persistence files use strings. """
+    if type(node_id) is not int:
+        try:
+            node_id = int(node_id)
+        except (TypeError, ValueError):
+            return None
+    if node_id < 0 or node_id >= NODE_COUNT:
+        return None
+    return node_id
+
+
+class NodeRegistry(object):
+    """
+    The state of each node: when it was last heard from, its heartbeat, battery level, and how many messages it sent.
+
+    Each field is an array with one slot per possible node ID, so there are no dictionaries keyed by node ID, and no way for
+    the same node to end up in them twice, once as 5 and once as '5'. A node that was never heard from simply has the default values.
+    """
+
+    def __init__(self):
+        """
+        Initialize the object.
+        """
+        self.last_seen = array('d', [0.0]) * NODE_COUNT # timestamp of the last message, 0 if never
+        self.tracked = array('b', [0]) * NODE_COUNT # 1 if the liveness tracker keeps an eye on the node
+        self.last_heartbeat = array('l', [0]) * NODE_COUNT # the counter of the last heartbeat the node sent
+        self.connected = array('b', [0]) * NODE_COUNT
+        self.battery = array('b', [UNKNOWN_BATTERY]) * NODE_COUNT # percentage
+        self.messages = array('Q', [0]) * NODE_COUNT # incoming messages since the add-on started
+
+
+    def message_received(self, message, timestamp):
+        """ Updates the tables with an incoming PyMySensors message. This is called for every message, so it's kept cheap. """
+        node_id = node_index(message.node_id)
+        if node_id == None:
+            return
+        self.last_seen[node_id] = timestamp
+        self.messages[node_id] += 1
+        if message.type == 3: # internal
+            sub_type = message.sub_type
+            if sub_type == 0: # I_BATTERY_LEVEL
+                self.battery[node_id] = self._clamp(message.payload, 0, 100, UNKNOWN_BATTERY)
+            elif sub_type == 22: # I_HEARTBEAT_RESPONSE
+                self.last_heartbeat[node_id] = self._clamp(message.payload, 0, 2147483647, 0)
+
+
+    def _clamp(self, payload, minimum, maximum, unknown):
+        try:
+            return max(minimum, min(maximum, int(float(payload))))
+        except (TypeError, ValueError):
+            return unknown
+
+
+    def set_connected(self, node_id, connected):
+        node_id = node_index(node_id)
+        if node_id != None:
+            self.connected[node_id] = 1 if connected else 0
+
+
+    def forget(self, node_id):
+        """ Resets a node to the defaults, for example because it was removed. """
+        node_id = node_index(node_id)
+        if node_id == None:
+            return
+        self.last_seen[node_id] = 0.0
+        self.tracked[node_id] = 0
+        self.last_heartbeat[node_id] = 0
+        self.connected[node_id] = 0
+        self.battery[node_id] = UNKNOWN_BATTERY
+        self.messages[node_id] = 0
+
+
+    def timed_out(self, timeout_seconds, now):
+        """ Returns the IDs of the tracked nodes that haven't been seen for longer than the timeout, in one scan of the table. """
+        oldest = now - timeout_seconds
+        last_seen = self.last_seen
+        return [node_id for node_id, tracked in enumerate(self.tracked) if tracked and last_seen[node_id] <= oldest]
+
+
+    def active_nodes(self):
+        """ Returns the IDs of the nodes that sent at least one message, or are tracked. """
+        return [node_id for node_id in range(NODE_COUNT) if self.messages[node_id] or self.tracked[node_id]]
+
+
+    def message_counts(self):
+        """ Returns a copy of the message counters, which can be compared with a later copy to get rates. """
+        return array('Q', self.messages)
+
+
+    def get(self, node_id):
+        """ Returns the state of a node as a dictionary, or None for an invalid node ID. """
+        node_id = node_index(node_id)
+        if node_id == None:
+            return None
+        return {
+            'last_seen': self.last_seen[node_id] or None,
+            'last_heartbeat': self.last_heartbeat[node_id],
+            'connected': bool(self.connected[node_id]),
+            'battery': None if self.battery[node_id] == UNKNOWN_BATTERY else self.battery[node_id],
+            'messages': self.messages[node_id],
+        }
@@ -0,0 +1,199 @@
+"""Keeps a single node that sends too many messages from flooding the adapter and the gateway."""
+
+import collections
+import threading
+import time
+from array import array
+
+from .logger import get_logger
+from .node_registry import NODE_COUNT, node_index
+
+
+_LOG = get_logger('messages')
+
+
+THROTTLE_ACTIONS = ('coalesce', 'drop')
+
+
+class NodeThrottle(object):
+    """
+    Gives every node a token bucket. Each incoming message takes a token, and tokens come back at a steady rate.
+
+    A node that runs out of tokens is throttled: its 'set' messages are held back, keeping only the newest value for each
+    property, and are passed on as soon as the node has tokens again. With the 'drop' action they are discarded instead.
+    Other messages, like presentations and heartbeats, are always passed on, but they do use up tokens.
+    A node is no longer throttled once its bucket is full again, which means it has been quiet for a while.
+    """
+
+    def __init__(self, deliver, on_throttled=None, messages_per_minute=0, burst=60, action='coalesce'):
+        """
+        Initialize the object.
+
+        deliver -- function that is called with a held back message once it may be handled after all
+        on_throttled -- function that is called with the node_id when a node starts being throttled
+        messages_per_minute -- how many messages a node may send per minute in the long run. 0 turns throttling off.
+        burst -- how many messages a node may send in quick succession
+        action -- what happens to 'set' messages over the limit: 'coalesce' or 'drop'
+        """
+        self.deliver = deliver
+        self.on_throttled = on_throttled
+        self.rate = 0.0 # tokens per second
+        self.burst = 1
+        self.action = 'coalesce'
+        self.configure(messages_per_minute, burst, action)
+
+        self.tokens = array('d', [0.0]) * NODE_COUNT
+        self.refilled_at = array('d', [0.0]) * NODE_COUNT # 0 means the bucket is full
+        self.throttled = array('b', [0]) * NODE_COUNT
+        self.throttle_count = array('L', [0]) * NODE_COUNT # how often the node started being throttled
+        self.dropped = array('Q', [0]) * NODE_COUNT
+        self.coalesced = array('Q', [0]) * NODE_COUNT
+
+        self._held = collections.OrderedDict() # (node_id, child_id, sub_type) -> newest held back message, oldest first
+        self._lock = threading.Lock()
+        self._timer = None
+
+
+    def configure(self, messages_per_minute, burst, action):
+        if action not in THROTTLE_ACTIONS:
+            raise ValueError("unknown throttle action: " + str(action))
+        self.rate = max(0, float(messages_per_minute)) / 60
+        self.burst = max(1, int(burst))
+        self.action = action
+
+
+    def stats(self):
+        return {
+            'throttled_nodes': sum(self.throttled),
+            'held': len(self._held),
+            'dropped': sum(self.dropped),
+            'coalesced': sum(self.coalesced),
+        }
+
+
+    def throttled_nodes(self):
+        return [node_id for node_id in range(NODE_COUNT) if self.throttled[node_id]]
+
+
+    def counted_nodes(self):
+        """ Returns the IDs of the nodes that were ever throttled. """
+        return [node_id for node_id in range(NODE_COUNT) if self.throttle_count[node_id]]
+
+
+    def check(self, message, now=None):
+        """
+        Returns True if the message may be handled right away. This is called for every incoming message, so it's kept cheap.
+
+        If it returns False the message was held back or dropped, and the node is throttled.
+        """
+        if self.rate <= 0:
+            return True
+        node_id = node_index(message.node_id)
+        if node_id == None:
+            return True
+        if now == None:
+            now = time.time()
+
+        started_throttling = False
+        with self._lock:
+            tokens = self._refill(node_id, now)
+            if tokens >= 1:
+                self.tokens[node_id] = tokens - 1
+                if message.type == 1 and len(self._held) > 0:
+                    # A held back value for this property is older, and should not arrive after this one.
+                    if self._held.pop((node_id, message.child_id, message.sub_type), None) != None:
+                        self.coalesced[node_id] += 1
+                return True
+
+            if message.type != 1:
+                return True
+
+            if not self.throttled[node_id]:
+                self.throttled[node_id] = 1
+                self.throttle_count[node_id] += 1
+                started_throttling = True
+
+            if self.action == 'drop':
+                self.dropped[node_id] += 1
+            else:
+                key = (node_id, message.child_id, message.sub_type)
+                if key in self._held:
+                    self.coalesced[node_id] += 1
+                self._held[key] = message
+                self._schedule()
+
+        if started_throttling and self.on_throttled != None:
+            try:
+                self.on_throttled(node_id)
+            except Exception as ex:
+                _LOG.error("Error while reporting throttled node: %s", ex)
+        return False
+
+
+    def _refill(self, node_id, now):
+        """ Adds the tokens that came back since the last refill, and returns how many there are now. Call with the lock held. """
+        if self.refilled_at[node_id] == 0:
+            tokens = float(self.burst)
+        else:
+            tokens = min(float(self.burst), self.tokens[node_id] + (now - self.refilled_at[node_id]) * self.rate)
+        self.tokens[node_id] = tokens
+        self.refilled_at[node_id] = now
+        if tokens >= self.burst and self.throttled[node_id]:
+            self.throttled[node_id] = 0
+            _LOG.info("Node %s is no longer throttled", node_id)
+        return tokens
+
+
+    def _schedule(self):
+        # Call with the lock held. One token comes back every 1/rate seconds.
+        if self._timer == None:
+            self._timer = threading.Timer(min(5, max(0.05, 1 / self.rate)), self.release)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+    def release(self):
+        """ Passes on the held back messages of nodes that have tokens again. Called by the timer. """
+        released = []
+        with self._lock:
+            self._timer = None
+            now = time.time()
+            for key in list(self._held):
+                node_id = key[0]
+                tokens = self._refill(node_id, now)
+                if tokens >= 1:
+                    self.tokens[node_id] = tokens - 1
+                    released.append(self._held.pop(key))
+            if len(self._held) > 0 and self.rate > 0:
+                self._schedule()
+
+        for message in released:
+            try:
+                self.deliver(message)
+            except Exception as ex:
+                _LOG.error("Error while passing on held back message: %s", ex)
+
+
+    def forget(self, node_id):
+        """ Resets a node, for example because it was removed. """
+        node_id = node_index(node_id)
+        if node_id == None:
+            return
+        with self._lock:
+            for key in [key for key in self._held if key[0] == node_id]:
+                del self._held[key]
+            self.tokens[node_id] = 0.0
+            self.refilled_at[node_id] = 0.0
+            self.throttled[node_id] = 0
+            self.throttle_count[node_id] = 0
+            self.dropped[node_id] = 0
+            self.coalesced[node_id] = 0
+
+
+    def stop(self):
+        """ Cancels the timer, and forgets the messages that are held back. """
+        with self._lock:
+            if self._timer != None:
+                self._timer.cancel()
+                self._timer = None
+            self._held.clear()
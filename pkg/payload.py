@@ -0,0 +1,126 @@
+"""Turns MySensors payloads into property values, and property values back into payloads."""
+
+
+# V_TYPES whose payload is always text, even if it looks like a number. A color like 000000 should not become 0.
+TEXT_SUB_TYPES = frozenset([
+    40, # V_RGB
+    41, # V_RGBW
+    47, # V_TEXT
+])
+
+_BOOLEANS = {'1': True, '0': False, 'true': True, 'false': False, 'on': True, 'off': False}
+_NUMBER_START = frozenset('-+.0123456789')
+_DEFAULT_DECIMALS = 2
+
+
+def parse_number(payload):
+    """
+    Returns the payload as an int or a float, or None if it isn't a number.
+
+    Payloads that can't be a number are recognised by their first character, so text doesn't cost an exception.
+    """
+    if isinstance(payload, (int, float)):
+        return int(payload) if isinstance(payload, bool) else payload
+    if not isinstance(payload, str):
+        payload = str(payload)
+    if payload == '' or payload[0] not in _NUMBER_START:
+        return None
+    if payload.isascii() and payload.isdigit(): # isdigit() alone also accepts digits like '²', which int() refuses
+        return int(payload)
+    try:
+        number = float(payload)
+    except ValueError:
+        return None
+    if number != number or number in (float('inf'), float('-inf')):
+        return None
+    return number
+
+
+def decimals_for(multiple_of):
+    """ Returns how many decimals a multipleOf like 0.1 or 0.001 allows. """
+    if multiple_of == None:
+        return _DEFAULT_DECIMALS
+    text = ('%.10f' % abs(float(multiple_of))).rstrip('0')
+    if text == '0.' and multiple_of != 0:
+        return 10 # Smaller than ten decimals can show
+    return len(text.split('.')[1])
+
+
+def decode_text(payload):
+    return str(payload)
+
+
+def decode_boolean(payload):
+    value = _BOOLEANS.get(payload)
+    if value != None:
+        return value
+    number = parse_number(payload)
+    if number != None:
+        return number != 0
+    value = _BOOLEANS.get(str(payload).strip().lower())
+    if value != None:
+        return value
+    return str(payload)
+
+
+def decode_integer(payload):
+    number = parse_number(payload)
+    if number == None:
+        return str(payload)
+    if isinstance(number, float):
+        return int(round(number))
+    return number
+
+
+def _make_number_decoder(decimals):
+    def decode_number(payload):
+        number = parse_number(payload)
+        if number == None:
+            return str(payload)
+        if isinstance(number, float):
+            number = round(number, decimals)
+            if number.is_integer():
+                return int(number)
+        return number
+    return decode_number
+
+
+# One decoder per number of decimals, shared by all properties
+_NUMBER_DECODERS = [_make_number_decoder(decimals) for decimals in range(11)]
+
+# For properties without a numeric type: a number if the payload looks like one, and text otherwise.
+decode_any = _NUMBER_DECODERS[_DEFAULT_DECIMALS]
+
+
+def get_decoder(description, sub_type):
+    """
+    Returns the function that turns a payload into a value for a property with this description and V_TYPE.
+
+    This is looked up once, when the property is created, so that each incoming message only needs a single call.
+    """
+    if int(sub_type) in TEXT_SUB_TYPES:
+        return decode_text
+    value_type = description.get('type')
+    if value_type == 'boolean':
+        return decode_boolean
+    if value_type == 'integer':
+        return decode_integer
+    if value_type == 'number':
+        return _NUMBER_DECODERS[min(decimals_for(description.get('multipleOf')), len(_NUMBER_DECODERS) - 1)]
+    return decode_any
+
+
+def encode_value(value, sub_type, decimals=_DEFAULT_DECIMALS):
+    """ Turns a value from the gateway into something to send to a node. Booleans become 1 or 0. """
+    if isinstance(value, bool):
+        return 1 if value else 0
+    if int(sub_type) in TEXT_SUB_TYPES:
+        return str(value)
+    number = parse_number(value)
+    if number == None:
+        return str(value)
+    if isinstance(number, float):
+        number = round(number, decimals)
+        if number.is_integer():
+            return int(number)
+    return number
@@ -0,0 +1,365 @@
+"""Safe changes to the PyMySensors persistence file, and an append-only alternative to it."""
+
+import json
+import os
+import threading
+import time
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+def write_atomically(file_path, text):
+    """ Replaces a file with new contents. The old contents stay intact until the new ones are safely on disk. """
+    temporary_path = file_path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, file_path)
+
+    # Make sure the rename itself has reached the disk too.
+    try:
+        directory = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    except OSError:
+        pass
+
+
+class PersistenceFile(object):
+    """
+    Applies keyed updates and deletes to the persistence JSON file.
+
+    Changes are collected for a moment, so that removing many things at once only rewrites the file once.
+    The file is written to a temporary file first, which then replaces the original. A power cut halfway through
+    a write can therefore never leave a corrupted file behind.
+
+    PyMySensors also writes to this file, so no copy of the data is kept in memory, and it is only used while PyMySensors
+    isn't saving the file itself. The pending changes are applied to the latest version of the file when it is written.
+    If writing fails the changes are kept, and writing is tried again after a delay that doubles every time.
+    After max_retries attempts it waits for the next change, or the flush when the add-on stops, to try again.
+    """
+
+    def __init__(self, file_path, delay=1.0, max_retries=8):
+        """
+        Initialize the object.
+
+        file_path -- path of the persistence JSON file
+        delay -- how many seconds to wait for more changes before writing
+        max_retries -- how often a failed write is retried on its own
+        """
+        self.file_path = file_path
+        self.delay = delay
+        self.max_retries = max_retries
+        self.failures = 0 # failed writes in a row
+
+        self._pending = {} # key -> new value, or None to delete the key
+        self._lock = threading.Lock()
+        self._timer = None
+
+
+    def load(self):
+        """ Returns the contents of the persistence file, with any pending changes applied. """
+        with open(self.file_path) as f:
+            data = json.load(f)
+        with self._lock:
+            self._apply(data, dict(self._pending))
+        return data
+
+
+    def update(self, key, value):
+        """ Sets the data of a node. """
+        self._change(str(key), value)
+
+
+    def delete(self, key):
+        """ Removes a node. """
+        self._change(str(key), None)
+
+
+    def _change(self, key, value):
+        with self._lock:
+            self._pending[key] = value
+        self._schedule()
+
+
+    def _schedule(self, delay=None):
+        with self._lock:
+            if self._timer == None:
+                self._timer = threading.Timer(self.delay if delay == None else delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+
+    def _apply(self, data, changes):
+        for key, value in changes.items():
+            if value != None:
+                data[key] = value
+            elif key in data:
+                del data[key]
+            else:
+                # Older files may not use the node ID as the key.
+                for existing_key, item in list(data.items()):
+                    if isinstance(item, dict) and str(item.get('sensor_id')) == key:
+                        del data[existing_key]
+
+
+    def flush(self):
+        """ Writes all pending changes to disk. """
+        with self._lock:
+            if self._timer != None:
+                self._timer.cancel()
+                self._timer = None
+            changes = self._pending
+            self._pending = {}
+
+        if len(changes) == 0 or not os.path.exists(self.file_path):
+            return
+
+        try:
+            with open(self.file_path) as f:
+                data = json.load(f)
+            self._apply(data, changes)
+            self.write(data)
+            _LOG.debug("Persistence data was saved.")
+            if self.failures > 0:
+                _LOG.info("Persistence data was saved after all")
+                self.failures = 0
+        except Exception as ex:
+            with self._lock:
+                # Changes that were made in the meantime are newer, and win.
+                changes.update(self._pending)
+                self._pending = changes
+            self.failures += 1
+            if self.failures == 1:
+                _LOG.error("Error while saving persistence data, will try again: %s", ex)
+            else:
+                _LOG.debug("Saving persistence data failed again (%s times): %s", self.failures, ex)
+            if self.failures <= self.max_retries:
+                self._schedule(self.delay * 2 ** self.failures)
+            elif self.failures == self.max_retries + 1:
+                _LOG.error("Could not save persistence data after %s attempts, will try again when something changes", self.failures)
+
+
+    def write(self, data):
+        """ Atomically replaces the file with new data. """
+        write_atomically(self.file_path, json.dumps(data, indent=4))
+
+
+    def clear(self):
+        """ Forgets everything. """
+        with self._lock:
+            self._pending = {}
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+
+
+class JournalPersistence(object):
+    """
+    Stores the nodes in a compact snapshot file, plus a journal of the changes made since.
+
+    Only nodes that have actually changed are appended to the journal, so an SD card isn't worn down by rewriting
+    the entire network every few seconds. Once the journal has grown long enough it is folded into a new snapshot.
+    When this is used, PyMySensors' own persistence is turned off.
+    """
+
+    def __init__(self, file_path, interval=10, compact_after=500):
+        """
+        Initialize the object.
+
+        file_path -- path of the old JSON persistence file. The snapshot and journal are stored next to it.
+        interval -- how often (in seconds) to check the nodes for changes
+        compact_after -- after how many journal entries a new snapshot is made
+        """
+        self.file_path = file_path
+        self.snapshot_path = file_path + '.snapshot'
+        self.journal_path = file_path + '.journal'
+        self.interval = interval
+        self.compact_after = compact_after
+        self.running = False
+        self.sensors = None
+
+        self._data = None
+        self._nodes = {} # key -> node as compact JSON text, as it was last written
+        self._journal_entries = 0
+        self._torn_at = None # Length of the journal up to an incomplete line, which must be cut off before appending to it.
+        self._loaded = False # The journal may only be appended to after the existing data has been read.
+        self._lock = threading.Lock()
+
+
+    def load(self):
+        """ Returns the nodes as a dictionary, like the JSON persistence file would. """
+        with self._lock:
+            return self._load()
+
+
+    def _load(self):
+        if self._data != None:
+            return self._data
+
+        data = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                data = json.load(f)
+        elif os.path.exists(self.file_path):
+            # First start after switching over: begin with the contents of the old JSON file.
+            with open(self.file_path) as f:
+                data = json.load(f)
+
+        self._journal_entries = 0
+        self._torn_at = None
+        if os.path.exists(self.journal_path):
+            offset = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("incomplete line")
+                        entry = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # The last line may be incomplete if the power was cut while it was written.
+                        _LOG.warning("Persistence journal ends with an incomplete entry, which will be removed")
+                        self._torn_at = offset
+                        break
+                    if 'node' in entry:
+                        data[entry['id']] = entry['node']
+                    else:
+                        data.pop(entry['id'], None)
+                    self._journal_entries += 1
+                    offset += len(line)
+
+        self._nodes = {key: json.dumps(node, sort_keys=True, separators=(',', ':')) for key, node in data.items()}
+        self._data = data
+        self._loaded = True
+        return data
+
+
+    def load_sensors(self):
+        """ Returns the nodes as PyMySensors Sensor objects, ready to be added to the gateway's sensors dictionary. """
+        from mysensors.persistence import MySensorsJSONDecoder
+        object_hook = MySensorsJSONDecoder().object_hook
+
+        def decode(obj):
+            # Mimics json.load, which calls the object hook from the inside out.
+            if isinstance(obj, dict):
+                return object_hook({key: decode(value) for key, value in obj.items()})
+            if isinstance(obj, list):
+                return [decode(value) for value in obj]
+            return obj
+
+        return decode(self.load())
+
+
+    def update(self, key, value):
+        """ Sets the data of a node. """
+        with self._lock:
+            self._append({str(key): json.dumps(value, sort_keys=True, separators=(',', ':'))}, [])
+
+
+    def delete(self, key):
+        """ Removes a node. """
+        with self._lock:
+            self._append({}, [str(key)])
+
+
+    def sync(self, sensors):
+        """ Writes the nodes that changed since the last time to the journal. """
+        from mysensors.persistence import MySensorsJSONEncoder
+
+        changed = {}
+        for sensor_id, sensor in list(sensors.items()):
+            text = json.dumps(sensor, cls=MySensorsJSONEncoder, sort_keys=True, separators=(',', ':'))
+            if self._nodes.get(str(sensor_id)) != text:
+                changed[str(sensor_id)] = text
+
+        with self._lock:
+            current_keys = set(str(sensor_id) for sensor_id in sensors)
+            removed = [key for key in self._nodes if key not in current_keys]
+            self._append(changed, removed)
+            if self._journal_entries > max(self.compact_after, len(self._nodes)):
+                self._compact()
+
+
+    def _append(self, changed, removed):
+        if len(changed) == 0 and len(removed) == 0:
+            return
+        if not self._loaded:
+            self._load()
+        lines = []
+        for key, text in changed.items():
+            lines.append('{"id":' + json.dumps(key) + ',"node":' + text + '}\n')
+            self._nodes[key] = text
+        for key in removed:
+            lines.append('{"id":' + json.dumps(key) + '}\n')
+            self._nodes.pop(key, None)
+        if self._torn_at != None:
+            # Otherwise the new entries would be glued to the broken one, and be lost on the next start too.
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(self._torn_at)
+            self._torn_at = None
+        with open(self.journal_path, 'a') as f:
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries += len(lines)
+        self._data = None # The cached data is outdated now. It's only needed at startup anyway.
+        _LOG.debug("Persistence journal: %s node(s) changed, %s removed", len(changed), len(removed))
+
+
+    def _compact(self):
+        """ Folds the journal into a new snapshot. Any crash during this leaves a snapshot and journal that still add up. """
+        snapshot = '{' + ','.join(json.dumps(key) + ':' + text for key, text in self._nodes.items()) + '}'
+        write_atomically(self.snapshot_path, snapshot)
+        write_atomically(self.journal_path, '')
+        self._journal_entries = 0
+        self._torn_at = None
+        _LOG.debug("Persistence journal was compacted into a new snapshot")
+
+
+    def flush(self):
+        if self.sensors != None:
+            try:
+                self.sync(self.sensors)
+            except Exception as ex:
+                _LOG.error("Error while saving persistence journal: %s", ex)
+
+
+    def clear(self):
+        """ Forgets everything. """
+        with self._lock:
+            self._data = None
+            self._nodes = {}
+            self._journal_entries = 0
+            self._torn_at = None
+            self._loaded = False
+            for file_path in (self.snapshot_path, self.journal_path, self.file_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+
+    def start(self, sensors):
+        """ Starts keeping the journal up to date with the gateway's sensors dictionary. Can be called again for a new gateway. """
+        self.sensors = sensors
+        if self.running:
+            return
+        self.running = True
+        t = threading.Thread(target=self.run)
+        t.daemon = True
+        t.start()
+
+
+    def stop(self):
+        self.running = False
+        self.flush()
+
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            self.flush()
@@ -0,0 +1,269 @@
+"""Property description templates for MySensors S_TYPE / V_TYPE combinations."""
+
+from collections import namedtuple
+from types import MappingProxyType
+
+
+# A template holds everything add_child needs to turn a MySensors child value into a WebThings property.
+# description          -- read-only property description, without a title.
+# device_type          -- capability to add to the device's @type list, or None.
+# prefixed_description -- alternative description to use if the child presented a V_UNIT_PREFIX. The prefix becomes the unit.
+# temperature_unit     -- if True the unit is taken from the adapter (celsius or fahrenheit).
+PropertyTemplate = namedtuple('PropertyTemplate', ['description', 'device_type', 'prefixed_description', 'temperature_unit'])
+
+PROPERTY_TEMPLATES = {}
+_DESCRIPTIONS = {} # (template id, title, prefix, temperature unit) -> (template, description)
+_SUPPORTED_MAIN_TYPES = set()
+
+# S_TYPES that are known, but should never be turned into properties.
+IGNORED_MAIN_TYPES = frozenset([
+    17, # S_ARDUINO_NODE
+    18, # S_ARDUINO_REPEATER_NODE
+    20, # S_IR
+])
+
+
+def _freeze(description):
+    frozen = {}
+    for key, value in description.items():
+        if isinstance(value, list):
+            value = tuple(value)
+        frozen[key] = value
+    return MappingProxyType(frozen)
+
+
+def register_property_template(main_type, sub_types, description, device_type=None, prefixed_description=None, temperature_unit=False):
+    """
+    Add (or replace) the template for one or more V_TYPES of an S_TYPE.
+
+    main_type -- the S_TYPE of the child, as an integer
+    sub_types -- a V_TYPE integer, or a list of them
+    description -- the property description, without a title
+    device_type -- optional capability to add to the device
+    prefixed_description -- optional description to use when the child has a unit prefix
+    temperature_unit -- whether the unit should follow the adapter's metric setting
+    """
+    if isinstance(sub_types, int):
+        sub_types = [sub_types]
+
+    template = PropertyTemplate(
+        _freeze(description),
+        device_type,
+        _freeze(prefixed_description) if prefixed_description is not None else None,
+        temperature_unit)
+
+    for sub_type in sub_types:
+        PROPERTY_TEMPLATES[(int(main_type), int(sub_type))] = template
+    _SUPPORTED_MAIN_TYPES.add(int(main_type))
+
+
+def get_property_template(main_type, sub_type):
+    """ Returns the template for this S_TYPE and V_TYPE combination, or None if it isn't supported. """
+    return PROPERTY_TEMPLATES.get((main_type, sub_type))
+
+
+def is_supported_main_type(main_type):
+    """ Returns True if at least one V_TYPE of this S_TYPE has a template, or if the S_TYPE should be silently ignored. """
+    return main_type in _SUPPORTED_MAIN_TYPES or main_type in IGNORED_MAIN_TYPES
+
+
+def build_description(template, title, prefix='', temperature_unit='degree celsius'):
+    """
+    Returns the description for a property made from a template.
+
+    Properties with the same template, title and unit share a single dictionary, so it must never be modified.
+    MySensorsProperty.set_description_field makes a copy for a property that needs a different one.
+    """
+    key = (id(template), title, prefix, temperature_unit)
+    cached = _DESCRIPTIONS.get(key)
+    if cached is not None:
+        return cached[1]
+
+    if prefix != '' and template.prefixed_description is not None:
+        description = dict(template.prefixed_description)
+        description['unit'] = prefix
+    else:
+        description = dict(template.description)
+    if template.temperature_unit:
+        description['unit'] = temperature_unit
+    description['title'] = title
+    _DESCRIPTIONS[key] = (template, description) # Keeping the template alive means its id can't be reused by another one
+    return description
+
+
+
+#
+#  THE DEFAULT TEMPLATES
+#
+
+_BOOLEAN = {'type': 'boolean'}
+_READ_ONLY_BOOLEAN = {'type': 'boolean', 'readOnly': True}
+_READ_ONLY_STRING = {'type': 'string', 'readOnly': True}
+_ON_OFF = {'@type': 'OnOffProperty', 'type': 'boolean'}
+_OPEN = {'@type': 'OpenProperty', 'type': 'boolean', 'readOnly': True}
+_LEAK = {'@type': 'LeakProperty', 'type': 'boolean', 'readOnly': True}
+_POWER = {'@type': 'InstantaneousPowerProperty', 'type': 'number', 'unit': 'watt'}
+_BRIGHTNESS = {'@type': 'BrightnessProperty', 'minimum': 0, 'maximum': 100, 'step': 1, 'type': 'integer', 'unit': 'percent'}
+_COLOR = {'@type': 'ColorProperty', 'type': 'string', 'readOnly': False}
+_HEATING_COOLING_TEXT = {'@type': 'HeatingCoolingProperty', 'type': 'string', 'enum': ['off', 'heating', 'cooling'], 'readOnly': True} # Out of spec for MySensors, but creates compatibility with the WebThings Gateway.
+_TARGET_TEMPERATURE = {'@type': 'TargetTemperatureProperty', 'minimum': 0, 'maximum': 150, 'type': 'number', 'unit': 'degree celsius', 'multipleOf': 0.5}
+
+
+def _number(multiple_of=None, **extra):
+    description = {'type': 'number', 'readOnly': True}
+    if multiple_of is not None:
+        description['multipleOf'] = multiple_of
+    description.update(extra)
+    return description
+
+
+# S_DOOR
+register_property_template(0, 16, _OPEN, 'DoorSensor')                                  # V_TRIPPED
+register_property_template(0, 15, _BOOLEAN)                                             # V_ARMED
+
+# S_MOTION
+register_property_template(1, 16, {'@type': 'MotionProperty', 'type': 'boolean', 'readOnly': True}, 'MotionSensor') # V_TRIPPED
+register_property_template(1, 15, _ON_OFF, 'OnOffSwitch')                               # V_ARMED
+
+# S_SMOKE
+register_property_template(2, 16, {'@type': 'AlarmProperty', 'type': 'boolean', 'readOnly': True}, 'Alarm') # V_TRIPPED
+register_property_template(2, 15, _BOOLEAN)                                             # V_ARMED
+
+# S_BINARY
+register_property_template(3, 2, _ON_OFF, 'OnOffSwitch')                                # V_STATUS
+register_property_template(3, 17, _POWER, 'EnergyMonitor')                              # V_WATT (power meter)
+
+# S_DIMMER
+register_property_template(4, 2, _ON_OFF)                                               # V_STATUS
+register_property_template(4, 3, _BRIGHTNESS, 'Light')                                  # V_PERCENTAGE
+register_property_template(4, 17, dict(_POWER, readOnly=True))                          # V_WATT
+
+# S_COVER (percentage)
+register_property_template(5, 3, {'@type': 'LevelProperty', 'minimum': 0, 'maximum': 100, 'step': 1, 'type': 'integer', 'unit': 'percent', 'multipleOf': 1}, 'MultiLevelSwitch') # V_PERCENTAGE
+register_property_template(5, 30, _ON_OFF)                                              # V_DOWN
+register_property_template(5, [29, 31], _BOOLEAN)                                       # V_UP and V_STOP
+
+# S_TEMP
+register_property_template(6, 0, {'@type': 'TemperatureProperty', 'type': 'number', 'readOnly': True, 'multipleOf': 0.1}, 'TemperatureSensor', temperature_unit=True) # V_TEMP
+
+# S_HUM
+register_property_template(7, [1, 37], {'@type': 'LevelProperty', 'minimum': 0, 'maximum': 100, 'type': 'number', 'unit': 'percent', 'readOnly': True, 'multipleOf': 0.1}, 'MultiLevelSensor') # V_HUM
+
+# S_BARO
+register_property_template(8, 4, {'@type': 'LevelProperty', 'minimum': 900, 'maximum': 1100, 'type': 'number', 'unit': 'hPa', 'readOnly': True, 'multipleOf': 1}, 'MultiLevelSensor') # V_PRESSURE
+register_property_template(8, 5, _READ_ONLY_STRING)                                     # V_FORECAST (weather prediction)
+
+# S_WIND
+register_property_template(9, [8, 9], _number(0.1))                                     # V_WIND and V_GUST
+register_property_template(9, 10, _READ_ONLY_STRING)                                    # V_DIRECTION (of wind)
+
+# S_RAIN
+register_property_template(10, [6, 7], _number(0.1))                                    # V_RAIN and V_RAINRATE
+
+# S_UV
+register_property_template(11, 11, _number(0.1))                                        # V_UV
+
+# S_WEIGHT
+register_property_template(12, 12, _number(0.01))                                       # V_WEIGHT
+
+# S_POWER
+register_property_template(13, 17, dict(_POWER, readOnly=True, multipleOf=0.01), 'EnergyMonitor') # V_WATT
+register_property_template(13, 18, _number(0.001, unit='kwh'), 'EnergyMonitor')         # V_KWH
+register_property_template(13, 54, _number(0.01, unit='var'))                           # V_VAR
+register_property_template(13, 55, _number(0.01, unit='va'))                            # V_VA
+register_property_template(13, 56, _number(0.01))                                       # V_POWER_FACTOR
+
+# S_HEATER
+register_property_template(14, 0, {'@type': 'TemperatureProperty', 'type': 'number', 'unit': 'degree celsius', 'readOnly': True, 'multipleOf': 0.1}, 'Thermostat') # V_TEMP
+register_property_template(14, 45, _TARGET_TEMPERATURE, 'Thermostat')                   # V_HVAC_SETPOINT_HEAT
+register_property_template(14, 21, {'@type': 'HeatingCoolingProperty', 'type': 'string', 'enum': ['off', 'heating', 'cooling', 'auto']}, 'Thermostat') # V_HVAC_FLOW_STATE
+register_property_template(14, 2, _READ_ONLY_BOOLEAN)                                   # V_STATUS
+register_property_template(14, 47, _HEATING_COOLING_TEXT)                               # V_TEXT
+
+# S_DISTANCE
+register_property_template(15, 13, _number(0.01), prefixed_description=_number(0.01))   # V_DISTANCE
+
+# S_LIGHT_LEVEL
+register_property_template(16, 23, {'minimum': 0, 'maximum': 100, 'step': 1, 'type': 'integer', 'unit': 'percent', 'multipleOf': 1}) # V_LIGHT_LEVEL
+register_property_template(16, 37, {'type': 'integer', 'unit': 'Lux', 'readOnly': True, 'multipleOf': 1}) # V_LEVEL
+
+# S_LOCK. Support for the lock capability turned out to be too complex, so locks remain normal boolean switches.
+register_property_template(19, 36, {'@type': 'OpenProperty', 'readOnly': False, 'type': 'boolean'}, 'OnOffSwitch') # V_LOCK_STATUS
+
+# S_WATER
+register_property_template(21, 37, _number(0.01))                                       # V_LEVEL
+
+# S_AIR_QUALITY
+register_property_template(22, 37, _number(0.1), prefixed_description=_number(0.1))     # V_LEVEL
+
+# S_CUSTOM
+register_property_template(23, 48, {'@type': 'LevelProperty', 'type': 'number', 'multipleOf': 0.01}, 'MultiLevelSensor') # V_CUSTOM
+
+# S_DUST
+register_property_template(24, 37, _number(0.1), 'MultiLevelSensor', prefixed_description=dict(_number(0.1), **{'@type': 'LevelProperty'})) # V_LEVEL
+
+# S_SCENE_CONTROLLER
+register_property_template(25, [19, 20], {'@type': 'PushedProperty', 'type': 'boolean'}, 'PushButton') # V_SCENE_ON and V_SCENE_OFF
+
+# S_RGB_LIGHT, using hex codes
+register_property_template(26, 40, _COLOR, 'ColorControl')                              # V_RGB
+register_property_template(26, 17, _POWER)                                              # V_WATT (power meter)
+register_property_template(26, 2, _ON_OFF)                                              # V_STATUS
+register_property_template(26, 3, _BRIGHTNESS, 'Light')                                 # V_PERCENTAGE
+
+# S_RGBW_LIGHT, using hex codes like #FF0000FF, where the last FF is the brightness.
+register_property_template(27, 2, _ON_OFF)                                              # V_STATUS
+register_property_template(27, 3, _BRIGHTNESS, 'Light')                                 # V_PERCENTAGE
+register_property_template(27, 40, _COLOR)                                              # V_RGB
+register_property_template(27, 17, _POWER)                                              # V_WATT (power meter)
+
+# S_COLOR_SENSOR
+register_property_template(28, 40, _READ_ONLY_STRING)                                   # V_RGB
+
+# S_HVAC
+register_property_template(29, 2, _READ_ONLY_BOOLEAN)                                   # V_STATUS
+register_property_template(29, 21, {'@type': 'HeatingCoolingProperty', 'type': 'string', 'enum': ['off', 'heat', 'cool', 'auto']}, 'Thermostat') # V_HVAC_FLOW_STATE
+register_property_template(29, 22, {'type': 'string', 'enum': ['Min', 'Normal', 'Max', 'Auto']}) # V_HVAC_SPEED
+register_property_template(29, 44, {'minimum': 0, 'maximum': 50, 'type': 'number', 'unit': 'degree celsius', 'multipleOf': 0.1}) # V_HVAC_SETPOINT_COOL
+register_property_template(29, 45, _TARGET_TEMPERATURE, 'Thermostat')                   # V_HVAC_SETPOINT_HEAT
+register_property_template(29, 46, {'type': 'string', 'enum': ['Auto', 'ContinuousOn', 'PeriodicOn']}) # V_HVAC_FLOW_MODE
+register_property_template(29, 47, _HEATING_COOLING_TEXT)                               # V_TEXT
+
+# S_MULTIMETER
+register_property_template(30, 14, _number(0.01, unit='impedance'))                     # V_IMPEDANCE
+register_property_template(30, 38, _number(0.01, unit='volt', **{'@type': 'VoltageProperty'})) # V_VOLTAGE
+register_property_template(30, 39, _number(0.01, unit='ampere', **{'@type': 'CurrentProperty'})) # V_AMPERAGE
+
+# S_SPRINKLER
+register_property_template(31, 2, _BOOLEAN)                                             # V_STATUS
+register_property_template(31, 16, {'@type': 'AlarmProperty', 'type': 'number', 'readOnly': True}, 'Alarm') # V_TRIPPED
+
+# S_WATER_LEAK
+register_property_template(32, 15, _BOOLEAN)                                            # V_ARMED
+register_property_template(32, 16, _LEAK, 'LeakSensor')                                 # V_TRIPPED
+
+# S_SOUND and S_VIBRATION
+for _main_type in (33, 34):
+    register_property_template(_main_type, 37, _number(0.1))                            # V_LEVEL
+    register_property_template(_main_type, 16, _OPEN, 'DoorSensor')                     # V_TRIPPED
+    register_property_template(_main_type, 15, _BOOLEAN)                                # V_ARMED
+
+# S_MOISTURE
+register_property_template(35, 37, {'type': 'integer', 'readOnly': True, 'multipleOf': 0.1}) # V_LEVEL
+register_property_template(35, 15, _ON_OFF)                                             # V_ARMED
+register_property_template(35, 16, _LEAK, 'LeakSensor')                                 # V_TRIPPED
+
+# S_INFO
+register_property_template(36, 47, {'type': 'string'})                                  # V_TEXT
+
+# S_GPS
+register_property_template(37, 49, {'type': 'string'})                                  # V_POSITION
+
+# S_GAS
+register_property_template(38, [34, 35], _number(0.01))                                 # V_FLOW and V_VOLUME
+
+# S_WATER_QUALITY
+register_property_template(39, 2, _BOOLEAN)                                             # V_STATUS
+register_property_template(39, 0, {'@type': 'TemperatureProperty', 'type': 'number', 'unit': 'degree celsius', 'readOnly': True, 'multipleOf': 0.1}, 'TemperatureSensor') # V_TEMP
+register_property_template(39, [51, 52, 53], {'type': 'number', 'readOnly': True})      # V_PH, V_ORP, V_EC
+
@@ -0,0 +1,122 @@
+"""Asks the nodes in the MySensors network to present themselves again."""
+
+import collections
+import threading
+import time
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+class Rediscovery(object):
+    """
+    Requests presentation from nodes, a few at a time.
+
+    Instead of waiting a fixed time after each request, the next request is sent as soon as a node has answered and
+    its burst of presentation messages has died down. Nodes that don't answer are retried later, with a growing delay.
+    """
+
+    def __init__(self, send, window=2, response_timeout=3.0, settle_seconds=0.5, max_attempts=3):
+        """
+        Initialize the object.
+
+        send -- function that sends an encoded MySensors message to the network
+        window -- how many nodes may be busy answering at the same time
+        response_timeout -- seconds to wait for the first answer to a request
+        settle_seconds -- a node is done presenting once it has been quiet for this many seconds
+        max_attempts -- how often a silent node is asked before giving up
+        """
+        self.send = send
+        self.window = window
+        self.response_timeout = response_timeout
+        self.settle_seconds = settle_seconds
+        self.max_attempts = max_attempts
+        self.running = False
+
+        self._condition = threading.Condition()
+        self._outstanding = {} # node_id -> [time of request, time of latest answer or None, attempt]
+        self._responders = set()
+
+
+    def node_responded(self, node_id):
+        """ Called for every incoming message while a rediscovery is running. """
+        if not self.running:
+            return
+        with self._condition:
+            request = self._outstanding.get(node_id)
+            if request != None:
+                request[1] = time.time()
+                if node_id not in self._responders:
+                    self._responders.add(node_id)
+                    self._condition.notify()
+
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+
+
+    def run(self, node_ids, skipped=()):
+        """
+        Requests presentation from all the given nodes, and returns a report once they have all answered or given up.
+
+        node_ids -- the nodes to ask
+        skipped -- nodes that were left out (because they presented themselves recently), mentioned in the report
+        """
+        started = time.time()
+        self.running = True
+        self._responders = set()
+        self._outstanding = {}
+
+        waiting = collections.deque((node_id, 1) for node_id in node_ids)
+        retries = [] # [time after which to retry, node_id, attempt]
+        silent = []
+        requests_sent = 0
+
+        with self._condition:
+            while self.running and (waiting or retries or self._outstanding):
+                now = time.time()
+
+                # Free up the slots of nodes that have finished, or that didn't answer in time.
+                for node_id, (requested, answered, attempt) in list(self._outstanding.items()):
+                    if answered != None:
+                        if now - answered > self.settle_seconds:
+                            del self._outstanding[node_id]
+                    elif now - requested > self.response_timeout:
+                        del self._outstanding[node_id]
+                        if attempt < self.max_attempts:
+                            retries.append([now + self.response_timeout * (2 ** (attempt - 1)), node_id, attempt + 1])
+                        else:
+                            silent.append(node_id)
+
+                for retry in list(retries):
+                    if retry[0] <= now:
+                        retries.remove(retry)
+                        waiting.append((retry[1], retry[2]))
+
+                # Fill the window.
+                while waiting and len(self._outstanding) < self.window:
+                    node_id, attempt = waiting.popleft()
+                    _LOG.debug("<< Requesting presentation from %s (attempt %s)", node_id, attempt)
+                    self._outstanding[node_id] = [time.time(), None, attempt]
+                    try:
+                        self.send(str(node_id) + ';255;3;0;19;\n')
+                        requests_sent += 1
+                    except Exception as ex:
+                        _LOG.error("error while requesting presentation: %s", ex)
+
+                if waiting or retries or self._outstanding:
+                    self._condition.wait(0.1)
+
+        self.running = False
+        return {
+            'started': started,
+            'duration': round(time.time() - started, 2),
+            'requests_sent': requests_sent,
+            'responders': sorted(self._responders),
+            'silent': sorted(silent),
+            'skipped': sorted(skipped),
+        }
@@ -0,0 +1,124 @@
+"""Finds the MySensors gateway among the connected USB serial devices."""
+
+import json
+import os
+import threading
+import time
+
+import serial
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+VERSION_REQUEST = '0;255;3;0;2;\n' # I_VERSION, asks the gateway which MySensors version it runs.
+VERSION_ANSWER = '0;255;3;0;2;' # followed by the version, like 2.3.2
+
+
+def is_gateway_line(line):
+    """ Returns True if a line of serial data could only have come from a MySensors gateway. """
+    if "Gateway startup complete" in line:
+        return True
+    # Answer to our I_VERSION request. It must include the version, as a device that echoes its input sends the request itself back.
+    return line.startswith(VERSION_ANSWER) and line[len(VERSION_ANSWER):].strip() != ''
+
+
+def probe_ports(port_ids, baud, timeout=30):
+    """
+    Opens all the serial ports at the same time, and returns the first one that answers like a MySensors gateway.
+
+    port_ids -- the serial ports to try, like /dev/ttyUSB0
+    baud -- serial communication speed
+    timeout -- seconds to wait for an answer at most
+    """
+    found = []
+    done = threading.Event()
+
+    def probe(port_id):
+        try:
+            connection = serial.Serial(str(port_id), baud, timeout=0.2)
+        except Exception as ex:
+            _LOG.warning("Could not open serial port %s: %s", port_id, ex)
+            return
+        try:
+            next_request = time.time() + 2 # Opening the port usually resets the Arduino, so give it a moment to boot.
+            end = time.time() + timeout
+            while not done.is_set() and time.time() < end:
+                if time.time() > next_request:
+                    connection.write(VERSION_REQUEST.encode('ascii'))
+                    next_request = time.time() + 2
+                line = connection.readline()
+                if not line:
+                    continue
+                decoded_line = line.decode('utf-8', errors='replace')
+                _LOG.debug("Serial data received from %s: %s", port_id, str(decoded_line).rstrip())
+                if is_gateway_line(decoded_line):
+                    found.append(str(port_id))
+                    done.set()
+        except Exception as ex:
+            _LOG.error("Error while probing serial port %s: %s", port_id, ex)
+        finally:
+            connection.close()
+
+    threads = []
+    for port_id in port_ids:
+        t = threading.Thread(target=probe, args=(port_id,))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    done.wait(timeout)
+    done.set()
+    for t in threads:
+        t.join(1) # Give the ports a moment to be closed before PyMySensors opens the winner again.
+
+    if len(found) > 0:
+        return found[0]
+    return ''
+
+
+
+class PortCache(object):
+    """ Remembers which USB device was the MySensors gateway, by its vendor ID, product ID and serial number. """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+
+    def load(self):
+        try:
+            with open(self.file_path) as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+
+    def find(self, port_info):
+        """ Returns the port of the remembered device, if it is still connected.
+
+        port_info -- dictionary of port_id -> (vid, pid, serial_number)
+        """
+        cached = self.load()
+        if cached == None or cached.get('vid') == None:
+            return None
+        identity = [cached.get('vid'), cached.get('pid'), cached.get('serial_number')]
+        for port_id, port_identity in port_info.items():
+            if list(port_identity) == identity:
+                return port_id
+        return None
+
+
+    def save(self, port_id, port_identity):
+        vid, pid, serial_number = port_identity
+        if vid == None:
+            return # Not a USB device, so there is nothing to recognise it by.
+        try:
+            directory = os.path.dirname(self.file_path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(self.file_path, 'w') as f:
+                json.dump({'port': port_id, 'vid': vid, 'pid': pid, 'serial_number': serial_number}, f)
+        except Exception as ex:
+            _LOG.warning("Could not remember the serial port of the gateway: %s", ex)
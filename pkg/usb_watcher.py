@@ -0,0 +1,103 @@
+"""Notices when USB serial devices are plugged in or removed."""
+
+import threading
+import time
+
+import serial.tools.list_ports as prtlst
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+from .logger import get_logger
+
+
+_LOG = get_logger('adapter')
+
+
+class UsbWatcher(object):
+    """
+    Calls a function when a serial device appears or disappears.
+
+    If pyudev is available the kernel tells us about changes right away. Otherwise the list of serial ports is
+    checked every few seconds.
+    """
+
+    def __init__(self, on_change, poll_interval=5):
+        """
+        Initialize the object.
+
+        on_change -- function that is called with 'add' or 'remove', and the port, like /dev/ttyUSB0
+        poll_interval -- seconds between checks, if pyudev is not available
+        """
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.running = False
+        self.observer = None
+
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+
+        if pyudev != None:
+            try:
+                context = pyudev.Context()
+                monitor = pyudev.Monitor.from_netlink(context)
+                monitor.filter_by(subsystem='tty')
+                self.observer = pyudev.MonitorObserver(monitor, callback=self.udev_event, name='mysensors-usb-watcher')
+                self.observer.daemon = True
+                self.observer.start()
+                _LOG.debug("Watching for USB serial devices using udev")
+                return
+            except Exception as ex:
+                _LOG.warning("Could not watch udev events, will check for USB devices every few seconds instead: %s", ex)
+
+        t = threading.Thread(target=self.poll)
+        t.daemon = True
+        t.start()
+
+
+    def stop(self):
+        self.running = False
+        if self.observer != None:
+            try:
+                self.observer.stop()
+            except Exception as ex:
+                _LOG.error("Error stopping udev observer: %s", ex)
+
+
+    def udev_event(self, device):
+        if device.device_node == None or device.action not in ('add', 'remove'):
+            return
+        self.notify(device.action, str(device.device_node))
+
+
+    def poll(self):
+        known_ports = self.list_ports()
+        while self.running:
+            time.sleep(self.poll_interval)
+            current_ports = self.list_ports()
+            for port_id in current_ports - known_ports:
+                self.notify('add', port_id)
+            for port_id in known_ports - current_ports:
+                self.notify('remove', port_id)
+            known_ports = current_ports
+
+
+    def list_ports(self):
+        try:
+            return set(str(port[0]) for port in prtlst.comports())
+        except Exception as ex:
+            _LOG.error("Error getting serial ports list: %s", ex)
+            return set()
+
+
+    def notify(self, action, port_id):
+        _LOG.debug("USB serial device event: %s %s", action, port_id)
+        try:
+            self.on_change(action, port_id)
+        except Exception as ex:
+            _LOG.error("Error while handling USB serial device change: %s", ex)
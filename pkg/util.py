@@ -8,29 +8,35 @@ def pretty(d, indent=0):
         else:
             print('\t' * (indent+1) + str(value))
             
-def is_a_number(s):
-    """ Returns True is string is a number. """
-    try:
-        float(s)
-        return True
-    except ValueError:
-        return False
-    
 def make_safe_name(s):
     keepcharacters = (' ','.','_')
     return "".join(c for c in s if c.isalpha() or c.isalnum() or c in keepcharacters).rstrip()
 
     
-def get_int_or_float(v):
-    number_as_float = float(v)
-    number_as_int = int(number_as_float)
-    if number_as_float == number_as_int:
-        return number_as_int
-    else:
-        
-        #tamed_float = float( int(number_as_float * 100) / 100)
-        
-        return float( int( number_as_float * 100) / 100) 
-        #return  float('%.2f' % number_as_float).rstrip('0').rstrip('.')
-        #return  round(number_as_float,2)
+def parse_type_settings(s):
+    """ Turns a setting like '13=5, 30=2%' into a dictionary with S_TYPE integers as keys: {13:'5', 30:'2%'} """
+    settings = {}
+    for item in str(s).split(','):
+        if '=' not in item:
+            continue
+        main_type, setting = item.split('=', 1)
+        settings[int(main_type.strip())] = setting.strip()
+    return settings
+
+
+def parse_deadband(s):
+    """ Turns a deadband setting like '0.5' or '2%' into a tuple of (amount, is_percentage) """
+    s = str(s).strip()
+    if s.endswith('%'):
+        return (abs(float(s[:-1])), True)
+    return (abs(float(s)), False)
+
 
+def parse_host_and_port(s, default_port):
+    """ Turns a setting like '192.168.1.5' or '192.168.1.5:5003' into a tuple of (host, port) """
+    s = str(s).strip()
+    if s.count(':') == 1:
+        host, port = s.split(':')
+        if port.strip().isdigit():
+            return (host.strip(), int(port))
+    return (s, default_port)
@@ -0,0 +1,135 @@
+"""
+The outgoing command queue: acknowledgements, retransmits and the in-flight limit per node.
+
+    python3 -m unittest discover tests
+"""
+
+import unittest
+
+from pkg.command_queue import CommandQueue
+
+
+class FakeTimer(object):
+
+    def __init__(self, delay, callback, args):
+        self.delay = delay
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+    def cancel(self):
+        self.cancelled = True
+
+
+
+class FakeLoop(object):
+    """ Only remembers the timers, so that a test can decide when they go off. """
+
+    def __init__(self):
+        self.timers = []
+
+
+    def call_later(self, delay, callback, *args):
+        timer = FakeTimer(delay, callback, args)
+        self.timers.append(timer)
+        return timer
+
+
+    def fire(self):
+        """ Runs the timers that are still set, as if their time had come. """
+        timers = [timer for timer in self.timers if not timer.cancelled]
+        self.timers = []
+        for timer in timers:
+            timer.callback(*timer.args)
+        return [timer.delay for timer in timers]
+
+
+
+class CommandQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.loop = FakeLoop()
+        self.queue = CommandQueue(self.send, self.loop, max_attempts=3, ack_timeout=1.0, max_inflight_per_node=2)
+
+
+    def send(self, node_id, child_id, sub_type, value, ack):
+        self.sent.append((node_id, child_id, sub_type, value, ack))
+
+
+    def test_acknowledged_command_is_done(self):
+        self.queue.submit(5, 1, 2, 1)
+        self.assertEqual(self.sent, [(5, 1, 2, 1, True)])
+        self.queue.acknowledged('5', '1', '2', '1')
+
+        self.assertEqual(len(self.queue.pending), 0)
+        self.assertEqual(self.loop.fire(), [])
+        self.assertEqual(self.queue.stats()['delivered'], 1)
+
+
+    def test_retransmits_with_growing_timeout_then_gives_up(self):
+        self.queue.submit(5, 1, 2, 1)
+        self.assertEqual(self.loop.fire(), [1.0])
+        self.assertEqual(self.loop.fire(), [2.0])
+        self.assertEqual(self.loop.fire(), [4.0])
+
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual(len(self.queue.pending), 0)
+        self.assertEqual(self.queue.stats()['retransmits'], 2)
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+
+    def test_echo_of_an_older_value_does_not_count(self):
+        self.queue.submit(5, 1, 2, 1)
+        self.queue.submit(5, 1, 2, 0)
+        self.queue.acknowledged(5, 1, 2, '1')
+        self.assertIn((5, 1, 2), self.queue.pending)
+
+        self.queue.acknowledged(5, 1, 2, '0')
+        self.assertEqual(len(self.queue.pending), 0)
+        self.assertEqual(self.queue.stats()['superseded'], 1)
+        self.assertEqual([command[3] for command in self.sent], [1, 0])
+
+
+    def test_in_flight_limit_per_node(self):
+        for child_id in (1, 2, 3):
+            self.queue.submit(5, child_id, 2, 1)
+        self.queue.submit(6, 1, 2, 1)
+        self.assertEqual([command[:2] for command in self.sent], [(5, 1), (5, 2), (6, 1)])
+
+        self.queue.acknowledged(5, 1, 2, '1')
+        self.assertEqual(self.sent[-1][:2], (5, 3))
+
+
+    def test_superseded_waiting_command_is_sent_once(self):
+        queue = CommandQueue(self.send, self.loop, max_attempts=3, max_inflight_per_node=1)
+        queue.submit(5, 1, 2, 1)
+        queue.submit(5, 2, 2, 1)
+        queue.submit(5, 2, 2, 0)
+        queue.acknowledged(5, 1, 2, '1')
+
+        self.assertEqual([command[1:4] for command in self.sent], [(1, 2, 1), (2, 2, 0)])
+
+
+    def test_single_attempt_asks_for_no_acknowledgement(self):
+        queue = CommandQueue(self.send, self.loop, max_attempts=1)
+        queue.submit(5, 1, 2, 1)
+
+        self.assertEqual(self.sent, [(5, 1, 2, 1, False)])
+        self.assertEqual(len(queue.pending), 0)
+        self.assertEqual(self.loop.timers, [])
+
+
+    def test_forget_node(self):
+        self.queue.submit(5, 1, 2, 1)
+        self.queue.submit(6, 1, 2, 1)
+        self.queue.forget_node('5')
+
+        self.assertEqual(list(self.queue.pending), [(6, 1, 2)])
+        self.assertEqual(self.loop.fire(), [1.0])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
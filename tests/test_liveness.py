@@ -0,0 +1,93 @@
+"""
+The liveness tracker, which calls a function once a node has been silent for longer than the timeout.
+
+    python3 -m unittest discover tests
+"""
+
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from pkg.liveness import LivenessTracker
+from pkg.node_registry import NodeRegistry
+
+
+class LivenessTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timed_out = []
+        self.registry = NodeRegistry()
+        self.tracker = LivenessTracker(10, self.timed_out.append, self.registry)
+
+
+    def expire(self, now):
+        """ Runs the deadline check as if it were the given moment. """
+        with mock.patch('pkg.liveness.time.time', return_value=now):
+            return self.tracker._expire()
+
+
+    def test_silent_node_times_out_once(self):
+        self.tracker.seen(5, 100)
+        self.assertEqual(self.expire(109), [])
+        self.assertEqual(self.expire(110), [5])
+        self.assertEqual(self.expire(200), [])
+
+
+    def test_node_seen_again_gets_a_new_deadline(self):
+        self.tracker.seen(5, 100)
+        self.tracker.seen(5, 105)
+        self.assertEqual(len(self.tracker._heap), 1)
+        self.assertEqual(self.expire(110), [])
+        self.assertEqual(self.tracker.deadline(5), 115)
+        self.assertEqual(self.expire(115), [5])
+
+
+    def test_nodes_time_out_in_order_of_deadline(self):
+        self.tracker.seen(7, 103)
+        self.tracker.seen(5, 100)
+        self.tracker.seen(6, 101)
+        self.assertEqual(self.expire(111), [5, 6])
+        self.assertEqual(self.expire(113), [7])
+
+
+    def test_forgotten_node_does_not_time_out(self):
+        self.tracker.seen(5, 100)
+        self.tracker.forget(5)
+        self.assertEqual(self.expire(200), [])
+        self.assertEqual(self.tracker.deadline(5), None)
+
+
+    def test_uses_the_registry(self):
+        self.tracker.seen('5', 100)
+        self.assertEqual(self.registry.last_seen[5], 100)
+        self.assertEqual(self.registry.tracked[5], 1)
+        self.tracker.seen(255, 100) # Not a valid node ID
+        self.assertEqual(len(self.tracker._heap), 1)
+
+
+    def test_thread_calls_function(self):
+        done = threading.Event()
+        tracker = LivenessTracker(0.05, lambda node_id: done.set())
+        tracker.start()
+        tracker.seen(5)
+        self.assertTrue(done.wait(2))
+        tracker.stop()
+
+
+    def test_event_loop_calls_function(self):
+        loop = asyncio.new_event_loop()
+        timed_out = []
+        tracker = LivenessTracker(0.05, lambda node_id: (timed_out.append(node_id), loop.stop()))
+        tracker.start(loop)
+        tracker.seen(5)
+        loop.call_later(2, loop.stop)
+        loop.run_forever()
+        tracker.stop()
+        loop.close()
+        self.assertEqual(timed_out, [5])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+The bounded queue between PyMySensors and the gateway, and what it does once it's full.
+
+    python3 -m unittest discover tests
+"""
+
+import threading
+import time
+import types
+import unittest
+
+from pkg.message_queue import MessageQueue
+
+
+def message(node_id, child_id, sub_type, payload, type=1):
+    return types.SimpleNamespace(node_id=node_id, child_id=child_id, type=type, sub_type=sub_type, payload=payload)
+
+
+class MessageQueueTest(unittest.TestCase):
+
+    def drain(self, queue):
+        payloads = []
+        while queue.depth() > 0:
+            payloads.append(queue.get(timeout=0).payload)
+        return payloads
+
+
+    def test_every_value_arrives_while_there_is_room(self):
+        queue = MessageQueue(None, maxsize=10, policy='coalesce')
+        for payload in ('1', '0', '1'):
+            queue.put(message(5, 1, 16, payload))
+
+        self.assertEqual(self.drain(queue), ['1', '0', '1'])
+        self.assertEqual(queue.coalesced_count, 0)
+
+
+    def test_coalesce_replaces_waiting_value_when_full(self):
+        queue = MessageQueue(None, maxsize=2, policy='coalesce')
+        queue.put(message(5, 1, 0, '20.0'))
+        queue.put(message(6, 1, 0, '30.0'))
+        queue.put(message(5, 1, 0, '21.0'))
+
+        self.assertEqual(self.drain(queue), ['21.0', '30.0'])
+        self.assertEqual(queue.coalesced_count, 1)
+        self.assertEqual(queue.dropped_count, 0)
+
+
+    def test_coalesce_drops_oldest_when_full_and_nothing_to_merge(self):
+        queue = MessageQueue(None, maxsize=2, policy='coalesce')
+        queue.put(message(5, 1, 0, '20.0'))
+        queue.put(message(6, 1, 0, '30.0'))
+        queue.put(message(7, 1, 0, '40.0'))
+
+        self.assertEqual(self.drain(queue), ['30.0', '40.0'])
+        self.assertEqual(queue.dropped_count, 1)
+
+
+    def test_presentations_are_never_merged(self):
+        queue = MessageQueue(None, maxsize=1, policy='coalesce')
+        queue.put(message(5, 1, 6, 'Temperature', type=0))
+        queue.put(message(5, 1, 6, 'Temperature', type=0))
+
+        self.assertEqual(queue.coalesced_count, 0)
+        self.assertEqual(queue.dropped_count, 1)
+
+
+    def test_merged_value_is_forgotten_once_handled(self):
+        queue = MessageQueue(None, maxsize=1, policy='coalesce')
+        queue.put(message(5, 1, 0, '20.0'))
+        self.assertEqual(queue.get(timeout=0).payload, '20.0')
+        queue.put(message(6, 1, 0, '30.0'))
+        queue.put(message(5, 1, 0, '21.0'))
+
+        self.assertEqual(self.drain(queue), ['21.0'])
+        self.assertEqual(queue.coalesced_count, 0)
+
+
+    def test_drop_oldest(self):
+        queue = MessageQueue(None, maxsize=2, policy='drop oldest')
+        for payload in ('1', '2', '3'):
+            queue.put(message(5, 1, 0, payload))
+
+        self.assertEqual(self.drain(queue), ['2', '3'])
+        self.assertEqual(queue.dropped_count, 1)
+
+
+    def test_block_gives_up_after_timeout(self):
+        queue = MessageQueue(None, maxsize=1, policy='block', block_seconds=0.1)
+        queue.running = True
+        queue.put(message(5, 1, 0, '1'))
+        started = time.time()
+        queue.put(message(5, 1, 0, '2'))
+
+        self.assertGreaterEqual(time.time() - started, 0.09)
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(self.drain(queue), ['2'])
+        self.assertEqual(queue.dropped_count, 1)
+
+
+    def test_block_continues_once_there_is_room(self):
+        queue = MessageQueue(None, maxsize=1, policy='block', block_seconds=5)
+        queue.running = True
+        queue.put(message(5, 1, 0, '1'))
+        taken = []
+        reader = threading.Timer(0.05, lambda: taken.append(queue.get(timeout=0).payload))
+        reader.start()
+        queue.put(message(5, 1, 0, '2'))
+        reader.join()
+
+        self.assertEqual(taken, ['1'])
+        self.assertEqual(self.drain(queue), ['2'])
+        self.assertEqual(queue.dropped_count, 0)
+
+
+    def test_worker_hands_messages_to_handler(self):
+        handled = []
+        done = threading.Event()
+
+        def handler(message):
+            handled.append(message.payload)
+            if len(handled) == 3:
+                done.set()
+
+        queue = MessageQueue(handler, maxsize=10)
+        queue.start()
+        for payload in ('1', '2', '3'):
+            queue.put(message(5, 1, 0, payload))
+        self.assertTrue(done.wait(2))
+        queue.stop()
+
+        self.assertEqual(handled, ['1', '2', '3'])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
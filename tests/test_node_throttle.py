@@ -0,0 +1,126 @@
+"""
+The per-node token bucket that keeps a chatty node from flooding the adapter.
+
+    python3 -m unittest discover tests
+"""
+
+import types
+import unittest
+from unittest import mock
+
+from pkg.node_throttle import NodeThrottle
+
+
+def message(node_id, child_id, sub_type, payload, type=1):
+    return types.SimpleNamespace(node_id=node_id, child_id=child_id, type=type, sub_type=sub_type, payload=payload)
+
+
+class NodeThrottleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.delivered = []
+        self.throttled = []
+        # 60 per minute is one token per second
+        self.throttle = NodeThrottle(self.delivered.append, self.throttled.append, messages_per_minute=60, burst=3)
+
+
+    def tearDown(self):
+        self.throttle.stop()
+
+
+    def release(self, now):
+        """ Runs the timer's work as if it were the given moment. """
+        with mock.patch('pkg.node_throttle.time.time', return_value=now):
+            self.throttle.release()
+        return [held.payload for held in self.delivered]
+
+
+    def test_burst_then_throttled(self):
+        results = [self.throttle.check(message(5, 1, 0, str(i)), now=100) for i in range(5)]
+
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(self.throttled, [5])
+        self.assertEqual(self.throttle.throttled_nodes(), [5])
+
+
+    def test_other_nodes_are_not_affected(self):
+        for i in range(5):
+            self.throttle.check(message(5, 1, 0, str(i)), now=100)
+        self.assertTrue(self.throttle.check(message(6, 1, 0, '1'), now=100))
+
+
+    def test_tokens_come_back_over_time(self):
+        for i in range(3):
+            self.throttle.check(message(5, 1, 0, str(i)), now=100)
+        self.assertFalse(self.throttle.check(message(5, 1, 0, '3'), now=100.5))
+        self.assertTrue(self.throttle.check(message(5, 2, 0, '4'), now=101.5))
+
+
+    def test_node_is_no_longer_throttled_once_bucket_is_full(self):
+        for i in range(4):
+            self.throttle.check(message(5, 1, 0, str(i)), now=100)
+        self.assertTrue(self.throttle.check(message(5, 2, 0, 'x'), now=102))
+        self.assertEqual(self.throttle.throttled_nodes(), [5])
+        self.assertTrue(self.throttle.check(message(5, 2, 0, 'y'), now=110))
+        self.assertEqual(self.throttle.throttled_nodes(), [])
+        self.assertEqual(self.throttle.counted_nodes(), [5])
+
+
+    def test_held_values_are_coalesced_and_released_oldest_first(self):
+        for i in range(3):
+            self.throttle.check(message(5, 9, 0, str(i)), now=100)
+        self.throttle.check(message(5, 1, 0, 'a1'), now=100)
+        self.throttle.check(message(5, 2, 0, 'b1'), now=100)
+        self.throttle.check(message(5, 1, 0, 'a2'), now=100)
+        self.assertEqual(self.throttle.stats()['held'], 2)
+        self.assertEqual(self.throttle.stats()['coalesced'], 1)
+
+        self.assertEqual(self.release(100.5), [])
+        self.assertEqual(self.release(101), ['a2'])
+        self.assertEqual(self.release(102), ['a2', 'b1'])
+        self.assertEqual(self.throttle.stats()['held'], 0)
+
+
+    def test_newer_value_replaces_held_one(self):
+        for i in range(3):
+            self.throttle.check(message(5, 9, 0, str(i)), now=100)
+        self.throttle.check(message(5, 1, 0, 'old'), now=100)
+
+        self.assertTrue(self.throttle.check(message(5, 1, 0, 'new'), now=101))
+        self.assertEqual(self.release(110), [])
+        self.assertEqual(self.throttle.stats()['held'], 0)
+
+
+    def test_presentations_are_always_passed_on(self):
+        for i in range(3):
+            self.throttle.check(message(5, 1, 0, str(i)), now=100)
+        self.assertTrue(self.throttle.check(message(5, 1, 6, 'Temperature', type=0), now=100))
+
+
+    def test_drop(self):
+        self.throttle.configure(60, 3, 'drop')
+        for i in range(5):
+            self.throttle.check(message(5, 1, 0, str(i)), now=100)
+
+        self.assertEqual(self.throttle.stats()['dropped'], 2)
+        self.assertEqual(self.throttle.stats()['held'], 0)
+
+
+    def test_off(self):
+        self.throttle.configure(0, 3, 'coalesce')
+        self.assertTrue(all(self.throttle.check(message(5, 1, 0, str(i)), now=100) for i in range(100)))
+
+
+    def test_forget(self):
+        for i in range(5):
+            self.throttle.check(message(5, 1, 0, str(i)), now=100)
+        self.throttle.forget('5')
+
+        self.assertEqual(self.throttle.throttled_nodes(), [])
+        self.assertEqual(self.throttle.stats()['held'], 0)
+        self.assertTrue(self.throttle.check(message(5, 1, 0, 'x'), now=100))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
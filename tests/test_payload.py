@@ -0,0 +1,95 @@
+"""
+Turning MySensors payloads into property values and back.
+
+    python3 -m unittest discover tests
+"""
+
+import unittest
+
+from pkg.payload import parse_number, decimals_for, decode_boolean, decode_integer, decode_any, get_decoder, encode_value
+
+
+class ParseNumberTest(unittest.TestCase):
+
+    def test_numbers(self):
+        self.assertEqual(parse_number('12'), 12)
+        self.assertIsInstance(parse_number('12'), int)
+        self.assertEqual(parse_number('-3'), -3)
+        self.assertEqual(parse_number('21.5'), 21.5)
+        self.assertEqual(parse_number('.5'), 0.5)
+        self.assertEqual(parse_number('+1e3'), 1000)
+        self.assertEqual(parse_number(7), 7)
+        self.assertEqual(parse_number(True), 1)
+
+
+    def test_not_numbers(self):
+        for payload in ('', 'abc', 'on', '-', '.', '12abc', ' 12', 'nan', 'inf', '-inf', None):
+            self.assertIsNone(parse_number(payload), payload)
+
+
+    def test_digits_that_are_not_ascii(self):
+        self.assertIsNone(parse_number('1²'))
+        self.assertIsNone(parse_number('²'))
+        self.assertEqual(parse_number('1١'), 11) # float() reads other scripts' digits
+
+
+
+class DecoderTest(unittest.TestCase):
+
+    def test_decimals_for(self):
+        self.assertEqual(decimals_for(None), 2)
+        self.assertEqual(decimals_for(1), 0)
+        self.assertEqual(decimals_for(0.1), 1)
+        self.assertEqual(decimals_for(0.001), 3)
+        self.assertEqual(decimals_for(1e-12), 10)
+
+
+    def test_boolean(self):
+        self.assertIs(decode_boolean('1'), True)
+        self.assertIs(decode_boolean('0'), False)
+        self.assertIs(decode_boolean('2'), True)
+        self.assertIs(decode_boolean('0.0'), False)
+        self.assertIs(decode_boolean(' ON '), True)
+        self.assertEqual(decode_boolean('maybe'), 'maybe')
+
+
+    def test_integer(self):
+        self.assertEqual(decode_integer('42'), 42)
+        self.assertEqual(decode_integer('41.6'), 42)
+        self.assertEqual(decode_integer('1²'), '1²')
+        self.assertEqual(decode_integer(''), '')
+
+
+    def test_any(self):
+        self.assertEqual(decode_any('21.456'), 21.46)
+        self.assertEqual(decode_any('21.0'), 21)
+        self.assertIsInstance(decode_any('21.0'), int)
+        self.assertEqual(decode_any('hello'), 'hello')
+
+
+    def test_get_decoder(self):
+        self.assertEqual(get_decoder({'type': 'number'}, 40)('000000'), '000000') # V_RGB is always text
+        self.assertEqual(get_decoder({'type': 'number', 'multipleOf': 0.1}, 0)('21.46'), 21.5)
+        self.assertEqual(get_decoder({'type': 'number', 'multipleOf': 1e-12}, 0)('0.12345678901234'), 0.1234567890)
+        self.assertIs(get_decoder({'type': 'boolean'}, 2)('1'), True)
+        self.assertEqual(get_decoder({'type': 'integer'}, 3)('50'), 50)
+        self.assertEqual(get_decoder({}, 47)('12'), '12')
+
+
+
+class EncodeValueTest(unittest.TestCase):
+
+    def test_encode(self):
+        self.assertEqual(encode_value(True, 2), 1)
+        self.assertEqual(encode_value(False, 2), 0)
+        self.assertEqual(encode_value(21.456, 0), 21.46)
+        self.assertEqual(encode_value(21.456, 0, decimals=0), 21)
+        self.assertEqual(encode_value('50', 3), 50)
+        self.assertEqual(encode_value('#ff0000', 40), '#ff0000')
+        self.assertEqual(encode_value('hello', 47), 'hello')
+        self.assertEqual(encode_value('locked', 36), 'locked')
+
+
+
+if __name__ == '__main__':
+    unittest.main()
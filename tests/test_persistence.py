@@ -0,0 +1,159 @@
+"""
+The persistence journal, and how it recovers from a power cut halfway through writing an entry.
+
+    python3 -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from pkg.persistence import JournalPersistence, PersistenceFile
+
+
+class JournalPersistenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'persistence.json')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def reopen(self):
+        """ Returns a new journal for the same files, like after a restart. """
+        return JournalPersistence(self.file_path)
+
+
+    def test_replays_updates_and_deletes(self):
+        journal = self.reopen()
+        journal.update(5, {'sensor_id': 5})
+        journal.update(6, {'sensor_id': 6})
+        journal.update(5, {'sensor_id': 5, 'battery_level': 80})
+        journal.delete(6)
+
+        self.assertEqual(self.reopen().load(), {'5': {'sensor_id': 5, 'battery_level': 80}})
+
+
+    def test_starts_from_old_json_file(self):
+        with open(self.file_path, 'w') as f:
+            json.dump({'3': {'sensor_id': 3}}, f)
+        journal = self.reopen()
+        journal.update(4, {'sensor_id': 4})
+
+        self.assertEqual(self.reopen().load(), {'3': {'sensor_id': 3}, '4': {'sensor_id': 4}})
+
+
+    def test_torn_line_is_cut_off_before_appending(self):
+        journal = self.reopen()
+        journal.update(5, {'sensor_id': 5})
+        with open(journal.journal_path, 'a') as f:
+            f.write('{"id":"6","node":{"sens') # The power was cut here
+
+        journal = self.reopen()
+        self.assertEqual(journal.load(), {'5': {'sensor_id': 5}})
+        journal.update(7, {'sensor_id': 7})
+
+        self.assertEqual(self.reopen().load(), {'5': {'sensor_id': 5}, '7': {'sensor_id': 7}})
+
+
+    def test_complete_entry_without_newline_is_cut_off(self):
+        journal = self.reopen()
+        journal.update(5, {'sensor_id': 5})
+        with open(journal.journal_path, 'a') as f:
+            f.write('{"id":"6","node":{"sensor_id":6}}')
+
+        journal = self.reopen()
+        self.assertEqual(journal.load(), {'5': {'sensor_id': 5}})
+        journal.update(7, {'sensor_id': 7})
+
+        self.assertEqual(self.reopen().load(), {'5': {'sensor_id': 5}, '7': {'sensor_id': 7}})
+
+
+    def test_compaction_keeps_the_data(self):
+        journal = self.reopen()
+        journal.update(5, {'sensor_id': 5})
+        journal.update(6, {'sensor_id': 6})
+        journal.delete(5)
+        with journal._lock:
+            journal._compact()
+        self.assertEqual(os.path.getsize(journal.journal_path), 0)
+        journal.update(8, {'sensor_id': 8})
+
+        self.assertEqual(self.reopen().load(), {'6': {'sensor_id': 6}, '8': {'sensor_id': 8}})
+
+
+    def test_clear_removes_everything(self):
+        journal = self.reopen()
+        journal.update(5, {'sensor_id': 5})
+        journal.clear()
+
+        self.assertEqual(self.reopen().load(), {})
+
+
+
+class PersistenceFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'persistence.json')
+        with open(self.file_path, 'w') as f:
+            json.dump({'5': {'sensor_id': 5}, '6': {'sensor_id': 6}}, f)
+        self.persistence = PersistenceFile(self.file_path, delay=60, max_retries=3)
+
+
+    def tearDown(self):
+        with self.persistence._lock:
+            if self.persistence._timer != None:
+                self.persistence._timer.cancel()
+        shutil.rmtree(self.directory)
+
+
+    def read(self):
+        with open(self.file_path) as f:
+            return json.load(f)
+
+
+    def test_delete(self):
+        self.persistence.delete(5)
+        self.persistence.flush()
+        self.assertEqual(self.read(), {'6': {'sensor_id': 6}})
+
+
+    def test_failed_write_is_retried_with_backoff_and_logged_once(self):
+        self.persistence.delete(5)
+        with mock.patch.object(self.persistence, 'write', side_effect=IOError("disk full")):
+            with self.assertLogs('mysensors.adapter', level='DEBUG') as logs:
+                delays = []
+                for attempt in range(5):
+                    self.persistence.flush()
+                    delays.append(self.persistence._timer.interval if self.persistence._timer != None else None)
+
+        self.assertEqual(delays, [120, 240, 480, None, None])
+        errors = [line for line in logs.output if line.startswith('ERROR')]
+        self.assertEqual(len(errors), 2) # The first failure, and giving up on retrying by itself
+        self.assertEqual(self.persistence.load(), {'6': {'sensor_id': 6}}) # Still pending
+
+        self.persistence.flush()
+        self.assertEqual(self.read(), {'6': {'sensor_id': 6}})
+        self.assertEqual(self.persistence.failures, 0)
+
+
+    def test_newer_change_wins_after_failure(self):
+        self.persistence.update(5, {'sensor_id': 5, 'battery_level': 10})
+        with mock.patch.object(self.persistence, 'write', side_effect=IOError("disk full")):
+            self.persistence.flush()
+        self.persistence.delete(5)
+        self.persistence.flush()
+
+        self.assertEqual(self.read(), {'6': {'sensor_id': 6}})
+
+
+
+if __name__ == '__main__':
+    unittest.main()
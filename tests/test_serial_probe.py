@@ -0,0 +1,34 @@
+"""
+Recognising the MySensors gateway among the serial devices.
+
+    PYTHONPATH=/path/to/pyserial python3 -m unittest discover tests
+"""
+
+import unittest
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+
+@unittest.skipIf(serial == None, "pyserial is not installed")
+class GatewayLineTest(unittest.TestCase):
+
+    def test_gateway_lines(self):
+        from pkg.serial_probe import is_gateway_line
+        self.assertTrue(is_gateway_line('0;255;3;0;2;2.3.2\n'))
+        self.assertTrue(is_gateway_line('0;255;3;0;14;Gateway startup complete.\n'))
+
+
+    def test_echo_of_the_request_is_not_a_gateway(self):
+        from pkg.serial_probe import is_gateway_line, VERSION_REQUEST
+        self.assertFalse(is_gateway_line(VERSION_REQUEST))
+        self.assertFalse(is_gateway_line(VERSION_REQUEST.strip()))
+        self.assertFalse(is_gateway_line('0;255;3;0;2; \r\n'))
+        self.assertFalse(is_gateway_line('AT\r\n'))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
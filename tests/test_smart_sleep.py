@@ -0,0 +1,98 @@
+"""
+Commands for smart sleeping nodes, with raw MySensors lines going through PyMySensors like they would from a receiver.
+
+    PYTHONPATH=/path/to/pymysensors python3 -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+try:
+    import mysensors
+except ImportError:
+    mysensors = None
+
+
+@unittest.skipIf(mysensors == None, "PyMySensors is not installed")
+class SmartSleepTest(unittest.TestCase):
+
+    def setUp(self):
+        import replay
+        from pkg.command_queue import CommandQueue
+
+        self.adapter, self.gateway = replay.create_adapter()
+        self.adapter.message_queue.stop()
+        self.loop = asyncio.new_event_loop() # Only used for the retry timers, which are never run here
+        self.adapter.command_queue = CommandQueue(self.adapter.transmit_command, self.loop, max_attempts=4,
+            is_smart_sleep_node=self.adapter.is_smart_sleep_node)
+        self.sent = []
+
+        for line in ('5;255;0;0;17;2.2.0', '5;1;0;0;3;Relay', '5;1;1;0;2;0',
+                     '6;255;0;0;17;2.2.0', '6;1;0;0;3;Relay', '6;1;1;0;2;0'):
+            self.feed(line)
+
+
+    def tearDown(self):
+        self.adapter.unload()
+        self.loop.close()
+
+
+    def feed(self, line):
+        """ Hands a raw line to PyMySensors, and collects whatever it sends to the network as a result. """
+        reply = self.gateway.logic(line + '\n')
+        if reply != None:
+            self.sent.append(reply)
+        self.run_jobs()
+
+
+    def run_jobs(self):
+        """ Sends what PyMySensors queued, like the commands from set_child_value. """
+        while len(self.gateway.tasks.queue) > 0:
+            reply = self.gateway.tasks.run_job()
+            if reply != None:
+                self.sent.append(reply)
+
+
+    def test_pre_sleep_notification_makes_a_smart_sleep_node(self):
+        self.assertFalse(self.adapter.is_smart_sleep_node(5))
+        self.feed('5;255;3;0;32;500')
+        self.assertTrue(self.adapter.is_smart_sleep_node(5))
+        self.assertFalse(self.adapter.is_smart_sleep_node(6))
+
+
+    def test_command_for_sleeping_node_is_sent_on_wake_without_retries(self):
+        self.feed('5;255;3;0;32;500')
+        del self.sent[:]
+
+        queue = self.adapter.command_queue
+        queue.submit(5, 1, 2, 0)
+        queue.submit(5, 1, 2, 1) # Replaces the first one
+        self.run_jobs()
+        self.assertEqual(self.sent, [])
+        self.assertEqual(len(queue.pending), 0)
+        self.assertEqual(len(queue._timers), 0)
+        self.assertEqual(queue.stats()['smart_sleep'], 2)
+
+        self.feed('5;255;3;0;32;500')
+        self.assertEqual(self.sent, ['5;1;1;0;2;1\n'])
+
+
+    def test_command_for_awake_node_asks_for_acknowledgement(self):
+        queue = self.adapter.command_queue
+        queue.submit(6, 1, 2, 1)
+        self.run_jobs()
+        self.assertEqual(self.sent, ['6;1;1;1;2;1\n'])
+        self.assertIn((6, 1, 2), queue.pending)
+
+        self.feed('6;1;1;1;2;1')
+        self.assertEqual(len(queue.pending), 0)
+        self.assertEqual(queue.stats()['delivered'], 1)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
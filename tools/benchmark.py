@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the parts of the adapter that run for every node, child or message.
+
+The adapter runs without a WebThings gateway, using the stand-ins from gateway_addon_stub.py. Results are printed
+as JSON, so that they can be saved and compared between versions:
+
+    python3 tools/benchmark.py > before.json
+    python3 tools/benchmark.py --only message_throughput,add_child
+    python3 tools/benchmark.py --quick --output after.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import gateway_addon_stub
+import replay
+
+
+BENCHMARKS = ('add_child', 'property_memory', 'message_throughput', 'clock', 'recreate_from_persistence', 'remove_thing')
+
+# Children that every synthetic node presents: (child_id, S_TYPE, V_TYPE, description, example payload)
+NODE_CHILDREN = (
+    (1, 6, 0, 'Temperature', '21.5'),     # S_TEMP, V_TEMP
+    (2, 7, 1, 'Humidity', '55'),          # S_HUM, V_HUM
+    (3, 3, 2, 'Light', '1'),              # S_BINARY, V_STATUS
+    (4, 4, 3, 'Dimmer', '40'),            # S_DIMMER, V_PERCENTAGE
+    (5, 13, 17, 'Power', '230.4'),        # S_POWER, V_WATT
+    (6, 36, 47, 'Display', 'hello'),      # S_INFO, V_TEXT
+)
+
+MESSAGE_MIXES = {
+    'set': {'set': 1.0},
+    'internal': {'internal': 1.0},
+    'presentation': {'presentation': 1.0},
+    'mixed': {'set': 0.8, 'internal': 0.15, 'presentation': 0.05},
+}
+
+
+def measure(function, repeat=5):
+    """ Runs a function a few times, and returns the fastest and the median duration in seconds. """
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return durations[0], durations[len(durations) // 2]
+
+
+def microseconds(seconds, count=1):
+    return round(seconds * 1000000 / max(1, count), 3)
+
+
+def new_adapter():
+    """ An adapter whose incoming messages are handled right away, instead of by the dispatch worker. """
+    adapter, gateway = replay.create_adapter()
+    adapter.message_queue.stop()
+    adapter.message_queue.worker.join(2)
+    return adapter, gateway
+
+
+def present_nodes(gateway, node_count):
+    """ Lets PyMySensors know about a number of nodes, as if they had presented themselves. """
+    for node_id in range(1, node_count + 1):
+        gateway.logic('%d;255;0;0;17;2.3.2\n' % node_id)
+        gateway.logic('%d;255;3;0;11;Node %d\n' % (node_id, node_id))
+        gateway.logic('%d;255;3;0;12;1.0\n' % node_id)
+        for child_id, main_type, sub_type, description, payload in NODE_CHILDREN:
+            gateway.logic('%d;%d;0;0;%d;%s\n' % (node_id, child_id, main_type, description))
+
+
+def node_persistence(node_id):
+    """ The persistence data of a synthetic node, as PyMySensors writes it. """
+    children = {}
+    for child_id, main_type, sub_type, description, payload in NODE_CHILDREN:
+        children[str(child_id)] = {'id': child_id, 'type': main_type, 'description': description, 'values': {str(sub_type): payload}}
+    return {'sensor_id': node_id, 'children': children, 'type': 17, 'sketch_name': 'Node %d' % node_id, 'sketch_version': '1.0',
+        'battery_level': 100, 'protocol_version': '2.3.2', 'heartbeat': 0}
+
+
+
+def benchmark_add_child(quick):
+    """ MySensorsDevice.add_child for every S_TYPE / V_TYPE combination that has a property template. """
+    from pkg.mysensors_device import MySensorsDevice
+    from pkg.property_templates import PROPERTY_TEMPLATES
+
+    adapter, gateway = new_adapter()
+    pairs = sorted(PROPERTY_TEMPLATES)
+    rounds = 20 if quick else 200
+
+    def create_all():
+        for main_type, sub_type in pairs:
+            device = MySensorsDevice(adapter, 1, 'Benchmark')
+            device.add_child('Child', 1, 1, main_type, sub_type, {sub_type: '1'}, '1')
+
+    per_pair = {}
+    for main_type, sub_type in pairs:
+        def create_one():
+            for _ in range(rounds):
+                device = MySensorsDevice(adapter, 1, 'Benchmark')
+                device.add_child('Child', 1, 1, main_type, sub_type, {sub_type: '1'}, '1')
+        best, median = measure(create_one, 3)
+        per_pair['%d/%d' % (main_type, sub_type)] = microseconds(median, rounds)
+
+    best, median = measure(create_all, 3 if quick else 10)
+    slowest = sorted(per_pair.items(), key=lambda item: -item[1])[:5]
+    adapter.unload()
+    return {
+        'pairs': len(pairs),
+        'all_pairs_us': microseconds(median),
+        'per_call_us_median': microseconds(median, len(pairs)),
+        'per_call_us_best': microseconds(best, len(pairs)),
+        'slowest_pairs_us': dict(slowest),
+        'per_pair_us': per_pair,
+    }
+
+
+def benchmark_property_memory(quick):
+    """ How many bytes each property keeps in use, measured with tracemalloc while creating a network of nodes. """
+    from pkg.mysensors_device import MySensorsDevice
+
+    node_count = 50 if quick else 254
+    adapter, gateway = new_adapter()
+    devices = [MySensorsDevice(adapter, node_id, 'Node %d' % node_id) for node_id in range(1, node_count + 1)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for device in devices:
+        node_id = int(device.id.split('-')[1])
+        for child_id, main_type, sub_type, description, payload in NODE_CHILDREN:
+            # Like the persistence file, every child has a values dictionary of its own
+            device.add_child(description, node_id, child_id, main_type, sub_type, {str(sub_type): payload}, payload)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    properties = sum(len(device.properties) for device in devices)
+    adapter.unload()
+    return {
+        'nodes': node_count,
+        'properties': properties,
+        'bytes': after - before,
+        'bytes_per_property': round((after - before) / max(1, properties), 1),
+    }
+
+
+def make_messages(mysensors, node_count, mix, count, seed=1):
+    """ Parsed PyMySensors messages, in the proportions of a mix. """
+    randomizer = random.Random(seed)
+    kinds = []
+    for kind, share in MESSAGE_MIXES[mix].items():
+        kinds.extend([kind] * int(round(share * 100)))
+    messages = []
+    for _ in range(count):
+        node_id = randomizer.randint(1, node_count)
+        child_id, main_type, sub_type, description, payload = randomizer.choice(NODE_CHILDREN)
+        kind = randomizer.choice(kinds)
+        if kind == 'set':
+            if sub_type in (0, 17):
+                payload = '%.1f' % randomizer.uniform(10, 30)
+            elif sub_type == 2:
+                payload = str(randomizer.randint(0, 1))
+            elif sub_type in (1, 3):
+                payload = str(randomizer.randint(0, 100))
+            raw = '%d;%d;1;0;%d;%s\n' % (node_id, child_id, sub_type, payload)
+        elif kind == 'internal':
+            raw = randomizer.choice(('%d;255;3;0;0;%d\n' % (node_id, randomizer.randint(0, 100)), # I_BATTERY_LEVEL
+                '%d;255;3;0;22;%d\n' % (node_id, randomizer.randint(0, 1000)), # I_HEARTBEAT_RESPONSE
+                '%d;255;3;0;11;Node %d\n' % (node_id, node_id))) # I_SKETCH_NAME
+        else:
+            raw = '%d;%d;0;0;%d;%s\n' % (node_id, child_id, main_type, description)
+        messages.append(mysensors.Message(raw))
+    return messages
+
+
+def benchmark_message_throughput(quick):
+    """ MySensorsAdapter.mysensors_message, including handling the message, for different mixes of message types. """
+    import mysensors
+
+    node_count = 50
+    count = 2000 if quick else 20000
+    results = {}
+    for mix in MESSAGE_MIXES:
+        adapter, gateway = new_adapter()
+        present_nodes(gateway, node_count)
+        # Warm up: this creates the devices and properties, so the measurement is about the steady state.
+        for message in make_messages(mysensors, node_count, 'set', 2000, seed=0):
+            adapter.mysensors_message(message)
+        messages = make_messages(mysensors, node_count, mix, count)
+
+        def run():
+            for message in messages:
+                adapter.mysensors_message(message)
+        best, median = measure(run, 3 if quick else 5)
+        results[mix] = {
+            'messages': count,
+            'messages_per_second': round(count / median, 1),
+            'per_message_us': microseconds(median, count),
+            'per_message_us_best': microseconds(best, count),
+        }
+        adapter.unload()
+    return results
+
+
+def benchmark_clock(quick):
+    """
+    The per-node work of keeping track of which nodes are still alive.
+
+    This used to be a scan over all nodes in the clock thread. It is done by the liveness tracker now, so this measures
+    a sign of life from every node, and a check of the deadlines when none, and when all of the nodes have timed out.
+    The liveness tracker keeps its timestamps in the node registry, which can also be scanned as a whole.
+    """
+    from pkg.liveness import LivenessTracker
+    from pkg.node_registry import NODE_COUNT
+
+    results = {}
+    for node_count in (10, 100, 254):
+        timed_out = []
+        tracker = LivenessTracker(3600, timed_out.append)
+        rounds = 10 if quick else 100
+
+        def seen_all():
+            for _ in range(rounds):
+                for node_id in range(node_count):
+                    tracker.seen(node_id)
+        best, seen_median = measure(seen_all, 3)
+
+        def check_none_expired():
+            for _ in range(rounds):
+                tracker._handle_timeouts(tracker._expire())
+        best, check_median = measure(check_none_expired, 3)
+
+        def expire_all():
+            for node_id in range(node_count):
+                tracker.seen(node_id, 0)
+            tracker._heap = [(0, node_id) for node_id in range(node_count)]
+            tracker._scheduled = bytearray(NODE_COUNT)
+            for node_id in range(node_count):
+                tracker._scheduled[node_id] = 1
+            del timed_out[:]
+            started = time.perf_counter()
+            tracker._handle_timeouts(tracker._expire())
+            return time.perf_counter() - started
+        expire_durations = sorted(expire_all() for _ in range(5))
+
+        def scan_registry():
+            for _ in range(rounds):
+                tracker.registry.timed_out(3600, time.time())
+        best, scan_median = measure(scan_registry, 3)
+
+        results[str(node_count)] = {
+            'seen_per_node_us': microseconds(seen_median, rounds * node_count),
+            'check_none_expired_us': microseconds(check_median, rounds),
+            'expire_all_us': microseconds(expire_durations[2]),
+            'registry_scan_us': microseconds(scan_median, rounds),
+            'timed_out': len(timed_out),
+        }
+    return results
+
+
+def benchmark_recreate_from_persistence(quick):
+    """ Startup: recreating devices from persistence files with more and more nodes. """
+    sizes = (10, 50, 100, 254) if not quick else (10, 100)
+    results = {}
+    for node_count in sizes:
+        adapter, gateway = new_adapter()
+        data = dict((str(node_id), node_persistence(node_id)) for node_id in range(1, node_count + 1))
+        with open(adapter.persistence_file_path, 'w') as f:
+            json.dump(data, f)
+        file_size = os.path.getsize(adapter.persistence_file_path)
+
+        def recreate():
+            adapter.devices.clear()
+            adapter.property_index.clear()
+            adapter.recreate_from_persistence()
+        best, median = measure(recreate, 3 if quick else 5)
+        results[str(node_count)] = {
+            'file_bytes': file_size,
+            'devices': len(adapter.get_devices()),
+            'properties': sum(len(device.properties) for device in adapter.get_devices().values()),
+            'seconds': round(median, 6),
+            'per_node_us': microseconds(median, node_count),
+        }
+        adapter.unload()
+    return results
+
+
+def benchmark_remove_thing(quick):
+    """ Removing things one by one, from a network of 100 nodes. """
+    node_count = 100
+    rounds = 2 if quick else 5
+    durations = []
+    for _ in range(rounds):
+        adapter, gateway = new_adapter()
+        present_nodes(gateway, node_count)
+        data = dict((str(node_id), node_persistence(node_id)) for node_id in range(1, node_count + 1))
+        with open(adapter.persistence_file_path, 'w') as f:
+            json.dump(data, f)
+        adapter.recreate_from_persistence()
+        device_ids = list(adapter.get_devices())
+
+        gc.collect()
+        started = time.perf_counter()
+        for device_id in device_ids:
+            adapter.remove_thing(device_id)
+        durations.append(time.perf_counter() - started)
+        remaining = len(adapter.get_devices())
+        adapter.persistence.flush()
+        adapter.unload()
+    durations.sort()
+    return {
+        'things': len(device_ids),
+        'per_thing_us': microseconds(durations[len(durations) // 2], len(device_ids)),
+        'per_thing_us_best': microseconds(durations[0], len(device_ids)),
+        'remaining': remaining,
+    }
+
+
+def git_revision():
+    try:
+        repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=repository, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the MySensors adapter, and prints the results as JSON.")
+    parser.add_argument('--only', help="comma separated list of benchmarks to run: " + ', '.join(BENCHMARKS))
+    parser.add_argument('--quick', action='store_true', help="fewer rounds and smaller sizes, for a quick check")
+    parser.add_argument('--output', help="write the JSON to this file instead of the standard output")
+    args = parser.parse_args()
+
+    selected = BENCHMARKS
+    if args.only:
+        selected = [name.strip() for name in args.only.split(',') if name.strip() != '']
+        for name in selected:
+            if name not in BENCHMARKS:
+                parser.error("unknown benchmark: " + name)
+
+    # The adapter prints a lot while starting up. Keep the standard output for the JSON.
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    report = {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'quick': args.quick,
+        'results': {},
+    }
+    try:
+        gateway_addon_stub.install()
+        for name in selected:
+            started = time.time()
+            report['results'][name] = globals()['benchmark_' + name](args.quick)
+            print("Benchmark " + name + " took " + str(round(time.time() - started, 1)) + " seconds")
+    finally:
+        sys.stdout = stdout
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Stand-ins for the gateway_addon classes, so the adapter can run without a WebThings gateway.
+
+Call install() before importing anything from pkg. Only the parts of the gateway_addon API that the adapter
+uses are provided. Nothing is sent anywhere; the stubs only count what the adapter tells the gateway.
+"""
+
+import os
+import sys
+import tempfile
+import types
+
+
+class Property(object):
+
+    def __init__(self, device, name, description):
+        self.device = device
+        self.name = name
+        self.title = name
+        self.description = description
+        self.value = None
+        self.visible = True
+
+
+    def set_cached_value(self, value):
+        self.value = value
+        return self.value
+
+
+    def get_value(self):
+        return self.value
+
+
+    def as_property_description(self):
+        description = dict(self.description)
+        description['title'] = self.title
+        return description
+
+
+
+class Action(object):
+
+    def __init__(self, _id, device, name, _input):
+        self.id = _id
+        self.device = device
+        self.name = name
+        self.input = _input
+
+
+
+class Device(object):
+
+    def __init__(self, adapter, _id):
+        self.adapter = adapter
+        self.id = _id
+        self._type = []
+        self.title = ''
+        self.description = ''
+        self.properties = {}
+        self.actions = {}
+        self.events = {}
+        self.links = []
+        self.connected = False
+
+
+    def find_property(self, property_name):
+        return self.properties.get(property_name)
+
+
+    def get_property_descriptions(self):
+        return {name: prop.as_property_description() for name, prop in self.properties.items()}
+
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            '@type': self._type,
+            'properties': self.get_property_descriptions(),
+        }
+
+
+    def notify_property_changed(self, prop):
+        self.adapter.stats['property_changed'] += 1
+
+
+    def connected_notify(self, connected):
+        self.connected = connected
+        self.adapter.stats['connected_notify'] += 1
+
+
+    def action_notify(self, action):
+        pass
+
+
+    def event_notify(self, event):
+        pass
+
+
+
+class Adapter(object):
+
+    data_dir = None # Set by install(), shared by all adapters
+
+
+    def __init__(self, _id, package_name, verbose=False):
+        self.id = _id
+        self.package_name = package_name
+        self.verbose = verbose
+        self.devices = {}
+        self.actions = {}
+        self.pairing = False
+        self.stats = {'device_added': 0, 'device_removed': 0, 'property_changed': 0, 'connected_notify': 0, 'pairing_prompt': 0}
+        self.user_profile = {
+            'baseDir': Adapter.data_dir,
+            'addonsDir': os.path.join(Adapter.data_dir, 'addons'),
+            'dataDir': os.path.join(Adapter.data_dir, 'data'),
+            'configDir': os.path.join(Adapter.data_dir, 'config'),
+            'mediaDir': os.path.join(Adapter.data_dir, 'media'),
+            'logDir': os.path.join(Adapter.data_dir, 'log'),
+            'gatewayDir': Adapter.data_dir,
+        }
+
+
+    def get_id(self):
+        return self.id
+
+
+    def get_device(self, device_id):
+        return self.devices.get(device_id)
+
+
+    def get_devices(self):
+        return self.devices
+
+
+    def handle_device_added(self, device):
+        self.devices[device.id] = device
+        self.stats['device_added'] += 1
+
+
+    def handle_device_removed(self, device):
+        self.devices.pop(device.id, None)
+        self.stats['device_removed'] += 1
+
+
+    def send_pairing_prompt(self, prompt, url=None, device=None):
+        self.stats['pairing_prompt'] += 1
+
+
+    def send_unpairing_prompt(self, prompt, url=None, device=None):
+        pass
+
+
+    def proxy_running(self):
+        return True
+
+
+    def close_proxy(self):
+        pass
+
+
+
+class Database(object):
+
+    config = {} # Set by install(). Without a 'Gateway' key the adapter doesn't connect to anything.
+
+
+    def __init__(self, package_name, path=None):
+        self.package_name = package_name
+
+
+    def open(self):
+        return True
+
+
+    def close(self):
+        pass
+
+
+    def load_config(self):
+        return dict(Database.config)
+
+
+    def save_config(self, config):
+        Database.config = dict(config)
+        return True
+
+
+
+def install(config=None, data_dir=None):
+    """
+    Makes 'import gateway_addon' return these stubs.
+
+    config -- the add-on settings the adapter will read. By default: no gateway, debugging off, no timeout.
+    data_dir -- where the adapter may store its persistence files. By default a new temporary directory.
+    """
+    if config == None:
+        config = {'Debugging': False, 'Timeout period': 0, 'Metric': True}
+    if data_dir == None:
+        data_dir = tempfile.mkdtemp(prefix='mysensors-adapter-')
+    for name in ('addons', 'data', 'config'):
+        os.makedirs(os.path.join(data_dir, name), exist_ok=True)
+    os.makedirs(os.path.join(data_dir, 'data', 'mysensors-adapter'), exist_ok=True)
+
+    Adapter.data_dir = data_dir
+    Database.config = dict(config)
+
+    module = types.ModuleType('gateway_addon')
+    module.Adapter = Adapter
+    module.Device = Device
+    module.Property = Property
+    module.Action = Action
+    module.Database = Database
+    sys.modules['gateway_addon'] = module
+
+    # Make 'import pkg' work when running from the tools directory
+    repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repository not in sys.path:
+        sys.path.insert(0, repository)
+    return data_dir
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Feeds a capture file back into the adapter, to measure how fast it handles a real MySensors network.
+
+A capture is made by setting the 'Capture messages' option in the add-on settings, or can be any log of raw
+MySensors lines. The adapter runs here without a WebThings gateway: the gateway_addon classes are replaced by
+the stand-ins in gateway_addon_stub.py, and PyMySensors gets a transport that sends nothing.
+
+The messages are parsed by PyMySensors just like they would be coming in over serial, Ethernet or MQTT, and go
+through the adapter's message queue, so the numbers include everything from parsing up to notifying the gateway.
+
+    python3 tools/replay.py capture.txt                 # as fast as possible
+    python3 tools/replay.py capture.txt --speed 1       # with the original timing
+    python3 tools/replay.py capture.txt --repeat 10 --json
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import gateway_addon_stub
+
+
+class NullTransport(object):
+    """ A PyMySensors transport that doesn't send anything. """
+
+    def __init__(self, gateway, *args, **kwargs):
+        self.gateway = gateway
+        self.sent = 0
+
+
+    def connect(self):
+        pass
+
+
+    def disconnect(self):
+        pass
+
+
+    def send(self, message):
+        self.sent += 1
+
+
+
+def create_adapter(debug=False):
+    """ Creates a MySensors adapter that isn't connected to anything, with a PyMySensors gateway that only parses. """
+    # Replaying faster than real time would make every node look like it sends too many messages, so that limit is turned off.
+    gateway_addon_stub.install({'Debugging': debug, 'Timeout period': 0, 'Metric': True, 'Node message limit': 0})
+
+    import mysensors
+    from pkg.mysensors_adapter import MySensorsAdapter
+    from pkg.logger import configure_logging
+
+    adapter = MySensorsAdapter(verbose=False)
+    adapter.DEBUG = debug
+    configure_logging(debug)
+    adapter.first_request_done = True # Don't ask the (non-existent) network to present itself
+
+    gateway = mysensors.BaseSyncGateway(NullTransport(None), event_callback=adapter.mysensors_message, protocol_version='2.2')
+    gateway.tasks.transport.gateway = gateway
+    adapter.GATEWAY = gateway
+    return adapter, gateway
+
+
+def quantile(values, q):
+    if len(values) == 0:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def replay(adapter, gateway, lines, speed=0, timeout=60):
+    """
+    Hands the lines to PyMySensors, and waits until the adapter has handled them all.
+
+    speed -- 0 replays as fast as possible, 1 with the original timing, 10 ten times faster, and so on
+    Returns a dictionary with the results.
+    """
+    latencies = []
+    handled = [0]
+    dispatch = adapter.dispatch_message
+
+    def measured_dispatch(message):
+        dispatch(message)
+        latencies.append(time.time() - message.received_at)
+        handled[0] += 1
+
+    adapter.message_queue.handler = measured_dispatch
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    started = time.time()
+    first_timestamp = None
+    parse_errors = 0
+    for timestamp, raw in lines:
+        if speed > 0:
+            if first_timestamp == None:
+                first_timestamp = timestamp
+            delay = (timestamp - first_timestamp) / speed - (time.time() - started)
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            reply = gateway.logic(raw)
+            if reply != None:
+                gateway.tasks.transport.send(reply)
+            while len(gateway.tasks.queue) > 0: # Replies that PyMySensors scheduled, like node IDs and sketch requests
+                reply = gateway.tasks.run_job()
+                if reply != None:
+                    gateway.tasks.transport.send(reply)
+        except Exception:
+            parse_errors += 1
+    fed = time.time() - started
+
+    # Wait for the dispatch worker to catch up. Coalesced and dropped messages are never handled.
+    queue = adapter.message_queue
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if queue.depth() == 0 and queue.handled_count >= queue.received_count - queue.coalesced_count - queue.dropped_count:
+            break
+        time.sleep(0.001)
+    elapsed = time.time() - started
+    adapter.message_queue.handler = dispatch
+
+    latencies.sort()
+    return {
+        'lines': len(lines),
+        'parse_errors': parse_errors,
+        'received': queue.received_count,
+        'handled': handled[0],
+        'coalesced': queue.coalesced_count,
+        'dropped': queue.dropped_count,
+        'feed_seconds': round(fed, 6),
+        'total_seconds': round(elapsed, 6),
+        'messages_per_second': round(handled[0] / elapsed, 1) if elapsed > 0 else None,
+        'latency_p50_ms': round(quantile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'latency_p95_ms': round(quantile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'latency_p99_ms': round(quantile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'latency_max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+        'allocated_blocks_delta': sys.getallocatedblocks() - blocks_before,
+        'devices': len(adapter.get_devices()),
+        'properties': sum(len(device.properties) for device in adapter.get_devices().values()),
+        'property_notifications': adapter.stats['property_changed'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays a MySensors capture file through the adapter.")
+    parser.add_argument('capture', help="capture file, made with the 'Capture messages' option, or a plain log of MySensors lines")
+    parser.add_argument('--speed', type=float, default=0, help="0 (the default) replays as fast as possible, 1 with the original timing, 10 ten times faster")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the capture this many times; the first run creates the devices")
+    parser.add_argument('--tracemalloc', action='store_true', help="also report the peak memory use (makes everything slower)")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    parser.add_argument('--debug', action='store_true', help="let the adapter log at debug level")
+    args = parser.parse_args()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    adapter, gateway = create_adapter(args.debug)
+
+    from pkg.capture import read_capture
+    lines = list(read_capture(args.capture))
+
+    runs = []
+    for run in range(max(1, args.repeat)):
+        result = replay(adapter, gateway, lines, speed=args.speed)
+        result['run'] = run + 1
+        runs.append(result)
+        if not args.json:
+            print("Run %d: %d lines, %d handled in %.3f s, %s messages/s, latency p50 %s ms, p95 %s ms, p99 %s ms, %d devices with %d properties, %+d allocated blocks" % (
+                result['run'], result['lines'], result['handled'], result['total_seconds'], result['messages_per_second'],
+                result['latency_p50_ms'], result['latency_p95_ms'], result['latency_p99_ms'],
+                result['devices'], result['properties'], result['allocated_blocks_delta']))
+
+    report = {'capture': os.path.abspath(args.capture), 'speed': args.speed, 'python': sys.version.split()[0], 'runs': runs}
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        report['tracemalloc_current_bytes'] = current
+        report['tracemalloc_peak_bytes'] = peak
+        tracemalloc.stop()
+        if not args.json:
+            print("Memory: %d bytes in use, peak %d bytes" % (current, peak))
+
+    adapter.unload()
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+"""
+Simulates a MySensors network, so the adapter can be load-tested without any hardware.
+
+The simulator acts as the gateway of a network of virtual nodes. The adapter can connect to it like it would to a
+real gateway:
+
+    python3 tools/simulator.py tcp --nodes 200                    # Ethernet gateway on port 5003
+    python3 tools/simulator.py serial --nodes 50                  # Prints the path of a pseudo-terminal to use as 'USB device name'
+    python3 tools/simulator.py mqtt --broker 127.0.0.1 --nodes 100
+
+The nodes present themselves when they start, send their values at the rate of their sketch, send heartbeats, and
+smart sleeping nodes only listen for a moment after each report. They answer discovery, presentation, heartbeat and
+value requests, and acknowledge commands, the way the MySensors firmware does. Radio trouble can be simulated with
+--loss, --burst and --reorder. Sketches can be picked with --mix, or loaded from a JSON file with --sketches.
+
+A MySensors network has room for 254 nodes. For more, run several simulators on different ports.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import sys
+import time
+
+try:
+    import tty
+except ImportError:
+    tty = None
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+
+MAX_NODES = 254
+LIBRARY_VERSION = '2.3.2'
+
+# Built-in sketches. Every child is (child_id, S_TYPE, V_TYPE, description, kind of value).
+# interval -- seconds between reports, 0 for nodes that only report when something changes
+# sleeping -- smart sleeping node: only listens for listen_ms after each report
+# heartbeat -- seconds between heartbeats, 0 for none
+# battery -- whether the node reports its battery level
+SKETCHES = {
+    'climate': {
+        'name': 'Climate sensor', 'version': '1.2', 'interval': 60, 'sleeping': True, 'listen_ms': 500, 'heartbeat': 0, 'battery': True,
+        'children': [[1, 6, 0, 'Temperature', 'temperature'], [2, 7, 1, 'Humidity', 'humidity']],
+    },
+    'relay': {
+        'name': 'Relay', 'version': '1.0', 'interval': 0, 'sleeping': False, 'heartbeat': 300, 'battery': False,
+        'children': [[1, 3, 2, 'Light', 'switch'], [2, 3, 2, 'Fan', 'switch']],
+    },
+    'dimmer': {
+        'name': 'Dimmer', 'version': '1.0', 'interval': 0, 'sleeping': False, 'heartbeat': 300, 'battery': False,
+        'children': [[1, 4, 2, 'Lamp', 'switch'], [1, 4, 3, 'Lamp', 'percentage']],
+    },
+    'power': {
+        'name': 'Power meter', 'version': '2.0', 'interval': 5, 'sleeping': False, 'heartbeat': 0, 'battery': False,
+        'children': [[1, 13, 17, 'Power', 'power'], [1, 13, 18, 'Energy', 'energy']],
+    },
+    'door': {
+        'name': 'Door sensor', 'version': '1.1', 'interval': 120, 'sleeping': True, 'listen_ms': 200, 'heartbeat': 0, 'battery': True,
+        'children': [[1, 0, 16, 'Door', 'tripped']],
+    },
+    'display': {
+        'name': 'Display', 'version': '1.0', 'interval': 0, 'sleeping': False, 'heartbeat': 600, 'battery': False,
+        'children': [[1, 36, 47, 'Text', 'text']],
+    },
+}
+
+
+
+class LinkModel(object):
+    """
+    Decides what happens to a message on the radio link of a node: delivered, lost, or delayed so that it overtakes nothing
+    but is overtaken by later ones.
+
+    Losses come in bursts if burst is larger than 1, like with interference: once a message is lost, the next one is lost
+    too with a chance of 1 - 1/burst. The overall loss rate stays close to `loss`.
+    """
+
+    def __init__(self, loss=0.0, burst=1.0, reorder=0.0, reorder_delay=0.5, latency=0.005, randomizer=None):
+        self.loss = loss
+        self.burst = max(1.0, burst)
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.latency = latency
+        self.random = randomizer if randomizer != None else random.Random()
+        self.in_burst = False
+
+
+    def delay(self):
+        """ Returns how many seconds the message takes to arrive, or None if it's lost. """
+        if self.loss > 0:
+            if self.in_burst:
+                self.in_burst = self.random.random() > 1.0 / self.burst
+            else:
+                self.in_burst = self.random.random() < self.loss / self.burst
+            if self.in_burst:
+                return None
+        delay = self.latency
+        if self.reorder > 0 and self.random.random() < self.reorder:
+            delay += self.random.uniform(0, self.reorder_delay)
+        return delay
+
+
+
+class VirtualNode(object):
+    """ A node running a sketch. Talks to the gateway through the network, which applies the link model. """
+
+    def __init__(self, network, node_id, sketch_name, sketch, link):
+        """
+        Initialize the object.
+
+        network -- the Network the node belongs to
+        node_id -- MySensors node id, 1 - 254
+        sketch_name -- name of the sketch in SKETCHES or the --sketches file
+        sketch -- the sketch settings
+        link -- LinkModel of the radio link between the node and the gateway
+        """
+        self.network = network
+        self.node_id = node_id
+        self.sketch_name = sketch_name
+        self.sketch = sketch
+        self.link = link
+        self.random = network.random
+        self.values = {} # (child_id, V_TYPE) -> value
+        self.heartbeats = 0
+        self.battery = 100
+        self.awake_until = 0 # Only used for sleeping nodes
+        self.started = False
+
+        for child_id, main_type, sub_type, description, kind in sketch['children']:
+            self.values[(child_id, sub_type)] = self.initial_value(kind)
+
+
+    def initial_value(self, kind):
+        if kind == 'temperature':
+            return round(self.random.uniform(17, 23), 1)
+        if kind == 'humidity':
+            return self.random.randint(35, 65)
+        if kind == 'power':
+            return self.random.randint(50, 2000)
+        if kind == 'energy':
+            return round(self.random.uniform(100, 5000), 3)
+        if kind == 'percentage':
+            return self.random.choice((0, 25, 50, 100))
+        if kind == 'text':
+            return 'Node ' + str(self.node_id)
+        return 0 # switch, tripped
+
+
+    def next_value(self, kind, value):
+        if kind == 'temperature':
+            return round(value + self.random.uniform(-0.3, 0.3), 1)
+        if kind == 'humidity':
+            return min(100, max(0, value + self.random.randint(-2, 2)))
+        if kind == 'power':
+            return max(0, value + self.random.randint(-100, 100))
+        if kind == 'energy':
+            return round(value + self.random.uniform(0, 0.01), 3)
+        if kind == 'tripped':
+            return 1 - value
+        return value # Actuators only change when they are told to
+
+
+    def send(self, child_id, message_type, sub_type, payload, ack=0):
+        self.network.from_node(self, '%d;%d;%d;%d;%d;%s' % (self.node_id, child_id, message_type, ack, sub_type, payload))
+
+
+    def start(self, delay):
+        self.network.loop.call_later(delay, self.boot)
+
+
+    def boot(self):
+        """ What a node does after it is switched on: present itself, send its values, and start its timers. """
+        self.started = True
+        self.present()
+        self.report_all()
+        interval = self.sketch.get('interval', 0) * self.network.rate_scale
+        if interval > 0:
+            self.network.loop.call_later(self.random.uniform(0, interval), self.report)
+        heartbeat = self.sketch.get('heartbeat', 0) * self.network.rate_scale
+        if heartbeat > 0:
+            self.network.loop.call_later(self.random.uniform(0, heartbeat), self.heartbeat)
+        if self.sketch.get('sleeping'):
+            self.go_to_sleep()
+
+
+    def present(self):
+        self.send(255, 0, 17, LIBRARY_VERSION) # S_ARDUINO_NODE
+        self.send(255, 3, 6, '0') # I_CONFIG
+        self.send(255, 3, 11, self.sketch.get('name', self.sketch_name)) # I_SKETCH_NAME
+        self.send(255, 3, 12, self.sketch.get('version', '1.0')) # I_SKETCH_VERSION
+        presented = set()
+        for child_id, main_type, sub_type, description, kind in self.sketch['children']:
+            if child_id not in presented:
+                presented.add(child_id)
+                self.send(child_id, 0, main_type, description)
+
+
+    def report_all(self):
+        for child_id, main_type, sub_type, description, kind in self.sketch['children']:
+            self.send(child_id, 1, sub_type, self.values[(child_id, sub_type)])
+
+
+    def report(self):
+        """ A scheduled report of the sensor values. """
+        self.network.loop.call_later(self.sketch['interval'] * self.network.rate_scale * self.random.uniform(0.9, 1.1), self.report)
+        if self.sketch.get('sleeping'):
+            self.wake_up()
+        for child_id, main_type, sub_type, description, kind in self.sketch['children']:
+            value = self.next_value(kind, self.values[(child_id, sub_type)])
+            self.values[(child_id, sub_type)] = value
+            self.send(child_id, 1, sub_type, value)
+        if self.sketch.get('battery'):
+            if self.random.random() < 0.1:
+                self.battery = max(0, self.battery - 1)
+            self.send(255, 3, 0, self.battery) # I_BATTERY_LEVEL
+        if self.sketch.get('sleeping'):
+            self.go_to_sleep()
+
+
+    def heartbeat(self):
+        self.network.loop.call_later(self.sketch['heartbeat'] * self.network.rate_scale, self.heartbeat)
+        self.heartbeats += 1
+        self.send(255, 3, 22, self.heartbeats) # I_HEARTBEAT_RESPONSE
+
+
+    def wake_up(self):
+        self.awake_until = float('inf')
+        self.send(255, 3, 33, 0) # I_POST_SLEEP_NOTIFICATION
+
+
+    def go_to_sleep(self):
+        """ Smart sleep: tell the controller how long the node will listen, then stop listening after that. """
+        listen_ms = self.sketch.get('listen_ms', 500)
+        self.heartbeats += 1
+        self.send(255, 3, 22, self.heartbeats) # Smart sleep also sends a heartbeat
+        self.send(255, 3, 32, listen_ms) # I_PRE_SLEEP_NOTIFICATION
+        self.awake_until = time.time() + listen_ms / 1000.0
+
+
+    def is_listening(self):
+        return not self.sketch.get('sleeping') or time.time() < self.awake_until
+
+
+    def receive(self, node_id, child_id, message_type, ack, sub_type, payload):
+        """ Handles a message from the controller that reached this node. """
+        if not self.started:
+            return
+        if message_type == 1: # Set
+            if (child_id, sub_type) not in self.values:
+                return
+            if ack:
+                self.send(child_id, 1, sub_type, payload, ack=1) # The echo that the controller uses as an acknowledgement
+            self.values[(child_id, sub_type)] = payload
+            self.network.stats['commands'] += 1
+        elif message_type == 2: # Req
+            if (child_id, sub_type) in self.values:
+                self.send(child_id, 1, sub_type, self.values[(child_id, sub_type)])
+        elif message_type == 3:
+            if sub_type == 19: # I_PRESENTATION
+                self.network.stats['presentation_requests'] += 1
+                self.present()
+            elif sub_type == 18: # I_HEARTBEAT_REQUEST
+                self.heartbeats += 1
+                self.send(255, 3, 22, self.heartbeats)
+            elif sub_type == 26: # I_DISCOVER_REQUEST
+                self.send(255, 3, 27, 0) # I_DISCOVER_RESPONSE, with the parent node
+            elif sub_type == 13: # I_REBOOT
+                self.started = False
+                self.start(self.random.uniform(1, 3))
+
+
+
+class Network(object):
+    """ The gateway and its nodes. Messages between the two go through the link model of each node. """
+
+    def __init__(self, loop, transport_factory, rate_scale=1.0, startup_spread=10.0, seed=None):
+        self.loop = loop
+        self.random = random.Random(seed)
+        self.rate_scale = rate_scale
+        self.startup_spread = startup_spread
+        self.nodes_started = False
+        self.nodes = {} # node_id -> VirtualNode
+        self.transport = transport_factory(self)
+        self.stats = {'to_controller': 0, 'from_controller': 0, 'lost_up': 0, 'lost_down': 0, 'delayed': 0, 'commands': 0,
+            'presentation_requests': 0, 'asleep': 0, 'ignored': 0}
+        self.started = time.time()
+
+
+    def add_node(self, node):
+        self.nodes[node.node_id] = node
+
+
+    def from_node(self, node, line):
+        """ A node transmits a message. It may arrive at the gateway after a while, or not at all. """
+        delay = node.link.delay()
+        if delay == None:
+            self.stats['lost_up'] += 1
+            return
+        if delay > node.link.latency:
+            self.stats['delayed'] += 1
+        self.loop.call_later(delay, self.to_controller, line)
+
+
+    def to_controller(self, line):
+        self.stats['to_controller'] += 1
+        self.transport.write(line + '\n')
+
+
+    def gateway_started(self):
+        self.to_controller('0;255;3;0;14;Gateway startup complete.')
+        if not self.nodes_started:
+            # The nodes are switched on once there is someone to listen to them, so that a test always sees them present themselves.
+            self.nodes_started = True
+            for node in self.nodes.values():
+                node.start(self.random.uniform(0, self.startup_spread))
+
+
+    def from_controller(self, line):
+        """ Handles a line the controller sent to the gateway. """
+        try:
+            node_id, child_id, message_type, ack, sub_type, payload = line.strip().split(';', 5)
+            node_id, child_id, message_type, ack, sub_type = int(node_id), int(child_id), int(message_type), int(ack), int(sub_type)
+        except ValueError:
+            self.stats['ignored'] += 1
+            return
+        self.stats['from_controller'] += 1
+
+        if node_id == 0 or node_id == 255:
+            if message_type == 3 and sub_type == 2: # I_VERSION, which PyMySensors also uses as a keepalive
+                self.to_controller('0;255;3;0;2;' + LIBRARY_VERSION)
+                return
+            if message_type == 3 and sub_type in (26, 19): # Discovery or presentation request for everyone
+                for node in list(self.nodes.values()):
+                    self.loop.call_later(self.random.uniform(0, 2), self.to_node, node, node.node_id, child_id, message_type, ack, sub_type, payload)
+                return
+            if message_type == 3 and sub_type == 18: # I_HEARTBEAT_REQUEST for the gateway itself
+                self.to_controller('0;255;3;0;22;' + str(int(time.time() - self.started)))
+                return
+            if node_id == 0:
+                return
+
+        node = self.nodes.get(node_id)
+        if node == None:
+            self.stats['ignored'] += 1
+            return
+        self.to_node(node, node_id, child_id, message_type, ack, sub_type, payload)
+
+
+    def to_node(self, node, node_id, child_id, message_type, ack, sub_type, payload):
+        if not node.is_listening():
+            self.stats['asleep'] += 1
+            return
+        delay = node.link.delay()
+        if delay == None:
+            self.stats['lost_down'] += 1
+            return
+        self.loop.call_later(delay, node.receive, node_id, child_id, message_type, ack, sub_type, payload)
+
+
+
+class TcpTransport(object):
+    """ Acts like an Ethernet gateway: a TCP server that exchanges MySensors lines with every connected controller. """
+
+    def __init__(self, network, host='0.0.0.0', port=5003):
+        self.network = network
+        self.host = host
+        self.port = port
+        self.writers = []
+        self.server = None
+
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.connected, self.host, self.port)
+        print("Ethernet gateway listening on " + str(self.host) + ":" + str(self.port))
+
+
+    async def connected(self, reader, writer):
+        print("Controller connected from " + str(writer.get_extra_info('peername')))
+        self.writers.append(writer)
+        self.network.gateway_started()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.network.from_controller(line.decode('utf-8', 'replace'))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if writer in self.writers:
+                self.writers.remove(writer)
+            writer.close()
+            print("Controller disconnected")
+
+
+    def write(self, line):
+        data = line.encode('utf-8')
+        for writer in list(self.writers):
+            try:
+                writer.write(data)
+            except Exception:
+                self.writers.remove(writer)
+
+
+    def stop(self):
+        if self.server != None:
+            self.server.close()
+
+
+
+class PtyTransport(object):
+    """ Acts like a serial gateway on a pseudo-terminal. The adapter can use the printed path as its USB device name. """
+
+    def __init__(self, network, link_path=None):
+        self.network = network
+        self.link_path = link_path
+        self.master = None
+        self.slave = None
+        self.buffer = b''
+
+
+    async def start(self):
+        self.master, self.slave = os.openpty()
+        if tty != None:
+            tty.setraw(self.slave)
+        path = os.ttyname(self.slave)
+        if self.link_path != None:
+            if os.path.islink(self.link_path):
+                os.remove(self.link_path)
+            os.symlink(path, self.link_path)
+            path = self.link_path
+        asyncio.get_running_loop().add_reader(self.master, self.readable)
+        print("Serial gateway available at " + str(path))
+        self.network.gateway_started()
+
+
+    def readable(self):
+        try:
+            self.buffer += os.read(self.master, 4096)
+        except OSError:
+            return
+        while b'\n' in self.buffer:
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            self.network.from_controller(line.decode('utf-8', 'replace'))
+
+
+    def write(self, line):
+        try:
+            os.write(self.master, line.encode('utf-8'))
+        except OSError:
+            pass # Nobody is reading. A real serial port would drop the data too.
+
+
+    def stop(self):
+        if self.master != None:
+            asyncio.get_event_loop().remove_reader(self.master)
+            os.close(self.master)
+            os.close(self.slave)
+        if self.link_path != None and os.path.islink(self.link_path):
+            os.remove(self.link_path)
+
+
+
+class MqttTransport(object):
+    """ Acts like an MQTT gateway: publishes the messages of the nodes to a broker, and listens for commands on it. """
+
+    def __init__(self, network, broker='127.0.0.1', port=1883, publish_prefix='mygateway1-out', subscribe_prefix='mygateway1-in'):
+        self.network = network
+        self.broker = broker
+        self.port = port
+        self.publish_prefix = publish_prefix
+        self.subscribe_prefix = subscribe_prefix
+        self.client = None
+
+
+    async def start(self):
+        if mqtt == None:
+            raise RuntimeError("the MQTT mode needs the paho-mqtt package")
+        loop = asyncio.get_running_loop()
+        if hasattr(mqtt, 'CallbackAPIVersion'):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id='mysensors-simulator')
+        else:
+            self.client = mqtt.Client(client_id='mysensors-simulator')
+
+        def on_connect(client, userdata, flags, rc):
+            client.subscribe(self.subscribe_prefix + '/+/+/+/+/+')
+            loop.call_soon_threadsafe(self.network.gateway_started)
+            print("Connected to MQTT broker at " + str(self.broker) + ":" + str(self.port))
+
+        def on_message(client, userdata, message):
+            levels = message.topic.split('/')[-5:]
+            line = ';'.join(levels) + ';' + message.payload.decode('utf-8', 'replace')
+            loop.call_soon_threadsafe(self.network.from_controller, line)
+
+        self.client.on_connect = on_connect
+        self.client.on_message = on_message
+        self.client.connect(self.broker, self.port, 60)
+        self.client.loop_start()
+
+
+    def write(self, line):
+        node_id, child_id, message_type, ack, sub_type, payload = line.rstrip('\n').split(';', 5)
+        self.client.publish('/'.join((self.publish_prefix, node_id, child_id, message_type, ack, sub_type)), payload)
+
+
+    def stop(self):
+        if self.client != None:
+            self.client.loop_stop()
+            self.client.disconnect()
+
+
+
+def parse_mix(text, sketches):
+    """ Turns a setting like 'climate=4,relay=1' into a list of (sketch name, weight) """
+    mix = []
+    for part in str(text).split(','):
+        if part.strip() == '':
+            continue
+        name, weight = (part.split('=', 1) + ['1'])[:2]
+        name = name.strip()
+        if name not in sketches:
+            raise ValueError("unknown sketch: " + name + ". Known sketches: " + ', '.join(sorted(sketches)))
+        mix.append((name, float(weight)))
+    return mix
+
+
+def print_stats(network, interval=0):
+    if interval > 0:
+        network.loop.call_later(interval, print_stats, network, interval)
+    stats = network.stats
+    print("%d nodes, to controller: %d, from controller: %d, commands: %d, lost up/down: %d/%d, delayed: %d, missed while asleep: %d" % (
+        len(network.nodes), stats['to_controller'], stats['from_controller'], stats['commands'], stats['lost_up'], stats['lost_down'],
+        stats['delayed'], stats['asleep']))
+
+
+async def run(args):
+    sketches = dict(SKETCHES)
+    if args.sketches:
+        with open(args.sketches) as f:
+            sketches.update(json.load(f))
+    mix = parse_mix(args.mix, sketches)
+    if args.nodes > MAX_NODES:
+        print("A MySensors network can have at most " + str(MAX_NODES) + " nodes. Using " + str(MAX_NODES) + ".")
+        args.nodes = MAX_NODES
+
+    loop = asyncio.get_running_loop()
+    if args.mode == 'tcp':
+        factory = lambda network: TcpTransport(network, args.host, args.port)
+    elif args.mode == 'serial':
+        factory = lambda network: PtyTransport(network, args.link)
+    else:
+        factory = lambda network: MqttTransport(network, args.broker, args.broker_port, args.publish_prefix, args.subscribe_prefix)
+    network = Network(loop, factory, rate_scale=args.rate_scale, startup_spread=args.startup_spread, seed=args.seed)
+
+    names = [name for name, weight in mix]
+    weights = [weight for name, weight in mix]
+    for node_id in range(args.first_node, args.first_node + args.nodes):
+        if node_id > MAX_NODES:
+            break
+        name = network.random.choices(names, weights)[0]
+        link = LinkModel(args.loss, args.burst, args.reorder, args.reorder_delay, args.latency, network.random)
+        network.add_node(VirtualNode(network, node_id, name, sketches[name], link))
+
+    await network.transport.start()
+    if args.stats > 0:
+        loop.call_later(args.stats, print_stats, network, args.stats)
+
+    stopped = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stopped.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        if args.duration > 0:
+            await asyncio.wait_for(stopped.wait(), args.duration)
+        else:
+            await stopped.wait()
+    except asyncio.TimeoutError:
+        pass
+    network.transport.stop()
+    print_stats(network)
+    return network.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates a MySensors gateway with a network of virtual nodes.")
+    parser.add_argument('mode', choices=('tcp', 'serial', 'mqtt'), help="act as an Ethernet gateway, a serial gateway on a pseudo-terminal, or an MQTT gateway")
+    parser.add_argument('--nodes', type=int, default=20, help="number of virtual nodes, at most 254")
+    parser.add_argument('--first-node', type=int, default=1, help="id of the first node")
+    parser.add_argument('--mix', default='climate=4,relay=2,dimmer=1,power=1,door=1,display=1', help="which sketches the nodes run, with weights. Built in: " + ', '.join(sorted(SKETCHES)))
+    parser.add_argument('--sketches', help="JSON file with more sketches, in the same form as the built-in ones")
+    parser.add_argument('--rate-scale', type=float, default=1.0, help="multiplies the report and heartbeat intervals; 0.1 makes the nodes ten times as chatty")
+    parser.add_argument('--startup-spread', type=float, default=10.0, help="the nodes start at a random moment within this many seconds after the controller first connects")
+    parser.add_argument('--loss', type=float, default=0.0, help="chance that a message is lost, in both directions")
+    parser.add_argument('--burst', type=float, default=1.0, help="average number of messages lost in a row")
+    parser.add_argument('--reorder', type=float, default=0.0, help="chance that a message is delayed, so that later ones overtake it")
+    parser.add_argument('--reorder-delay', type=float, default=0.5, help="the longest such a delay can be, in seconds")
+    parser.add_argument('--latency', type=float, default=0.005, help="how long a message takes over the radio, in seconds")
+    parser.add_argument('--seed', type=int, help="makes the simulation repeatable")
+    parser.add_argument('--duration', type=float, default=0, help="stop after this many seconds")
+    parser.add_argument('--stats', type=float, default=10, help="print statistics every this many seconds, 0 to never")
+    parser.add_argument('--host', default='0.0.0.0', help="tcp: address to listen on")
+    parser.add_argument('--port', type=int, default=5003, help="tcp: port to listen on")
+    parser.add_argument('--link', help="serial: also make the pseudo-terminal available at this path")
+    parser.add_argument('--broker', default='127.0.0.1', help="mqtt: address of the broker")
+    parser.add_argument('--broker-port', type=int, default=1883, help="mqtt: port of the broker")
+    parser.add_argument('--publish-prefix', default='mygateway1-out', help="mqtt: topic prefix for messages from the nodes")
+    parser.add_argument('--subscribe-prefix', default='mygateway1-in', help="mqtt: topic prefix for messages to the nodes")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except (ValueError, RuntimeError, OSError) as ex:
+        print("Error: " + str(ex))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()